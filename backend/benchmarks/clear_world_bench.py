@@ -0,0 +1,86 @@
+"""
+Time of clearing world history by row delete vs. truncating its step partition,
+per number of stored steps. Needs PostgreSQL database configured by POSTGRES_*
+environment, creates and deletes its own worlds.
+
+    python -m benchmarks.clear_world_bench
+"""
+
+import asyncio
+import time
+
+from sqlalchemy import delete, func, insert, literal, select, text
+
+from src import database, dto, models
+from src.world import world_service
+
+STEP_COUNTS = [1000, 10000, 100000]
+STEP_STATE = '{"pos": [12, 8], "velocity": [1, -1], "score": 42}'
+
+
+async def fill_world(step_count: int) -> int:
+    async with database.SessionLocal() as db:
+        world = await world_service.create_world(
+            db, dto.WorldCreateDto(title="clear-bench", plugin="DEMO_GAME")
+        )
+        stage_id = (
+            await db.execute(
+                insert(models.Stage).returning(models.Stage.id),
+                dict(world_id=world.id, title="bench", code="bench"),
+            )
+        ).scalar_one()
+        # rows are generated by database, client round trips aren't measured
+        series = func.generate_series(1, step_count).table_valued("n")
+        await db.execute(
+            insert(models.Step).from_select(
+                ["world_id", "stage_id", "state", "actions", "logs", "interactions"],
+                select(
+                    literal(world.id),
+                    literal(stage_id),
+                    literal(STEP_STATE),
+                    literal("[]"),
+                    literal(b"[]"),
+                    literal(b"[]"),
+                ).select_from(series),
+            )
+        )
+        await db.commit()
+        await db.execute(text("ANALYZE step"))
+        return world.id
+
+
+async def measure(step_count: int):
+    world_id = await fill_world(step_count)
+    async with database.SessionLocal() as db:
+        started_at = time.perf_counter()
+        await db.execute(delete(models.Step).where(models.Step.world_id == world_id))
+        delete_time = time.perf_counter() - started_at
+        # deleted rows are restored for truncate to have same work
+        await db.rollback()
+
+        started_at = time.perf_counter()
+        await world_service.clear_world(db, world_id)
+        truncate_time = time.perf_counter() - started_at
+
+        await world_service.delete_world(db, world_id)
+    return dict(
+        steps=step_count,
+        delete_ms=delete_time * 1000,
+        truncate_ms=truncate_time * 1000,
+    )
+
+
+async def run():
+    try:
+        return [await measure(step_count) for step_count in STEP_COUNTS]
+    finally:
+        await database.engine.dispose()
+
+
+if __name__ == "__main__":
+    for result in asyncio.run(run()):
+        print(
+            f"{result['steps']:>8} steps: "
+            f"delete rows {result['delete_ms']:>9.1f} ms, "
+            f"truncate partition {result['truncate_ms']:>7.1f} ms"
+        )
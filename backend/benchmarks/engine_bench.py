@@ -0,0 +1,128 @@
+"""
+Ticks/sec and frames/sec of world engine: WorldService.world_control_start
+runs DemoGamePlugin headless (plugin sleeps are virtual) with in-process plugin
+host. Needs database set by POSTGRES_* or DATABASE_URL environment, SQLite
+stand-in is supported, e.g.
+
+    DATABASE_URL=sqlite+aiosqlite:///bench.db python -m benchmarks.engine_bench
+"""
+
+import asyncio
+import time
+
+from sqlalchemy import Column, Index, MetaData, Table
+
+from src import database, dto, models
+from src.utils.images import ImageFormat
+from src.world import world_service
+from src.world.plugin_host import LocalPluginHost
+from src.world.state_codec import StateCodec
+
+WARMUP_TICKS = 200
+
+
+def _create_sqlite_schema(conn):
+    step = models.Step.__table__
+    models.BaseOrmModel.metadata.create_all(
+        conn,
+        [
+            table
+            for table in models.BaseOrmModel.metadata.sorted_tables
+            if table is not step
+        ],
+    )
+    # SQLite autoincrements only single column primary key, partition key is
+    # part of it on PostgreSQL only
+    Table(
+        step.name,
+        MetaData(),
+        *(
+            Column(column.name, column.type, primary_key=column.name == "id")
+            for column in step.columns
+        ),
+        Index("ix_step_stage_id_id", "stage_id", "id"),
+    ).create(conn)
+
+
+async def prepare_database():
+    """
+    Creates schema in empty SQLite stand-in, PostgreSQL one is migrated already
+    """
+    if database.engine.dialect.name == "sqlite":
+        async with database.engine.begin() as conn:
+            await conn.run_sync(_create_sqlite_schema)
+
+
+async def measure(
+    service: world_service.WorldService,
+    name: str,
+    ticks: int,
+    persist_every: int = 1,
+    image_format: ImageFormat | None = None,
+    state_codec: StateCodec | None = None,
+):
+    async with database.SessionLocal() as db:
+        world = await world_service.create_world(
+            db, dto.WorldCreateDto(title=f"bench-{name}", plugin="DEMO_GAME")
+        )
+        world.state_codec = state_codec
+        await db.commit()
+    frames = 0
+
+    def on_frame(image_format: ImageFormat, frame: bytes):
+        nonlocal frames
+        frames += 1
+
+    async def run(max_steps: int):
+        await service.world_control_start(
+            world.id,
+            on_step_change=lambda event: None,
+            max_steps=max_steps,
+            headless=True,
+            persist_every=persist_every,
+            frame_formats=lambda: (image_format,) if image_format else (),
+            on_frame=on_frame,
+        )
+
+    try:
+        await run(WARMUP_TICKS)
+        frames = 0
+        started_at = time.perf_counter()
+        await run(ticks)
+        elapsed = time.perf_counter() - started_at
+    finally:
+        async with database.SessionLocal() as db:
+            await world_service.delete_world(db, world.id)
+
+    if image_format:
+        return dict(name=f"engine/{name}", value=frames / elapsed, unit="frames/s")
+    return dict(name=f"engine/{name}", value=ticks / elapsed, unit="ticks/s")
+
+
+async def run(ticks: int = 2000):
+    await prepare_database()
+    scenarios = [
+        dict(name="persist_all"),
+        dict(name="persist_all_msgpack", state_codec=StateCodec.MSGPACK),
+        dict(name="persist_sparse", persist_every=100),
+    ] + [
+        # frames are expensive, fewer ticks are enough
+        dict(
+            name=f"frames_{image_format}", persist_every=100, image_format=image_format
+        )
+        for image_format in ImageFormat
+    ]
+    results = []
+    with world_service.WorldService(LocalPluginHost()) as service:
+        try:
+            for scenario in scenarios:
+                scenario_ticks = ticks // 10 if "image_format" in scenario else ticks
+                results.append(await measure(service, ticks=scenario_ticks, **scenario))
+        finally:
+            await database.engine.dispose()
+    return results
+
+
+if __name__ == "__main__":
+    for result in asyncio.run(run()):
+        print(f"{result['name']:<36} {result['value']:>10.1f} {result['unit']}")
@@ -0,0 +1,86 @@
+"""
+Operations/sec of hot per-tick and per-request calls: DemoGamePlugin
+render_state, describe_state and parse_state, json_pydantic_dump of step
+payloads, and WsPubSubService fan-out.
+
+    python -m benchmarks.micro_bench
+"""
+
+import asyncio
+import time
+from typing import Callable
+
+from src.plugins.demo_game.demo_game import DemoGamePlugin, DemoGameState
+from src.utils.images import ImageFormat
+from src.utils.serde import json_pydantic_dump
+from src.world.world_core import WorldAction, WorldLogEntry
+
+from . import ws_fanout_bench
+
+# measured calls are repeated for at least this long
+MIN_DURATION = 0.5
+
+
+def measure_ops(name: str, call: Callable[[int], object]):
+    call(0)  # warm up caches
+    ops = 0
+    started_at = time.perf_counter()
+    while (elapsed := time.perf_counter() - started_at) < MIN_DURATION:
+        call(ops)
+        ops += 1
+    return dict(name=f"micro/{name}", value=ops / elapsed, unit="ops/s")
+
+
+def make_state(i: int):
+    return DemoGameState(
+        field_size=(24, 16), pos=(i % 24, (i * 7) % 16), velocity=(1, 1), score=i
+    )
+
+
+def run():
+    plugin = DemoGamePlugin()
+    states = [make_state(i) for i in range(64)]
+    state_dumps = [plugin.serialize_state(state) for state in states]
+    packed_states = [plugin.pack_state(state) for state in states]
+    logs = [
+        WorldLogEntry(level="DEBUG", message=f"vel_x={i} vel_y={-i}") for i in range(8)
+    ]
+    actions = [WorldAction(name="TURN_UP"), WorldAction(name="TURN_LEFT")]
+
+    results = [
+        measure_ops(
+            f"render_state/{image_format}",
+            lambda i: plugin.render_state_as(states[i % 64], image_format),
+        )
+        for image_format in ImageFormat
+    ]
+    results += [
+        measure_ops("describe_state", lambda i: plugin.describe_state(states[i % 64])),
+        measure_ops(
+            "parse_state/json", lambda i: plugin.parse_state(state_dumps[i % 64])
+        ),
+        measure_ops(
+            "parse_state/msgpack", lambda i: plugin.unpack_state(packed_states[i % 64])
+        ),
+        measure_ops("json_pydantic_dump/logs", lambda i: json_pydantic_dump(logs)),
+        measure_ops(
+            "json_pydantic_dump/actions", lambda i: json_pydantic_dump(actions)
+        ),
+    ]
+    plugin.release()
+
+    for subscribers in ws_fanout_bench.SUBSCRIBER_COUNTS:
+        fanout = asyncio.run(ws_fanout_bench.measure(subscribers, 20, 0))
+        results.append(
+            dict(
+                name=f"micro/ws_fanout/{subscribers}",
+                value=1000 / fanout["delivery_ms"],
+                unit="messages/s",
+            )
+        )
+    return results
+
+
+if __name__ == "__main__":
+    for result in run():
+        print(f"{result['name']:<36} {result['value']:>12.1f} {result['unit']}")
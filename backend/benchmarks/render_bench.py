@@ -0,0 +1,103 @@
+"""
+Frames/sec of DemoGamePlugin.render_state against the original per-cell ImageDraw
+renderer, across field sizes and encodings.
+
+    python -m benchmarks.render_bench
+"""
+
+import io
+import time
+from typing import Callable, List
+
+from PIL import Image, ImageDraw
+
+from src.plugins.demo_game.demo_game import DemoGamePlugin, DemoGameState
+from src.utils.images import ImageFormat
+
+FIELD_SIZES = [(24, 16), (64, 48), (160, 120)]
+
+
+def legacy_render_state(state: DemoGameState) -> bytes:
+    im_width = 640
+    im_height = 480
+    im = Image.new("RGB", (im_width, im_height))
+    draw = ImageDraw.Draw(im)
+    draw.line((0, 0) + im.size, fill=128)
+    draw.line((0, im.size[1], im.size[0], 0), fill=128)
+    cols, rows = state.field_size
+    field_size_px = (im_width / cols, im_height / rows)
+    current_col, current_row = state.pos
+
+    for col in range(cols):
+        for row in range(rows):
+            is_current = current_col == col and current_row == row
+            fill_color = (64, 0, 64)
+            if is_current:
+                fill_color = (255, 255, 0)
+            draw.rectangle(
+                (
+                    col * field_size_px[0],
+                    row * field_size_px[1],
+                    (col + 1) * field_size_px[0],
+                    (row + 1) * field_size_px[1],
+                ),
+                outline=255,
+                fill=fill_color,
+            )
+
+    ret = io.BytesIO()
+    im.save(ret, format="PNG")
+    return ret.getvalue()
+
+
+def measure_fps(render: Callable[[DemoGameState], bytes], states: List[DemoGameState]):
+    render(states[0])  # warm up caches
+    started_at = time.perf_counter()
+    for state in states:
+        render(state)
+    return len(states) / (time.perf_counter() - started_at)
+
+
+def make_states(field_size, frames: int):
+    cols, rows = field_size
+    return [
+        DemoGameState(
+            field_size=field_size,
+            pos=(i % cols, (i * 7) % rows),
+            velocity=(1, 1),
+            score=i,
+        )
+        for i in range(frames)
+    ]
+
+
+def run(frames: int = 50):
+    plugin = DemoGamePlugin()
+    results = []
+    for field_size in FIELD_SIZES:
+        states = make_states(field_size, frames)
+        results.append(
+            dict(
+                name="legacy/png",
+                field_size=field_size,
+                fps=measure_fps(legacy_render_state, states),
+            )
+        )
+        for image_format in ImageFormat:
+            results.append(
+                dict(
+                    name=f"vectorized/{image_format}",
+                    field_size=field_size,
+                    fps=measure_fps(
+                        lambda state: plugin.render_state_as(state, image_format),
+                        states,
+                    ),
+                )
+            )
+    return results
+
+
+if __name__ == "__main__":
+    for result in run():
+        cols, rows = result["field_size"]
+        print(f"{result['name']:<20} {cols:>4}x{rows:<4} {result['fps']:>10.1f} fps")
@@ -0,0 +1,120 @@
+"""
+Encode and decode throughput of plugin state per codec, for demo game state
+and a large synthetic state. Previous encoding through stdlib json with
+pydantic_encoder fallback is measured for comparison.
+
+    python -m benchmarks.state_codec_bench
+"""
+
+import json
+import random
+import time
+from typing import Dict, List, Tuple
+
+from pydantic import BaseModel
+from pydantic.json import pydantic_encoder
+
+from src.plugins.demo_game.demo_game import DemoGamePlugin, DemoGameState
+from src.world.state_codec import StateCodec, decode_state, encode_state
+from src.world.world_core import AbstractPlugin
+
+
+class Bot(BaseModel):
+    name: str
+    pos: Tuple[int, int]
+    velocity: Tuple[int, int]
+    health: float
+    inventory: List[str]
+    memory: Dict[str, int]
+
+
+class LargeState(BaseModel):
+    tick: int
+    bots: List[Bot]
+    field: List[List[int]]
+
+
+class LargeStatePlugin(DemoGamePlugin):
+    state_type = LargeState
+
+
+def make_large_state(bots: int = 500, field_size: int = 64, seed: int = 1):
+    rnd = random.Random(seed)
+    return LargeState(
+        tick=1000,
+        bots=[
+            Bot(
+                name=f"bot-{i}",
+                pos=(rnd.randrange(field_size), rnd.randrange(field_size)),
+                velocity=(rnd.randint(-1, 1), rnd.randint(-1, 1)),
+                health=rnd.random() * 100,
+                inventory=rnd.sample(["sword", "shield", "potion", "key", "map"], 3),
+                memory={f"k{j}": rnd.randrange(1000) for j in range(8)},
+            )
+            for i in range(bots)
+        ],
+        field=[
+            [rnd.randrange(4) for _ in range(field_size)] for _ in range(field_size)
+        ],
+    )
+
+
+def measure(name: str, plugin: AbstractPlugin, state: BaseModel, repeat: int):
+    results = []
+    legacy = json.dumps(state, default=pydantic_encoder)
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        json.dumps(state, default=pydantic_encoder)
+    encode_time = time.perf_counter() - started_at
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        plugin.parse_state(legacy)
+    decode_time = time.perf_counter() - started_at
+    results.append(("json-stdlib", len(legacy), encode_time, decode_time))
+
+    for codec in StateCodec:
+        dump = encode_state(plugin, state, codec)
+        started_at = time.perf_counter()
+        for _ in range(repeat):
+            encode_state(plugin, state, codec)
+        encode_time = time.perf_counter() - started_at
+        started_at = time.perf_counter()
+        for _ in range(repeat):
+            decode_state(plugin, dump)
+        decode_time = time.perf_counter() - started_at
+        results.append((codec.value, len(dump), encode_time, decode_time))
+
+    return [
+        dict(
+            state=name,
+            codec=codec,
+            bytes=size,
+            encode_per_sec=repeat / encode_time,
+            decode_per_sec=repeat / decode_time,
+        )
+        for codec, size, encode_time, decode_time in results
+    ]
+
+
+def run():
+    demo_state = DemoGameState(
+        field_size=(24, 16), pos=(3, 7), velocity=(1, -1), score=42
+    )
+    demo_plugin = DemoGamePlugin()
+    large_plugin = LargeStatePlugin()
+    try:
+        return measure("demo", demo_plugin, demo_state, 20000) + measure(
+            "large", large_plugin, make_large_state(), 50
+        )
+    finally:
+        demo_plugin.release()
+        large_plugin.release()
+
+
+if __name__ == "__main__":
+    for result in run():
+        print(
+            f"{result['state']:<6} {result['codec']:<12} {result['bytes']:>8} B "
+            f"encode {result['encode_per_sec']:>10.0f}/s "
+            f"decode {result['decode_per_sec']:>10.0f}/s"
+        )
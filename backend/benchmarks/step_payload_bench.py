@@ -0,0 +1,222 @@
+"""
+Stored size and encode/decode cost of step payloads (logs, interactions)
+per codec, on synthetic chatty logs of a bot-driven world. With `--db`, also
+write and read throughput of steps in database, JSON text columns used before
+payload codecs against binary ones:
+
+    python -m benchmarks.step_payload_bench
+    DATABASE_URL=sqlite+aiosqlite:///bench.db python -m benchmarks.step_payload_bench --db
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Callable, List
+
+from sqlalchemy import Column, Integer, LargeBinary, MetaData, Table, Text, select
+import zstandard as zstd
+
+from src import database
+from src.world.step_codec import (
+    ZSTD_DICT_HEADER,
+    ZSTD_HEADER,
+    ZSTD_LEVEL,
+    PayloadCodec,
+    PayloadEncoder,
+)
+
+TRAIN_STEPS = 2000
+# steps per transaction, as flushed by step writer
+DB_BATCH_SIZE = 100
+
+
+def make_payloads(steps: int, seed: int = 1) -> List[str]:
+    rnd = random.Random(seed)
+    ret = []
+    for step in range(steps):
+        logs = [
+            dict(
+                level=rnd.choice(["DEBUG", "INFO", "WARNING"]),
+                message=f"bot #{rnd.randrange(8)} moved to "
+                f"({rnd.randrange(64)}, {rnd.randrange(48)}) vel_x={rnd.randint(-1, 1)} "
+                f"vel_y={rnd.randint(-1, 1)} score={step + i}",
+            )
+            for i in range(rnd.randrange(2, 20))
+        ]
+        interactions = [
+            dict(
+                request=dict(bot=b, state=dict(pos=[rnd.randrange(64), 3], tick=step)),
+                response=dict(action=rnd.choice(["up", "down", "left", "right"])),
+            )
+            for b in range(rnd.randrange(0, 4))
+        ]
+        ret += [json.dumps(logs), json.dumps(interactions)]
+    return ret
+
+
+def measure(name: str, encoder: PayloadEncoder, decode, payloads: List[str]):
+    started_at = time.perf_counter()
+    encoded = [encoder.encode(payload) for payload in payloads]
+    encode_time = time.perf_counter() - started_at
+    started_at = time.perf_counter()
+    for data in encoded:
+        decode(data)
+    decode_time = time.perf_counter() - started_at
+    steps = len(payloads) / 2
+    return dict(
+        name=name,
+        bytes_per_step=sum(map(len, encoded)) / steps,
+        encode_us_per_step=encode_time / steps * 1e6,
+        decode_us_per_step=decode_time / steps * 1e6,
+    )
+
+
+def train_dictionary():
+    samples = [payload.encode() for payload in make_payloads(TRAIN_STEPS, seed=2)]
+    return zstd.train_dictionary(16 << 10, samples)
+
+
+def run(steps: int = 5000):
+    payloads = make_payloads(steps)
+    dictionary = train_dictionary()
+    decompressor = zstd.ZstdDecompressor()
+    dict_decompressor = zstd.ZstdDecompressor(dict_data=dictionary)
+
+    def decode(data: bytes, header_size: int, decompressor: zstd.ZstdDecompressor):
+        if data[:1] in (b"[", b"{"):
+            return data.decode()
+        return decompressor.decompress(data[header_size:]).decode()
+
+    return [
+        measure(
+            "plain",
+            PayloadEncoder(PayloadCodec.PLAIN),
+            lambda data: data.decode(),
+            payloads,
+        ),
+        measure(
+            f"zstd-{ZSTD_LEVEL}",
+            PayloadEncoder(PayloadCodec.ZSTD),
+            lambda data: decode(data, 1, decompressor),
+            payloads,
+        ),
+        measure(
+            f"zstd-{ZSTD_LEVEL}-dict",
+            PayloadEncoder(PayloadCodec.ZSTD_DICT, 1, dictionary),
+            lambda data: decode(data, 5, dict_decompressor),
+            payloads,
+        ),
+    ]
+
+
+async def measure_db(
+    name: str,
+    column_type,
+    encode: Callable,
+    decode: Callable,
+    payloads: List[str],
+):
+    """
+    Steps per second written in batches and read back with decoded payloads,
+    in scratch table of benchmark database
+    """
+    table = Table(
+        f"bench_step_payload_{name.replace('-', '_')}",
+        MetaData(),
+        Column("id", Integer, primary_key=True),
+        Column("logs", column_type, nullable=False),
+        Column("interactions", column_type, nullable=False),
+    )
+    async with database.engine.begin() as conn:
+        await conn.run_sync(table.drop, checkfirst=True)
+        await conn.run_sync(table.create)
+    try:
+        steps = len(payloads) // 2
+        # payloads are encoded on flush path of step writer, so it is counted
+        started_at = time.perf_counter()
+        for first in range(0, steps, DB_BATCH_SIZE):
+            rows = [
+                dict(
+                    id=i + 1,
+                    logs=encode(payloads[2 * i]),
+                    interactions=encode(payloads[2 * i + 1]),
+                )
+                for i in range(first, min(first + DB_BATCH_SIZE, steps))
+            ]
+            async with database.engine.begin() as conn:
+                await conn.execute(table.insert(), rows)
+        write_time = time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        async with database.engine.connect() as conn:
+            for logs, interactions in await conn.execute(
+                select(table.c.logs, table.c.interactions).order_by(table.c.id)
+            ):
+                decode(logs), decode(interactions)
+        read_time = time.perf_counter() - started_at
+    finally:
+        async with database.engine.begin() as conn:
+            await conn.run_sync(table.drop)
+    return dict(
+        name=name,
+        write_steps_per_second=steps / write_time,
+        read_steps_per_second=steps / read_time,
+    )
+
+
+async def run_db(steps: int = 5000):
+    payloads = make_payloads(steps)
+    dictionary = train_dictionary()
+    decompressor = zstd.ZstdDecompressor()
+    dict_decompressor = zstd.ZstdDecompressor(dict_data=dictionary)
+
+    # same as step_codec.decode_payload, without dictionary lookup
+    def decode(data: bytes):
+        header = data[:1]
+        if header == ZSTD_HEADER:
+            return decompressor.decompress(data[1:]).decode()
+        if header == ZSTD_DICT_HEADER:
+            return dict_decompressor.decompress(data[5:]).decode()
+        return data.decode()
+
+    results = [
+        # layout before payload codecs
+        await measure_db(
+            "json-text", Text, lambda payload: payload, lambda v: v, payloads
+        )
+    ]
+    for name, encoder in (
+        ("plain", PayloadEncoder(PayloadCodec.PLAIN)),
+        (f"zstd-{ZSTD_LEVEL}", PayloadEncoder(PayloadCodec.ZSTD)),
+        (
+            f"zstd-{ZSTD_LEVEL}-dict",
+            PayloadEncoder(PayloadCodec.ZSTD_DICT, 1, dictionary),
+        ),
+    ):
+        results.append(
+            await measure_db(name, LargeBinary, encoder.encode, decode, payloads)
+        )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", action="store_true")
+    parser.add_argument("--steps", type=int, default=5000)
+    args = parser.parse_args()
+
+    for result in run(args.steps):
+        print(
+            f"{result['name']:<14} {result['bytes_per_step']:>8.0f} B/step "
+            f"encode {result['encode_us_per_step']:>6.1f} us/step "
+            f"decode {result['decode_us_per_step']:>6.1f} us/step"
+        )
+    if args.db:
+        for result in asyncio.run(run_db(args.steps)):
+            print(
+                f"{result['name']:<14} "
+                f"write {result['write_steps_per_second']:>8.0f} steps/s "
+                f"read {result['read_steps_per_second']:>8.0f} steps/s"
+            )
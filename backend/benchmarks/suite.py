@@ -0,0 +1,88 @@
+"""
+Runs world engine and micro benchmarks, writes machine-readable results and
+compares them with baseline results of previous run. Exits with status 1 if any
+result is slower than baseline by more than tolerance, so regressions are
+caught before deploy:
+
+    DATABASE_URL=sqlite+aiosqlite:///bench.db python -m benchmarks.suite \\
+        --output bench.json --baseline baseline.json --tolerance 0.15
+
+Results are throughputs, higher is better.
+"""
+
+import argparse
+import asyncio
+from datetime import datetime, timezone
+import json
+import platform
+import sys
+from typing import Dict, List
+
+from src import database
+
+from . import engine_bench, micro_bench
+
+
+def compare(results: List[dict], baseline: List[dict], tolerance: float):
+    """
+    Returns names of results which regressed, missing ones are not compared
+    """
+    baseline_values: Dict[str, float] = {
+        result["name"]: result["value"] for result in baseline
+    }
+    regressions = []
+    for result in results:
+        base_value = baseline_values.get(result["name"])
+        if not base_value:
+            continue
+        change = result["value"] / base_value - 1
+        result["baseline"] = base_value
+        result["change"] = change
+        if change < -tolerance:
+            regressions.append(result["name"])
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", help="file to write JSON results to")
+    parser.add_argument("--baseline", help="JSON results to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    parser.add_argument("--ticks", type=int, default=2000)
+    parser.add_argument("--skip-engine", action="store_true")
+    args = parser.parse_args()
+
+    results = micro_bench.run()
+    if not args.skip_engine:
+        results += asyncio.run(engine_bench.run(args.ticks))
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)["results"], args.tolerance)
+
+    report = dict(
+        created_at=datetime.now(timezone.utc).isoformat(),
+        python=platform.python_version(),
+        machine=platform.machine(),
+        database=database.engine.dialect.name,
+        results=results,
+        regressions=regressions,
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    for result in results:
+        change = result.get("change")
+        print(
+            f"{result['name']:<36} {result['value']:>12.1f} {result['unit']:<10}"
+            + (f" {change:+7.1%}" if change is not None else "")
+        )
+    if regressions:
+        print(f"Regressed beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
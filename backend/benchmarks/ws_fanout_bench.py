@@ -0,0 +1,102 @@
+"""
+Fan-out of WsPubSubService to thousands of subscribers of a single topic:
+time to publish (publisher side only), time until every subscriber got the
+message, and how many messages slow subscribers got coalesced.
+
+    python -m benchmarks.ws_fanout_bench
+"""
+
+import asyncio
+import time
+from typing import List
+
+from src.dto import NoopEventWsDto
+from src.utils.ws import WsPubSubService
+
+SUBSCRIBER_COUNTS = [100, 1000, 5000]
+TOPIC = "bench"
+
+
+class FakeWebSocket:
+    """
+    Socket which never disconnects by itself, sending takes `send_delay` seconds
+    """
+
+    def __init__(self, send_delay: float) -> None:
+        self.send_delay = send_delay
+        self.received = 0
+        self.got_message = asyncio.Event()
+        self.__closed = asyncio.Event()
+
+    async def accept(self): ...
+
+    async def send_text(self, message: str):
+        if self.send_delay:
+            await asyncio.sleep(self.send_delay)
+        self.received += 1
+        self.got_message.set()
+
+    async def send_bytes(self, message: bytes):
+        await self.send_text("")
+
+    async def receive(self):
+        await self.__closed.wait()
+        return {"type": "websocket.disconnect"}
+
+    async def close(self):
+        self.__closed.set()
+
+
+async def measure(subscribers: int, messages: int, send_delay: float):
+    ws_ps = WsPubSubService(max_queue_size=16)
+    sockets: List[FakeWebSocket] = [
+        FakeWebSocket(send_delay) for _ in range(subscribers)
+    ]
+    tasks = [asyncio.create_task(ws_ps.subscribe(TOPIC, s)) for s in sockets]
+    await asyncio.sleep(0)
+
+    publish_time = 0.0
+    started_at = time.perf_counter()
+    for _ in range(messages):
+        for s in sockets:
+            s.got_message.clear()
+        publish_started_at = time.perf_counter()
+        ws_ps.publish(TOPIC, NoopEventWsDto(), coalesce_key="status")
+        publish_time += time.perf_counter() - publish_started_at
+        if not send_delay:
+            await asyncio.gather(*(s.got_message.wait() for s in sockets))
+    if send_delay:
+        await asyncio.sleep(send_delay * 3)
+    delivery_time = time.perf_counter() - started_at
+
+    with ws_ps:
+        ...
+    await asyncio.gather(*tasks)
+    return dict(
+        subscribers=subscribers,
+        send_delay_ms=send_delay * 1000,
+        publish_us=publish_time / messages * 1e6,
+        delivery_ms=delivery_time / messages * 1000,
+        received_per_subscriber=sum(s.received for s in sockets) / subscribers,
+        messages=messages,
+    )
+
+
+def run(messages: int = 20):
+    results = []
+    for subscribers in SUBSCRIBER_COUNTS:
+        results.append(asyncio.run(measure(subscribers, messages, 0)))
+        # slow consumers, publisher must not wait for them
+        results.append(asyncio.run(measure(subscribers, messages, 0.05)))
+    return results
+
+
+if __name__ == "__main__":
+    for result in run():
+        print(
+            f"{result['subscribers']:>6} subscribers "
+            f"send {result['send_delay_ms']:>4.0f} ms: "
+            f"publish {result['publish_us']:>8.1f} us, "
+            f"delivered in {result['delivery_ms']:>7.2f} ms, "
+            f"received {result['received_per_subscriber']:.1f} of {result['messages']}"
+        )
@@ -1,22 +1,37 @@
-from sqlalchemy import Column, Integer, create_engine
-from sqlalchemy.orm import DeclarativeBase, sessionmaker
+from sqlalchemy import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 import os
 
-db_name = os.environ["POSTGRES_DB"]
-db_host = os.environ["POSTGRES_HOST"]
-db_user = os.environ["POSTGRES_USER"]
-db_password = os.environ["POSTGRES_PASSWORD"]
+# full SQLAlchemy URL, e.g. SQLite stand-in for benchmarks, PostgreSQL from
+# POSTGRES_* environment if not set
+database_url = os.environ.get("DATABASE_URL")
+if not database_url:
+    db_name = os.environ["POSTGRES_DB"]
+    db_host = os.environ["POSTGRES_HOST"]
+    db_user = os.environ["POSTGRES_USER"]
+    db_password = os.environ["POSTGRES_PASSWORD"]
+    database_url = f"postgresql+asyncpg://{db_user}:{db_password}@{db_host}/{db_name}"
 
-engine = create_engine(f"postgresql://{db_user}:{db_password}@{db_host}/{db_name}")
+# running worlds borrow a connection only while their step writer flushes a batch,
+# so the pool is shared with HTTP and websocket handlers
+db_pool_size = int(os.environ.get("DB_POOL_SIZE", "20"))
+db_max_overflow = int(os.environ.get("DB_MAX_OVERFLOW", "20"))
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# SQLite connections aren't pooled
+pool_options = (
+    {}
+    if make_url(database_url).get_backend_name() == "sqlite"
+    else dict(pool_size=db_pool_size, max_overflow=db_max_overflow, pool_pre_ping=True)
+)
 
+engine = create_async_engine(database_url, **pool_options)
+
+SessionLocal = async_sessionmaker(
+    bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
 
 
 # Dependency
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
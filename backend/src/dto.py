@@ -1,7 +1,10 @@
-from typing import List, Optional, Tuple
-from pydantic import BaseModel, ConfigDict
+from typing import Dict, List, Optional, Tuple
+from pydantic import BaseModel, ConfigDict, Field
 from pydantic.alias_generators import to_camel
 
+from .world.plugin_log import LogLevel
+from .world.state_codec import StateCodec
+
 
 class BaseDtoModel(BaseModel):
     model_config = ConfigDict(
@@ -18,21 +21,35 @@ class WorldBaseDto(BaseDtoModel):
 
 class WorldCreateDto(WorldBaseDto):
     plugin: str
+    config: Optional[str] = None
 
 
 class WorldUpdateDto(WorldBaseDto):
     config: str
+    keyframe_interval: Optional[int] = None
+    # enums are given by their values, strict mode accepts only instances
+    state_codec: Optional[StateCodec] = Field(default=None, strict=False)
+    tick_rate: Optional[float] = Field(default=None, gt=0)
+    log_level: Optional[LogLevel] = Field(default=None, strict=False)
 
 
 class WorldDto(WorldBaseDto):
     id: int
     plugin: str
     config: Optional[str]
+    keyframe_interval: Optional[int] = None
+    state_codec: Optional[str] = None
+    parent_world_id: Optional[int] = None
+    fork_step_id: Optional[int] = None
+    tick_rate: Optional[float] = None
+    log_level: Optional[str] = None
 
 
 class ExtendedWorldDto(WorldDto):
     initialized: bool
     running: bool
+    last_step_id: Optional[int] = None
+    step_count: int = 0
 
 
 class StageDto(BaseDtoModel):
@@ -46,9 +63,30 @@ class WorldStatusStepDto(BaseDtoModel):
     stage_id: int
 
 
+class WorldStatusStageDto(BaseDtoModel):
+    id: int
+    first_step_id: int
+    last_step_id: int
+    step_count: int
+
+
 class WorldStatusDto(BaseDtoModel):
     is_running: bool
+    ticks_per_second: Optional[float] = None
+    # tick rate world is paced at and deadlines it missed, during last run
+    target_ticks_per_second: Optional[float] = None
+    missed_deadlines: int = 0
+    # steps after requested cursor, ordered by id
     steps: List[WorldStatusStepDto]
+    # more steps after the last returned one
+    has_more: bool = False
+    # stages of returned steps
+    stages: List[WorldStatusStageDto] = []
+    # latest step of world, regardless of cursor
+    last_step_id: Optional[int] = None
+    step_count: int = 0
+    # changes when history is cleared or rewritten, steps held are stale then
+    history_generation: int = 0
 
 
 class StepDto(BaseDtoModel):
@@ -59,5 +97,99 @@ class StepDto(BaseDtoModel):
     interactions: str
 
 
+class FrameCacheStatsDto(BaseDtoModel):
+    hits: int
+    misses: int
+    collapsed: int
+    evictions: int
+    entries: int
+    size_bytes: int
+    max_bytes: int
+
+
+class PluginStatsDto(BaseDtoModel):
+    resident: int
+    running: int
+    snapshots: int
+    snapshot_bytes: int
+    evictions: int
+    restores: int
+    memory_bytes: int
+
+
+class BatchRunCreateDto(BaseDtoModel):
+    title: str
+    plugin: str
+    # one world is created per config
+    configs: List[str] = Field(min_length=1)
+    max_steps: int = Field(ge=1)
+    persist_every: int = Field(default=1, ge=1)
+    # worlds running at once, BATCH_RUN_CONCURRENCY if not set
+    concurrency: Optional[int] = Field(default=None, ge=1)
+
+
+class BatchRunItemDto(BaseDtoModel):
+    world_id: Optional[int] = None
+    config: str
+    status: str
+    ticks: int
+    # describe_state of last step, once world is done
+    describe: Optional[Dict[str, str]] = None
+    error: Optional[str] = None
+
+
+class BatchRunMetricDto(BaseDtoModel):
+    # numeric describe_state value across done worlds
+    name: str
+    count: int
+    min: float
+    max: float
+    mean: float
+
+
+class BatchRunDto(BaseDtoModel):
+    id: int
+    title: str
+    plugin: str
+    status: str
+    max_steps: int
+    total: int
+    pending: int
+    running: int
+    done: int
+    failed: int
+    cancelled: int
+    # ticks of all worlds of batch, throughput is over its wall time
+    ticks: int
+    ticks_per_second: Optional[float] = None
+    elapsed_seconds: float
+    runs: List[BatchRunItemDto]
+    metrics: List[BatchRunMetricDto]
+
+
+class AddedActionsWsDto(BaseDtoModel):
+    # reply to message of action channel
+    accepted: int = 0
+    coalesced: int = 0
+    dropped: int = 0
+    error: Optional[str] = None
+
+
 class NoopEventWsDto(BaseModel):
     status: str = "OK"
+
+
+class WorldTickEventDto(BaseDtoModel):
+    world_id: int
+    # last persisted step
+    step_id: int
+    stage_id: int
+    stage_code: str
+    # steps persisted since previous event
+    new_steps: int
+    is_running: bool
+    # describe_state of last step, if requested by any subscriber
+    describe: Optional[Dict[str, str]] = None
+    # log entries by level since previous event
+    log_counts: Dict[str, int] = {}
+    last_log: Optional[str] = None
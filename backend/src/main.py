@@ -4,10 +4,12 @@ import os
 from fastapi import FastAPI
 
 from .world.world_service import WORLD_SERIVCE_NAME, WorldService
+from .world.batch_runs import BATCH_RUN_SERVICE_NAME, BatchRunService
 
 from .utils.ws import WS_PS_SERIVCE_NAME, WsPubSubService
 from .routes import routers
 from .models import create_all_tables
+from .database import engine
 
 logging.basicConfig(level=os.environ.get("LOG_LEVEL", "WARNING").upper())
 
@@ -17,11 +19,22 @@ logger = logging.getLogger(__name__)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
 
-    create_all_tables()
+    await create_all_tables()
 
-    with WsPubSubService() as ws_ps:
+    with WsPubSubService() as ws_ps, WorldService() as w_service, BatchRunService(
+        w_service
+    ) as b_service:
 
-        yield {WS_PS_SERIVCE_NAME: ws_ps, WORLD_SERIVCE_NAME: WorldService()}
+        yield {
+            WS_PS_SERIVCE_NAME: ws_ps,
+            WORLD_SERIVCE_NAME: w_service,
+            BATCH_RUN_SERVICE_NAME: b_service,
+        }
+
+        # batch worlds are stopped before world service releases plugins
+        await b_service.close()
+
+    await engine.dispose()
 
 
 app = FastAPI(lifespan=lifespan, root_path=os.environ["API_BASE_URI"])
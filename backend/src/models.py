@@ -1,6 +1,15 @@
 from typing import List, Optional
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Text
+from sqlalchemy import (
+    Boolean,
+    Column,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+    Text,
+)
 
 from . import database
 
@@ -15,6 +24,17 @@ class World(BaseOrmModel):
     title: Mapped[str] = mapped_column()
     plugin: Mapped[str] = mapped_column()
     config: Mapped[Optional[str]] = mapped_column(Text)
+    # store full state every N steps and deltas in between, full states if not set
+    keyframe_interval: Mapped[Optional[int]] = mapped_column()
+    # codec of stored full states, see world.state_codec, JSON if not set
+    state_codec: Mapped[Optional[str]] = mapped_column()
+    # forked world inherits history of parent up to fork step, see world.world_lineage
+    parent_world_id: Mapped[Optional[int]] = mapped_column(ForeignKey("world.id"))
+    fork_step_id: Mapped[Optional[int]] = mapped_column()
+    # ticks per second, default one of plugin if not set
+    tick_rate: Mapped[Optional[float]] = mapped_column()
+    # minimum level of stored plugin logs, see world.plugin_log
+    log_level: Mapped[Optional[str]] = mapped_column()
     stages: Mapped[List["Stage"]] = relationship(back_populates="world")
 
 
@@ -22,8 +42,12 @@ class Stage(BaseOrmModel):
     __tablename__ = "stage"
 
     title: Mapped[str] = mapped_column()
-    world_id: Mapped[int] = mapped_column(ForeignKey("world.id"))
+    world_id: Mapped[int] = mapped_column(ForeignKey("world.id"), index=True)
     code: Mapped[str] = mapped_column()
+    # summary of stage steps, maintained by step writer
+    first_step_id: Mapped[Optional[int]] = mapped_column()
+    last_step_id: Mapped[Optional[int]] = mapped_column()
+    step_count: Mapped[int] = mapped_column(default=0, server_default="0")
     steps: Mapped[List["Step"]] = relationship(back_populates="stage")
     world: Mapped["World"] = relationship(back_populates="stages")
 
@@ -31,13 +55,48 @@ class Stage(BaseOrmModel):
 class Step(BaseOrmModel):
     __tablename__ = "step"
 
+    # primary key of partitioned table includes partition key, see world.step_partitions
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    # denormalized world of stage, partition key
+    world_id: Mapped[int] = mapped_column(ForeignKey("world.id"), primary_key=True)
     stage_id: Mapped[int] = mapped_column(ForeignKey("stage.id"))
-    state: Mapped[str] = mapped_column(Text)
+    # JSON state or delta, binary states are stored in packed_state instead
+    state: Mapped[Optional[str]] = mapped_column(Text)
+    packed_state: Mapped[Optional[bytes]] = mapped_column(LargeBinary)
     actions: Mapped[str] = mapped_column(Text)
-    logs: Mapped[str] = mapped_column(Text)
-    interactions: Mapped[str] = mapped_column(Text)
+    # JSON encoded by step payload codec, see world.step_codec
+    logs: Mapped[bytes] = mapped_column(LargeBinary)
+    interactions: Mapped[bytes] = mapped_column(LargeBinary)
+    # keyframe step, if state holds delta to its state
+    base_step_id: Mapped[Optional[int]] = mapped_column()
     stage: Mapped["Stage"] = relationship(back_populates="steps")
 
+    __table_args__ = (
+        Index("ix_step_stage_id_id", "stage_id", "id"),
+        {"postgresql_partition_by": "LIST (world_id)"},
+    )
 
-def create_all_tables():
-    BaseOrmModel.metadata.create_all(bind=database.engine)
+
+class WorldHead(BaseOrmModel):
+    __tablename__ = "world_head"
+
+    # latest persisted step of world, maintained by step writer
+    world_id: Mapped[int] = mapped_column(ForeignKey("world.id"), unique=True)
+    last_step_id: Mapped[Optional[int]] = mapped_column()
+    last_stage_id: Mapped[Optional[int]] = mapped_column()
+    step_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    # bumped when history is rewritten, so clients know to reload it
+    history_generation: Mapped[int] = mapped_column(default=0, server_default="0")
+
+
+class CodecDictionary(BaseOrmModel):
+    __tablename__ = "codec_dictionary"
+
+    # zstd dictionary trained on step payloads of plugin worlds
+    plugin: Mapped[str] = mapped_column()
+    data: Mapped[bytes] = mapped_column(LargeBinary)
+
+
+async def create_all_tables():
+    async with database.engine.begin() as conn:
+        await conn.run_sync(BaseOrmModel.metadata.create_all)
@@ -8,3 +8,9 @@ PLUGINS: Dict[str, Callable[[], Type[AbstractPlugin]]] = {
         ".demo_game.demo_game", __package__
     ).DemoGamePlugin
 }
+
+
+def get_plugin_class(plugin: str) -> Type[AbstractPlugin]:
+    if not plugin in PLUGINS:
+        raise RuntimeError(f"Plugin {plugin} not defined")
+    return PLUGINS[plugin]()
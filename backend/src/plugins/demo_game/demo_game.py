@@ -1,12 +1,22 @@
 from enum import StrEnum
+from functools import lru_cache
 from typing import Dict, Tuple
-import asyncio
-import io
 
 from pydantic import BaseModel
 from ...world.world_core import AbstractPlugin, ExternalInput, WorldActionDef
+from ...utils.images import ImageFormat, encode_image
 
-from PIL import Image, ImageDraw
+from PIL import Image
+import numpy as np
+
+IMAGE_WIDTH = 640
+IMAGE_HEIGHT = 480
+
+# palette indexes, frames are rendered as paletted images
+CELL_COLOR_INDEX = 0
+BORDER_COLOR_INDEX = 1
+CURRENT_CELL_COLOR_INDEX = 2
+GRID_PALETTE = [64, 0, 64] + [255, 0, 0] + [255, 255, 0]
 
 
 class ActionName(StrEnum):
@@ -16,6 +26,15 @@ class ActionName(StrEnum):
     TURN_RIGHT = "TURN_RIGHT"
 
 
+class DemoGameConfig(BaseModel):
+    """
+    JSON config of world, e.g. {"field_size": [64, 48], "velocity": [1, -1]}
+    """
+
+    field_size: Tuple[int, int] = (24, 16)
+    velocity: Tuple[int, int] = (1, 1)
+
+
 class DemoGameState(BaseModel):
     field_size: Tuple[int, int]
     pos: Tuple[int, int]
@@ -23,7 +42,28 @@ class DemoGameState(BaseModel):
     score: int
 
 
+@lru_cache(maxsize=32)
+def make_grid_background(cols: int, rows: int, width: int, height: int):
+    """
+    Static part of the frame, depends only on field and image size.
+    Returns read-only palette index array and pixel edges of columns and rows.
+    """
+    x_edges = (np.arange(cols + 1) * width / cols).astype(np.intp)
+    y_edges = (np.arange(rows + 1) * height / rows).astype(np.intp)
+    background = np.full((height, width), CELL_COLOR_INDEX, dtype=np.uint8)
+    # far borders of last column and row fall outside of the image
+    background[:, x_edges[x_edges < width]] = BORDER_COLOR_INDEX
+    background[y_edges[y_edges < height], :] = BORDER_COLOR_INDEX
+    background.setflags(write=False)
+    return background, tuple(x_edges.tolist()), tuple(y_edges.tolist())
+
+
 class DemoGamePlugin(AbstractPlugin[DemoGameState]):
+    state_type = DemoGameState
+    # the last turn of tick wins anyway
+    coalesce_actions = True
+    default_tick_rate = 5
+
     def __init__(self) -> None:
         super().__init__()
 
@@ -45,38 +85,25 @@ class DemoGamePlugin(AbstractPlugin[DemoGameState]):
         ]
 
     def render_state(self, state: DemoGameState):
-        im_width = 640
-        im_height = 480
-        im = Image.new("RGB", (im_width, im_height))
-        draw = ImageDraw.Draw(im)
-        draw.line((0, 0) + im.size, fill=128)
-        draw.line((0, im.size[1], im.size[0], 0), fill=128)
+        return self.render_state_as(state, ImageFormat.PNG)
+
+    def render_state_as(self, state: DemoGameState, image_format: ImageFormat):
         cols, rows = state.field_size
-        field_size_px = (im_width / cols, im_height / rows)
+        background, x_edges, y_edges = make_grid_background(
+            cols, rows, IMAGE_WIDTH, IMAGE_HEIGHT
+        )
         current_col, current_row = state.pos
 
-        for col in range(cols):
-            for row in range(rows):
-                is_current = current_col == col and current_row == row
-                fill_color = (64, 0, 64)
-                if is_current:
-                    fill_color = (255, 255, 0)
-                draw.rectangle(
-                    (
-                        col * field_size_px[0],
-                        row * field_size_px[1],
-                        (col + 1) * field_size_px[0],
-                        (row + 1) * field_size_px[1],
-                    ),
-                    outline=255,
-                    fill=fill_color,
-                )
-
-        ret = io.BytesIO()
-        im.save(ret, format="PNG")
-        ret = ret.getvalue()
-
-        return ret
+        frame = background.copy()
+        # fill inside of cell borders, same as rectangle with outline
+        frame[
+            y_edges[current_row] + 1 : y_edges[current_row + 1],
+            x_edges[current_col] + 1 : x_edges[current_col + 1],
+        ] = CURRENT_CELL_COLOR_INDEX
+
+        im = Image.fromarray(frame)
+        im.putpalette(GRID_PALETTE)
+        return encode_image(im, image_format)
 
     def describe_state(self, state: DemoGameState) -> Dict[str, str]:
         return {
@@ -85,12 +112,18 @@ class DemoGamePlugin(AbstractPlugin[DemoGameState]):
             "chances": str(state.score % 61 + 7),
         }
 
-    def parse_state(self, state_dump: str) -> DemoGameState:
-        return DemoGameState.model_validate_json(state_dump)
-
     async def initialize(self):
-
-        return DemoGameState(field_size=(24, 16), pos=(0, 0), velocity=(1, 1), score=0)
+        config = (
+            DemoGameConfig.model_validate_json(self.config)
+            if self.config
+            else DemoGameConfig()
+        )
+        return DemoGameState(
+            field_size=config.field_size,
+            pos=(0, 0),
+            velocity=config.velocity,
+            score=0,
+        )
 
     async def step(
         self,
@@ -125,7 +158,7 @@ class DemoGamePlugin(AbstractPlugin[DemoGameState]):
             (state.pos[0] + vel_x) % state.field_size[0],
             (state.pos[1] + vel_y) % state.field_size[1],
         )
-        self.logger.debug(f"{vel_x=} {vel_y=}")
+        self.logger.debug("vel_x=%s vel_y=%s", vel_x, vel_y)
         # self.logger.info("It is long info. " * 10)
         # self.logger.warning("It is long warning. " * 10)
         # self.logger.error("It is long error. " * 10)
@@ -133,6 +166,5 @@ class DemoGamePlugin(AbstractPlugin[DemoGameState]):
         state.velocity = (vel_x, vel_y)
 
         # self.logger.info(f"Current speed: {vel_x=} {vel_y=}")
-        await asyncio.sleep(0.2)
 
         return state
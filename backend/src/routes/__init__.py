@@ -1,4 +1,4 @@
-from . import worlds, steps
+from . import batch_runs, metrics, worlds, steps
 
 
-routers = [worlds.router, steps.router]
+routers = [worlds.router, steps.router, batch_runs.router, metrics.router]
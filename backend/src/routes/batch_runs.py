@@ -0,0 +1,45 @@
+import logging
+from typing import Annotated, List
+from fastapi import APIRouter, Path, Request
+
+from ..dto import BatchRunCreateDto, BatchRunDto
+from ..world.batch_runs import get_batch_run_service
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/batch-runs")
+
+
+@router.get("", response_model=List[BatchRunDto])
+async def read(request: Request):
+    b_service = get_batch_run_service(request.state)
+    return [batch_run.to_dto() for batch_run in b_service.get_all()]
+
+
+@router.post("", response_model=BatchRunDto)
+async def create(request: Request, item: BatchRunCreateDto):
+    """
+    Creates world per config and runs them headless to `maxSteps`
+    """
+    b_service = get_batch_run_service(request.state)
+    return b_service.create(item).to_dto()
+
+
+@router.get("/{entityId}", response_model=BatchRunDto)
+async def read_one(
+    request: Request,
+    entity_id: Annotated[int, Path(alias="entityId")],
+):
+    b_service = get_batch_run_service(request.state)
+    return b_service.get(entity_id).to_dto()
+
+
+@router.post("/{entityId}/cancel", response_model=BatchRunDto)
+async def cancel(
+    request: Request,
+    entity_id: Annotated[int, Path(alias="entityId")],
+):
+    b_service = get_batch_run_service(request.state)
+    batch_run = b_service.get(entity_id)
+    batch_run.cancel()
+    return batch_run.to_dto()
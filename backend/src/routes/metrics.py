@@ -0,0 +1,14 @@
+from fastapi import APIRouter, Response
+
+from ..utils.metrics import METRICS_MEDIA_TYPE, Histogram, registry
+
+router = APIRouter()
+
+request_seconds = Histogram(
+    "http_request_seconds", "Time to handle request of hot route", ["route"]
+)
+
+
+@router.get("/metrics", response_class=Response)
+async def read_metrics():
+    return Response(content=registry.render(), media_type=METRICS_MEDIA_TYPE)
@@ -1,51 +1,74 @@
 import logging
 from typing import Annotated, List
-from fastapi import APIRouter, Depends, Path, Request, Response
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Path, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..dto import StepDto
+from ..dto import FrameCacheStatsDto, StepDto
 from ..database import get_db
 from ..world import world_service
+from ..utils.images import IMAGE_MEDIA_TYPES, ImageFormat
+from .metrics import request_seconds
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/steps")
 
+render_request_seconds = request_seconds.labels("render_step")
+describe_request_seconds = request_seconds.labels("describe_step")
+
 
 # @router.get("", response_model=List[StepDto])
-# async def read(db: Session = Depends(get_db)):
+# async def read(db: AsyncSession = Depends(get_db)):
 #     return world_service.get_steps(db)
 
 
+@router.get("/render-cache", response_model=FrameCacheStatsDto)
+async def read_render_cache_stats(request: Request):
+    w_service = world_service.get_world_service(request.state)
+    return w_service.get_frame_cache_stats()
+
+
 @router.get("/{entityId}", response_model=StepDto)
 async def read_one(
-    entity_id: Annotated[int, Path(alias="entityId")], db: Session = Depends(get_db)
+    request: Request,
+    entity_id: Annotated[int, Path(alias="entityId")],
+    db: AsyncSession = Depends(get_db),
 ):
-    return world_service.get_step(db, entity_id)
+    w_service = world_service.get_world_service(request.state)
+    return await w_service.get_step_dto(db, entity_id)
 
 
 @router.get(
     "/{entityId}/render",
-    responses={200: {"content": {"image/png": {}}}},
+    responses={
+        200: {"content": {media_type: {} for media_type in IMAGE_MEDIA_TYPES.values()}}
+    },
     response_class=Response,
 )
-def render_step_state(
+async def render_step_state(
     request: Request,
     entity_id: Annotated[int, Path(alias="entityId")],
-    db: Session = Depends(get_db),
+    image_format: Annotated[ImageFormat, Query(alias="format")] = ImageFormat.PNG,
 ):
 
     w_service = world_service.get_world_service(request.state)
-    image_bytes: bytes = w_service.render_step_state(db, entity_id)
+    with render_request_seconds.time():
+        image_bytes: bytes = await w_service.render_step_state(entity_id, image_format)
     # media_type here sets the media type of the actual response sent to the client.
-    return Response(content=image_bytes, media_type="image/png")
+    return Response(
+        content=image_bytes,
+        media_type=IMAGE_MEDIA_TYPES[image_format],
+        # steps are immutable, let browser keep frames while scrubbing timeline
+        headers={"Cache-Control": "public, max-age=31536000, immutable"},
+    )
 
 
 @router.get("/{entityId}/describe")
-def describe_step_state(
+async def describe_step_state(
     request: Request,
     entity_id: Annotated[int, Path(alias="entityId")],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     w_service = world_service.get_world_service(request.state)
-    return w_service.describe_step_state(db, entity_id)
+    with describe_request_seconds.time():
+        return await w_service.describe_step_state(db, entity_id)
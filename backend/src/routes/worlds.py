@@ -1,4 +1,5 @@
 import logging
+import time
 from typing import Annotated, List, Optional
 from fastapi import (
     APIRouter,
@@ -9,23 +10,43 @@ from fastapi import (
     Query,
     Request,
     WebSocket,
+    WebSocketDisconnect,
+    WebSocketException,
+    status,
 )
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..world.world_core import WorldAction
+from ..world.bot_lockstep import BotConnection
+from ..world.step_writer import StepWriterConfig
+from ..world.history_io import (
+    HISTORY_FILE_EXTENSIONS,
+    HISTORY_MEDIA_TYPES,
+    HistoryCompression,
+    compress_stream,
+    export_world_history,
+    import_world_history,
+    iter_lines,
+)
 
+from ..utils.images import ImageFormat
 from ..utils.ws import get_ws_ps
 
 from ..dto import (
+    AddedActionsWsDto,
     ExtendedWorldDto,
     NoopEventWsDto,
+    PluginStatsDto,
     StageDto,
     WorldCreateDto,
     WorldDto,
     WorldStatusDto,
+    WorldTickEventDto,
     WorldUpdateDto,
 )
-from ..database import get_db
+from ..database import SessionLocal, get_db
 from ..world import world_service
 
 logger = logging.getLogger(__name__)
@@ -37,70 +58,99 @@ def make_world_watch_status_topic(world_id: int):
     return f"world/{world_id}/status-watch"
 
 
+world_actions_adapter = TypeAdapter(List[WorldAction])
+
+
+def make_world_frames_topic(world_id: int, image_format: ImageFormat):
+    return f"world/{world_id}/frames/{image_format}"
+
+
 @router.get("", response_model=List[WorldDto])
-async def read(db: Session = Depends(get_db)):
-    return world_service.get_worlds(db)
+async def read(db: AsyncSession = Depends(get_db)):
+    return await world_service.get_worlds(db)
 
 
 @router.get("/extended", response_model=List[ExtendedWorldDto])
-async def read_extended(request: Request, db: Session = Depends(get_db)):
+async def read_extended(request: Request, db: AsyncSession = Depends(get_db)):
     w_service = world_service.get_world_service(request.state)
     return [
         ExtendedWorldDto(
             initialized=w_service.is_world_initialized(world.id),
             running=w_service.is_world_running(world.id),
+            last_step_id=head.last_step_id if head else None,
+            step_count=head.step_count if head else 0,
             **WorldDto.model_validate(world).model_dump(),
         )
-        for world in world_service.get_worlds(db)
+        for world, head in await world_service.get_worlds_with_heads(db)
     ]
 
 
+@router.get("/plugin-stats", response_model=PluginStatsDto)
+async def read_plugin_stats(request: Request):
+    w_service = world_service.get_world_service(request.state)
+    return await w_service.get_plugin_stats()
+
+
 @router.get("/{entityId}", response_model=WorldDto)
 async def read_one(
-    entity_id: Annotated[int, Path(alias="entityId")], db: Session = Depends(get_db)
+    entity_id: Annotated[int, Path(alias="entityId")],
+    db: AsyncSession = Depends(get_db),
 ):
-    return world_service.get_world(db, entity_id)
+    return await world_service.get_world(db, entity_id)
 
 
 @router.post("", response_model=WorldDto)
-async def create(item: WorldCreateDto, db: Session = Depends(get_db)):
-    return world_service.create_world(db, item)
+async def create(item: WorldCreateDto, db: AsyncSession = Depends(get_db)):
+    return await world_service.create_world(db, item)
 
 
 @router.patch("/{entityId}", response_model=WorldDto)
 async def update(
     entity_id: Annotated[int, Path(alias="entityId")],
     item: WorldUpdateDto,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
+):
+    return await world_service.update_world(db, entity_id, item)
+
+
+@router.post("/{entityId}/fork", response_model=WorldDto)
+async def fork(
+    entity_id: Annotated[int, Path(alias="entityId")],
+    from_step_id: Annotated[Optional[int], Query(alias="fromStepId")] = None,
+    db: AsyncSession = Depends(get_db),
 ):
-    return world_service.update_world(db, entity_id, item)
+    return await world_service.fork_world(db, entity_id, from_step_id)
 
 
 @router.get("/{entityId}/stages", response_model=List[StageDto])
 async def read_stages(
-    entity_id: Annotated[int, Path(alias="entityId")], db: Session = Depends(get_db)
+    entity_id: Annotated[int, Path(alias="entityId")],
+    db: AsyncSession = Depends(get_db),
 ):
-    return world_service.get_world_stages(db, entity_id)
+    return await world_service.get_world_stages(db, entity_id)
 
 
 @router.get("/{entityId}/status", response_model=WorldStatusDto)
 async def read_status(
     request: Request,
     entity_id: Annotated[int, Path(alias="entityId")],
-    db: Session = Depends(get_db),
+    since_step_id: Annotated[Optional[int], Query(alias="sinceStepId")] = None,
+    limit: Annotated[
+        int, Query(ge=1, le=world_service.MAX_STATUS_STEPS)
+    ] = world_service.MAX_STATUS_STEPS,
+    db: AsyncSession = Depends(get_db),
 ):
     w_service = world_service.get_world_service(request.state)
-    return w_service.get_world_status(db, entity_id)
+    return await w_service.get_world_status(db, entity_id, since_step_id, limit)
 
 
 @router.post("/{entityId}/stop")
 async def stop_world(
     request: Request,
     entity_id: Annotated[int, Path(alias="entityId")],
-    db: Session = Depends(get_db),
 ):
     w_service = world_service.get_world_service(request.state)
-    w_service.world_control_stop(db, entity_id)
+    w_service.world_control_stop(entity_id)
 
 
 @router.post("/{entityId}/start")
@@ -108,17 +158,59 @@ async def do_world_start(
     request: Request,
     background_tasks: BackgroundTasks,
     entity_id: Annotated[int, Path(alias="entityId")],
-    db: Session = Depends(get_db),
     max_steps: Annotated[Optional[int], Query(alias="maxSteps")] = None,
+    flush_every: Annotated[Optional[int], Query(alias="flushEvery", ge=1)] = None,
+    flush_interval_ms: Annotated[
+        Optional[float], Query(alias="flushIntervalMs", ge=0)
+    ] = None,
+    headless: Annotated[bool, Query()] = False,
+    persist_every: Annotated[int, Query(alias="persistEvery", ge=1)] = 1,
+    tick_rate: Annotated[Optional[float], Query(alias="tickRate", gt=0)] = None,
+    bot_deadline_ms: Annotated[
+        Optional[float], Query(alias="botDeadlineMs", gt=0)
+    ] = None,
 ):
     w_service = world_service.get_world_service(request.state)
+    writer_config = StepWriterConfig()
+    if flush_every is not None:
+        writer_config.max_batch_size = flush_every
+    if flush_interval_ms is not None:
+        writer_config.max_delay_ms = flush_interval_ms
+
+    ws_ps = get_ws_ps(request.state)
+
+    def on_frame(image_format: ImageFormat, frame: bytes):
+        # viewers need only the latest frame
+        ws_ps.publish_raw(
+            make_world_frames_topic(entity_id, image_format),
+            frame,
+            coalesce_key="frame",
+        )
 
     async def task():
         await w_service.world_control_start(
-            db,
             entity_id,
-            on_step_change=lambda: notify_world_status_change(request, entity_id),
+            on_step_change=lambda event: notify_world_status_change(
+                request, entity_id, event
+            ),
+            describe_requested=lambda: ws_ps.is_field_requested(
+                make_world_watch_status_topic(entity_id), "describe"
+            ),
+            # frames are rendered only while somebody watches them
+            frame_formats=lambda: [
+                image_format
+                for image_format in ImageFormat
+                if ws_ps.has_subscribers(
+                    make_world_frames_topic(entity_id, image_format)
+                )
+            ],
+            on_frame=on_frame,
             max_steps=max_steps,
+            writer_config=writer_config,
+            headless=headless,
+            persist_every=persist_every,
+            tick_rate=tick_rate,
+            bot_deadline_ms=bot_deadline_ms,
         )
 
     background_tasks.add_task(task)
@@ -128,10 +220,10 @@ async def do_world_start(
 async def read_actions_schema(
     request: Request,
     entity_id: Annotated[int, Path(alias="entityId")],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     w_service = world_service.get_world_service(request.state)
-    return w_service.get_world_actions(db, entity_id)
+    return await w_service.get_world_actions(db, entity_id)
 
 
 @router.post("/{entityId}/actions/add")
@@ -139,46 +231,219 @@ async def add_action(
     request: Request,
     action: WorldAction,
     entity_id: Annotated[int, Path(alias="entityId")],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     w_service = world_service.get_world_service(request.state)
-    w_service.add_world_action(db, entity_id, action)
+    await w_service.add_world_action(db, entity_id, action)
 
 
 @router.delete("/{entityId}", response_model=WorldDto)
 async def delete(
-    entity_id: Annotated[int, Path(alias="entityId")], db: Session = Depends(get_db)
+    entity_id: Annotated[int, Path(alias="entityId")],
+    db: AsyncSession = Depends(get_db),
 ):
     # raise HTTPException(417, detail="Unsafe API Disabled")
-    world_service.clear_world(db, entity_id)
-    return world_service.delete_world(db, entity_id)
+    return await world_service.delete_world(db, entity_id)
 
 
 @router.post("/{entityId}/clear", response_model=WorldDto)
 async def clear(
-    entity_id: Annotated[int, Path(alias="entityId")], db: Session = Depends(get_db)
+    entity_id: Annotated[int, Path(alias="entityId")],
+    db: AsyncSession = Depends(get_db),
 ):
     # raise HTTPException(417, detail="Unsafe API Disabled")
-    return world_service.clear_world(db, entity_id)
+    return await world_service.clear_world(db, entity_id)
+
+
+@router.get("/{entityId}/steps/export")
+async def export_steps(
+    entity_id: Annotated[int, Path(alias="entityId")],
+    from_step_id: Annotated[Optional[int], Query(alias="from")] = None,
+    to_step_id: Annotated[Optional[int], Query(alias="to")] = None,
+    compression: Annotated[Optional[HistoryCompression], Query()] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    # fail before response is started
+    await world_service.get_world(db, entity_id)
+    return StreamingResponse(
+        compress_stream(
+            export_world_history(entity_id, from_step_id, to_step_id), compression
+        ),
+        media_type=HISTORY_MEDIA_TYPES[compression],
+        headers={
+            "Content-Disposition": f'attachment; filename="world-{entity_id}.'
+            f'{HISTORY_FILE_EXTENSIONS[compression]}"'
+        },
+    )
+
+
+@router.post("/import", response_model=WorldDto)
+async def import_steps(
+    request: Request,
+    world_id: Annotated[Optional[int], Query(alias="worldId")] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Imports exported history, into new world or into `worldId` one.
+    Body may be gzip or zstd compressed.
+    """
+    w_service = world_service.get_world_service(request.state)
+    if world_id is not None and w_service.is_world_running(world_id):
+        raise HTTPException(409, detail="World is running")
+    try:
+        world, _ = await import_world_history(
+            db, iter_lines(request.stream()), world_id
+        )
+    except RuntimeError as e:
+        # malformed or mismatching history
+        raise HTTPException(400, detail=str(e))
+    return world
 
 
 @router.websocket("/ws/{entityId}/watch-status")
 async def websocket_endpoint(
     websocket: WebSocket,
     entity_id: Annotated[int, Path(alias="entityId")],
-    db: Session = Depends(get_db),
+    fields: Annotated[Optional[str], Query()] = None,
 ):
+    """
+    Tick events of world, `fields` is comma separated subset of event fields
+    """
     ws_ps = get_ws_ps(websocket.state)
+    event_fields = parse_tick_event_fields(fields) if fields else None
 
-    if not world_service.get_world(db, entity_id):
-        raise HTTPException(404, detail="World not found")
+    # short-lived session, connection must not be held for the socket lifetime
+    async with SessionLocal() as db:
+        if not await world_service.get_world(db, entity_id):
+            raise HTTPException(404, detail="World not found")
 
-    await ws_ps.subscribe(make_world_watch_status_topic(entity_id), websocket)
+    await ws_ps.subscribe(
+        make_world_watch_status_topic(entity_id), websocket, event_fields
+    )
 
 
-def notify_world_status_change(request: Request, entity_id: int):
+@router.websocket("/ws/{entityId}/frames")
+async def frames_websocket_endpoint(
+    websocket: WebSocket,
+    entity_id: Annotated[int, Path(alias="entityId")],
+    image_format: Annotated[ImageFormat, Query(alias="format")] = ImageFormat.JPEG,
+    max_fps: Annotated[float, Query(alias="maxFps", gt=0, le=60)] = 10,
+):
+    """
+    Binary frames of running world, rendered once per tick for all viewers.
+    Frames are dropped for viewers slower than world or than `maxFps`.
+    """
+    ws_ps = get_ws_ps(websocket.state)
+
+    async with SessionLocal() as db:
+        if not await world_service.get_world(db, entity_id):
+            raise HTTPException(404, detail="World not found")
+
+    await ws_ps.subscribe(
+        make_world_frames_topic(entity_id, image_format),
+        websocket,
+        min_interval=1 / max_fps,
+    )
+
+
+@router.websocket("/ws/{entityId}/actions")
+async def actions_websocket_endpoint(
+    websocket: WebSocket,
+    entity_id: Annotated[int, Path(alias="entityId")],
+):
+    """
+    Action channel of world. Each text message is an action or array of them,
+    it is answered by numbers of accepted, coalesced and dropped actions.
+    World and its action names are looked up once per connection.
+    """
+    w_service = world_service.get_world_service(websocket.state)
+
+    async with SessionLocal() as db:
+        world = await world_service.get_world(db, entity_id)
+        action_names = {
+            action.name for action in await w_service.get_world_actions(db, entity_id)
+        }
+
+    await websocket.accept()
+    try:
+        while True:
+            message = await websocket.receive_text()
+            submitted_at = time.time()
+            try:
+                actions = parse_world_actions(message, action_names)
+            except ValueError as e:
+                await websocket.send_text(
+                    AddedActionsWsDto(error=str(e)).model_dump_json(by_alias=True)
+                )
+                continue
+            added = await w_service.submit_world_actions(
+                world.id, world.plugin, actions, submitted_at
+            )
+            await websocket.send_text(
+                AddedActionsWsDto(
+                    accepted=added.accepted,
+                    coalesced=added.coalesced,
+                    dropped=added.dropped,
+                ).model_dump_json(by_alias=True)
+            )
+    except WebSocketDisconnect:
+        ...
+
+
+@router.websocket("/ws/{entityId}/bot")
+async def bot_websocket_endpoint(
+    websocket: WebSocket,
+    entity_id: Annotated[int, Path(alias="entityId")],
+    name: Annotated[str, Query(min_length=1, max_length=64)],
+):
+    """
+    Lockstep bot channel of world, see bot_lockstep for protocol
+    """
+    w_service = world_service.get_world_service(websocket.state)
+
+    async with SessionLocal() as db:
+        world = await world_service.get_world(db, entity_id)
+        action_names = {
+            action.name for action in await w_service.get_world_actions(db, entity_id)
+        }
+
+    await websocket.accept()
+    await w_service.connect_bot(world.id, BotConnection(name, websocket, action_names))
+
+
+def parse_world_actions(message: str, action_names: set[str]) -> List[WorldAction]:
+    if message.lstrip().startswith("{"):
+        message = f"[{message}]"
+    try:
+        actions = world_actions_adapter.validate_json(message)
+    except ValidationError as e:
+        raise ValueError(f"Invalid actions: {e.errors(include_url=False)}")
+    for action in actions:
+        if action.name not in action_names:
+            raise ValueError(f"Unknown action {action.name}")
+    return actions
+
+
+def parse_tick_event_fields(fields: str):
+    names_by_alias = {
+        field.alias: name for name, field in WorldTickEventDto.model_fields.items()
+    }
+    ret = set()
+    for alias in fields.split(","):
+        if alias not in names_by_alias:
+            raise WebSocketException(
+                status.WS_1008_POLICY_VIOLATION, reason=f"Unknown event field {alias}"
+            )
+        ret.add(names_by_alias[alias])
+    return frozenset(ret)
+
+
+def notify_world_status_change(
+    request: Request, entity_id: int, event: BaseModel = NoopEventWsDto()
+):
     ws_ps = get_ws_ps(request.state)
-    ws_ps.publish(make_world_watch_status_topic(entity_id), NoopEventWsDto())
+    # tick events carry latest step, so only the latest one matters
+    ws_ps.publish(make_world_watch_status_topic(entity_id), event, coalesce_key="tick")
 
 
 @router.get("/{entityId}/test-trigger-status")
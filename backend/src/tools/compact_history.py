@@ -0,0 +1,130 @@
+"""
+Rewrites stored history of a world into keyframes every N steps with deltas in
+between, or back into full states with `--keyframe-interval 0`.
+World must not be running while its history is rewritten.
+
+    python -m src.tools.compact_history --world-id 1 --keyframe-interval 100
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+from typing import Any, Dict, List
+
+from sqlalchemy import func, select, update
+
+from .. import database, models
+from ..utils.json_delta import apply_delta
+from ..world.step_history import KeyframeEncoder
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+
+async def compact_world_history(world_id: int, keyframe_interval: int):
+    """
+    Returns number of rewritten and total steps
+    """
+    encoder = KeyframeEncoder(keyframe_interval) if keyframe_interval else None
+    # keyframes of original layout, each kept until the last delta referring
+    # to it, rewritten rows can't be read back as source
+    source_keyframes: Dict[int, Any] = {}
+    rewritten = 0
+    total = 0
+
+    stmt = (
+        select(models.Step.id, models.Step.state, models.Step.base_step_id)
+        # binary states are never stored as keyframes or deltas
+        .where(models.Step.world_id == world_id, models.Step.state.is_not(None))
+        .order_by(models.Step.id)
+        .execution_options(yield_per=BATCH_SIZE)
+    )
+    # reading cursor and writes need separate connections
+    async with database.SessionLocal() as read_db, database.SessionLocal() as write_db:
+        last_refs: Dict[int, int] = dict(
+            (
+                await read_db.execute(
+                    select(models.Step.base_step_id, func.max(models.Step.id))
+                    .where(
+                        models.Step.world_id == world_id,
+                        models.Step.base_step_id.is_not(None),
+                    )
+                    .group_by(models.Step.base_step_id)
+                )
+            )
+            .tuples()
+            .all()
+        )
+        updates: List[dict] = []
+        async for step_id, state, base_step_id in await read_db.stream(stmt):
+            total += 1
+            stored = json.loads(state)
+            if base_step_id is None:
+                doc = stored
+                if step_id in last_refs:
+                    source_keyframes[step_id] = doc
+            else:
+                base = source_keyframes.get(base_step_id)
+                if base is None:
+                    raise RuntimeError(
+                        f"Keyframe #{base_step_id} of step #{step_id} not found"
+                    )
+                doc = apply_delta(base, stored)
+                if last_refs[base_step_id] == step_id:
+                    del source_keyframes[base_step_id]
+
+            new_state, new_base_step_id = json.dumps(doc, separators=(",", ":")), None
+            if encoder:
+                new_state, new_base_step_id = encoder.encode(doc)
+                if new_base_step_id is None:
+                    encoder.on_keyframe_written(step_id, doc, new_state)
+
+            # rows differing only in whitespace are left as they are
+            if new_base_step_id != base_step_id or (
+                new_state != state and json.loads(new_state) != stored
+            ):
+                updates.append(
+                    dict(
+                        id=step_id,
+                        world_id=world_id,
+                        state=new_state,
+                        base_step_id=new_base_step_id,
+                    )
+                )
+            if len(updates) >= BATCH_SIZE:
+                rewritten += await flush_updates(write_db, updates)
+                updates = []
+
+        rewritten += await flush_updates(write_db, updates)
+        await write_db.execute(
+            update(models.World)
+            .where(models.World.id == world_id)
+            .values(keyframe_interval=keyframe_interval or None)
+        )
+        await write_db.commit()
+    return rewritten, total
+
+
+async def flush_updates(db, updates: List[dict]):
+    if updates:
+        # bulk UPDATE by primary key
+        await db.execute(update(models.Step), updates)
+        await db.commit()
+    return len(updates)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--world-id", type=int, required=True)
+    parser.add_argument("--keyframe-interval", type=int, required=True)
+    args = parser.parse_args()
+    rewritten, total = asyncio.run(
+        compact_world_history(args.world_id, args.keyframe_interval)
+    )
+    print(f"Rewritten {rewritten} of {total} steps")
+
+
+if __name__ == "__main__":
+    main()
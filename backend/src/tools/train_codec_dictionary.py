@@ -0,0 +1,69 @@
+"""
+Trains zstd dictionary on recent step payloads (logs, interactions) of worlds
+of a plugin. New steps use latest dictionary of their plugin when backend runs
+with `STEP_PAYLOAD_CODEC=zstd-dict`, already stored steps are not rewritten.
+
+    python -m src.tools.train_codec_dictionary --plugin DEMO_GAME
+"""
+
+import argparse
+import asyncio
+import logging
+from typing import List
+
+from sqlalchemy import insert, select
+import zstandard as zstd
+
+from .. import database, models
+from ..world.step_codec import MIN_COMPRESS_SIZE, decode_payload
+
+logger = logging.getLogger(__name__)
+
+
+async def train_codec_dictionary(plugin: str, samples: int, dict_size: int):
+    """
+    Returns id of new dictionary and number of samples it was trained on
+    """
+    stmt = (
+        select(models.Step.logs, models.Step.interactions)
+        .join(models.Stage)
+        .join(models.World)
+        .where(models.World.plugin == plugin)
+        .order_by(models.Step.id.desc())
+        .limit(samples)
+    )
+    async with database.SessionLocal() as db:
+        payloads: List[bytes] = []
+        for row in await db.execute(stmt):
+            for data in row:
+                payload = (await decode_payload(db, data)).encode()
+                # short payloads are stored uncompressed anyway
+                if len(payload) >= MIN_COMPRESS_SIZE:
+                    payloads.append(payload)
+        if not payloads:
+            raise RuntimeError(f"No step payloads of plugin {plugin} to train on")
+
+        dictionary = zstd.train_dictionary(dict_size, payloads)
+        res = await db.execute(
+            insert(models.CodecDictionary).returning(models.CodecDictionary.id),
+            dict(plugin=plugin, data=dictionary.as_bytes()),
+        )
+        dict_id = res.scalar_one()
+        await db.commit()
+    return dict_id, len(payloads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--plugin", required=True)
+    parser.add_argument("--samples", type=int, default=10000)
+    parser.add_argument("--dict-size", type=int, default=16 << 10)
+    args = parser.parse_args()
+    dict_id, samples = asyncio.run(
+        train_codec_dictionary(args.plugin, args.samples, args.dict_size)
+    )
+    print(f"Trained dictionary #{dict_id} on {samples} payloads")
+
+
+if __name__ == "__main__":
+    main()
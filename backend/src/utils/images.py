@@ -0,0 +1,42 @@
+from enum import StrEnum
+import io
+
+from PIL import Image
+
+
+class ImageFormat(StrEnum):
+    PNG = "png"
+    JPEG = "jpeg"
+    WEBP = "webp"
+
+
+IMAGE_MEDIA_TYPES = {
+    ImageFormat.PNG: "image/png",
+    ImageFormat.JPEG: "image/jpeg",
+    ImageFormat.WEBP: "image/webp",
+}
+
+
+def encode_image(im: Image.Image, image_format: ImageFormat = ImageFormat.PNG):
+    """
+    Encodes image with settings favoring speed over size
+    """
+    ret = io.BytesIO()
+    if image_format == ImageFormat.PNG:
+        im.save(ret, format="PNG", compress_level=1)
+    else:
+        if im.mode not in ("RGB", "L"):
+            im = im.convert("RGB")
+        if image_format == ImageFormat.JPEG:
+            im.save(ret, format="JPEG", quality=85)
+        else:
+            im.save(ret, format="WEBP", quality=80, method=0)
+    return ret.getvalue()
+
+
+def convert_image(data: bytes, image_format: ImageFormat):
+    """
+    Re-encodes image of any format readable by Pillow
+    """
+    with Image.open(io.BytesIO(data)) as im:
+        return encode_image(im, image_format)
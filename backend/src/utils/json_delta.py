@@ -0,0 +1,67 @@
+from typing import Any, Dict, List
+
+# JSON-patch style operations over JSON documents (dicts, lists and scalars).
+# Each operation is a compact list: ["r", path, value] replaces or adds value,
+# ["d", path] removes dict key. Path is a list of dict keys and list indexes.
+
+type JsonDelta = List[list]
+
+REPLACE = "r"
+DELETE = "d"
+
+
+def make_delta(base: Any, target: Any) -> JsonDelta:
+    ret: JsonDelta = []
+    _diff(base, target, [], ret)
+    return ret
+
+
+def _diff(base: Any, target: Any, path: list, ret: JsonDelta):
+    if type(base) is not type(target):
+        ret.append([REPLACE, path, target])
+    elif isinstance(base, dict):
+        for key, value in target.items():
+            if key not in base:
+                ret.append([REPLACE, path + [key], value])
+            else:
+                _diff(base[key], value, path + [key], ret)
+        for key in base:
+            if key not in target:
+                ret.append([DELETE, path + [key]])
+    elif isinstance(base, list):
+        if len(base) != len(target):
+            ret.append([REPLACE, path, target])
+        else:
+            for i, (base_item, target_item) in enumerate(zip(base, target)):
+                _diff(base_item, target_item, path + [i], ret)
+    elif base != target:
+        ret.append([REPLACE, path, target])
+
+
+def apply_delta(base: Any, delta: JsonDelta) -> Any:
+    """
+    Returns new document, base is not modified and shares unchanged subtrees
+    """
+    root = [base]
+    # containers already copied while applying this delta
+    copied: Dict[int, Any] = {}
+
+    def own(container: Any):
+        if id(container) in copied:
+            return container
+        ret = container.copy()
+        copied[id(ret)] = ret
+        return ret
+
+    for op in delta:
+        path = [0] + op[1]
+        parent = own(root)
+        root = parent
+        for key in path[:-1]:
+            parent[key] = own(parent[key])
+            parent = parent[key]
+        if op[0] == DELETE:
+            del parent[path[-1]]
+        else:
+            parent[path[-1]] = op[2]
+    return root[0]
@@ -0,0 +1,166 @@
+"""
+Minimal in-process metrics, rendered in Prometheus text format.
+Labeled children are meant to be bound once and kept by hot paths. Observed
+values are only appended to a list, they are counted into buckets in bulk.
+"""
+
+from contextlib import contextmanager
+import math
+import time
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+METRICS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# observed values kept before they are counted into buckets
+MAX_PENDING_VALUES = 1024
+
+# seconds, from fast plugin steps to slow DB commits
+DEFAULT_BUCKETS = (
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value: str):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class HistogramChild:
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.__buckets = np.array(buckets)
+        # last one counts values above all buckets
+        self.__counts = np.zeros(len(buckets) + 1, dtype=np.int64)
+        self.__sum = 0.0
+        self.__pending: List[float] = []
+
+    def observe(self, value: float):
+        self.__pending.append(value)
+        if len(self.__pending) >= MAX_PENDING_VALUES:
+            self.__count_pending()
+
+    def get_counts(self) -> Tuple[List[int], float]:
+        """
+        Non-cumulative counts per bucket and sum of observed values
+        """
+        self.__count_pending()
+        return self.__counts.tolist(), self.__sum
+
+    def __count_pending(self):
+        if not self.__pending:
+            return
+        values = np.array(self.__pending)
+        self.__pending = []
+        # bucket bounds are inclusive, same as "le" label
+        indexes = np.searchsorted(self.__buckets, values, side="left")
+        self.__counts += np.bincount(indexes, minlength=len(self.__counts))
+        self.__sum += float(values.sum())
+
+    @contextmanager
+    def time(self):
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started_at)
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.__buckets = tuple(sorted(buckets))
+        self.__children: Dict[Tuple[str, ...], HistogramChild] = {}
+        registry.register(self)
+
+    def labels(self, *values) -> HistogramChild:
+        key = tuple(str(value) for value in values)
+        if len(key) != len(self.labelnames):
+            raise RuntimeError(f"Metric {self.name} expects labels {self.labelnames}")
+        child = self.__children.get(key)
+        if child is None:
+            child = self.__children[key] = HistogramChild(self.__buckets)
+        return child
+
+    def remove(self, **labels):
+        """
+        Forgets children matching all given labels, e.g. of deleted world
+        """
+        indexes = [(self.labelnames.index(name), str(v)) for name, v in labels.items()]
+        for key in list(self.__children):
+            if all(key[index] == value for index, value in indexes):
+                del self.__children[key]
+
+    def collect(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        bounds = self.__buckets + (math.inf,)
+        for key, child in list(self.__children.items()):
+            labels = _format_labels(self.labelnames, key)
+            counts, total = child.get_counts()
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                le = _format_labels(
+                    self.labelnames + ("le",), key + (_format_value(bound),)
+                )
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{labels} {total!r}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self.__metrics: Dict[str, Histogram] = {}
+
+    def register(self, metric: Histogram):
+        if metric.name in self.__metrics:
+            raise RuntimeError(f"Metric {metric.name} is already registered")
+        self.__metrics[metric.name] = metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self.__metrics.values()):
+            lines += metric.collect()
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
@@ -1,7 +1,7 @@
 from typing import Any
-from pydantic.json import pydantic_encoder
-import json
+from pydantic_core import to_json
 
 
 def json_pydantic_dump(data: Any):
-    return json.dumps(data, default=pydantic_encoder)
+    # native serializer of pydantic, models nested in plain containers included
+    return to_json(data).decode()
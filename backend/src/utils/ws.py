@@ -1,109 +1,252 @@
-from asyncio import Event
 import asyncio
-from contextlib import contextmanager
+from collections import OrderedDict
+from contextlib import suppress
+import itertools
 import logging
-from typing import Any, Callable, ContextManager, Dict, List, Optional
-from fastapi import Request, WebSocket, WebSocketDisconnect
+import os
+from typing import (
+    Any,
+    Callable,
+    ContextManager,
+    Dict,
+    FrozenSet,
+    Hashable,
+    Optional,
+    Set,
+)
+from fastapi import WebSocket
 from pydantic import BaseModel
 
-from ..utils.async_utils import event_wait_timeout
+from .metrics import Histogram
 
 WS_PS_SERIVCE_NAME = "ws_ps_service"
 
 logger = logging.getLogger(__name__)
 
+ws_max_queue_size = int(os.environ.get("WS_MAX_QUEUE_SIZE", "16"))
 
-async def is_passive_ws_alive(websocket: WebSocket):
-    try:
-        await asyncio.wait_for(websocket.receive_bytes(), timeout=0.001)
-    except asyncio.TimeoutError:
-        return True
-    except:
-        return False
-    return False
+ws_publish_seconds = Histogram(
+    "ws_publish_seconds", "Time to fan out message to subscribers of topic", ["topic"]
+)
 
+# text messages are sent as text frames, bytes as binary frames
+type WsMessage = str | bytes
 
-class WsPubSub:
-    def __init__(self, on_last_disconnected: Callable[[], None]):
-        self.__connections: list[WebSocket] = []
-        self.__async_evt = Event()
-        self.__event: Optional[BaseModel] = None
+
+class WsSubscriber:
+    """
+    Socket with bounded queue of outgoing messages. Queue never blocks publisher:
+    message replaces pending one with the same coalesce key, and oldest pending
+    message is dropped when queue is full.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        max_queue_size: int,
+        fields: Optional[FrozenSet[str]] = None,
+        min_interval: float = 0.0,
+    ) -> None:
+        self.websocket = websocket
+        # event fields delivered to this subscriber, all if not set
+        self.fields = fields
+        self.__max_queue_size = max(max_queue_size, 1)
+        # rate cap, messages published meanwhile wait in queue and get coalesced
+        self.__min_interval = min_interval
+        self.__pending: OrderedDict[Hashable, WsMessage] = OrderedDict()
+        self.__wakeup = asyncio.Event()
         self.__stopped = False
-        self.__on_last_disconnected = on_last_disconnected
-        self.__last_event_id: int = 0
+        self.dropped = 0
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.__connections.append(websocket)
-        last_sent_event_id: Optional[int] = None
+    def push(self, message: WsMessage, coalesce_key: Hashable):
+        if self.__pending.pop(coalesce_key, None) is not None:
+            self.dropped += 1
+        elif len(self.__pending) >= self.__max_queue_size:
+            self.__pending.popitem(last=False)
+            self.dropped += 1
+        self.__pending[coalesce_key] = message
+        self.__wakeup.set()
+
+    def stop(self):
+        self.__stopped = True
+        self.__wakeup.set()
+
+    async def run(self):
+        """
+        Delivers messages until socket is disconnected or subscriber is stopped
+        """
+        sender = asyncio.create_task(self.__send_loop())
+        reader = asyncio.create_task(self.__read_loop())
         try:
-            while not self.__stopped and await is_passive_ws_alive(websocket):
-                # wait with timeout to avoid dead locks, e.g. when app is hot-reloaded
-                await event_wait_timeout(self.__async_evt, 3.0)
-                if self.__event != None and last_sent_event_id != self.__last_event_id:
-                    # logger.info("Sending data")
-                    last_sent_event_id = self.__last_event_id
-                    await websocket.send_text(self.__event.model_dump_json())
-        except WebSocketDisconnect:
-            logger.info("WS self disconnected")
+            await asyncio.wait({sender, reader}, return_when=asyncio.FIRST_COMPLETED)
         finally:
-            await self.disconnect(websocket)
+            for task in (sender, reader):
+                task.cancel()
+            await asyncio.gather(sender, reader, return_exceptions=True)
+            with suppress(Exception):
+                await self.websocket.close()
 
-    async def disconnect(self, websocket: WebSocket):
+    async def __send_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self.__wakeup.wait()
+            self.__wakeup.clear()
+            if self.__stopped:
+                return
+            while self.__pending:
+                _, message = self.__pending.popitem(last=False)
+                next_send_at = loop.time() + self.__min_interval
+                if isinstance(message, bytes):
+                    await self.websocket.send_bytes(message)
+                else:
+                    await self.websocket.send_text(message)
+                if self.__min_interval:
+                    await asyncio.sleep(max(next_send_at - loop.time(), 0))
+                    if self.__stopped:
+                        return
+
+    async def __read_loop(self):
+        # clients don't send anything, reading only detects disconnect
+        while True:
+            message = await self.websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+
+
+class WsPubSub:
+    def __init__(self, on_last_disconnected: Callable[[], None], max_queue_size: int):
+        self.__subscribers: Set[WsSubscriber] = set()
+        self.__on_last_disconnected = on_last_disconnected
+        self.__max_queue_size = max_queue_size
+        # unique keys of messages which must not be coalesced
+        self.__message_ids = itertools.count()
+
+    async def connect(
+        self,
+        websocket: WebSocket,
+        fields: Optional[FrozenSet[str]] = None,
+        min_interval: float = 0.0,
+    ):
+        """
+        Serves accepted socket until it is disconnected
+        """
+        subscriber = WsSubscriber(
+            websocket, self.__max_queue_size, fields, min_interval
+        )
+        self.__subscribers.add(subscriber)
         try:
-            await websocket.close()
-        except:
-            ...
-        self.__connections.remove(websocket)
-        if not self.__connections:
-            self.__on_last_disconnected()
-
-    def notify(self, event: BaseModel):
-        self.__last_event_id += 1
-        # logger.info(f"Attempt to notify {self.get_count()} clients")
-        self.__event = event
-        if self.__async_evt.is_set():
-            raise RuntimeError("Event not yet handled")
-        self.__async_evt.set()
-        self.__async_evt.clear()
+            await subscriber.run()
+        except Exception:
+            logger.exception("WS subscriber failed")
+        finally:
+            self.__subscribers.discard(subscriber)
+            if subscriber.dropped:
+                logger.info(f"WS subscriber disconnected, {subscriber.dropped} dropped")
+            if not self.__subscribers:
+                self.__on_last_disconnected()
+
+    def notify(self, event: BaseModel, coalesce_key: Optional[Hashable] = None):
+        # serialized once per distinct set of requested fields
+        messages: Dict[Optional[FrozenSet[str]], str] = {}
+        if coalesce_key is None:
+            coalesce_key = next(self.__message_ids)
+        for subscriber in self.__subscribers:
+            message = messages.get(subscriber.fields)
+            if message is None:
+                message = event.model_dump_json(
+                    include=subscriber.fields, by_alias=True
+                )
+                messages[subscriber.fields] = message
+            subscriber.push(message, coalesce_key)
+
+    def notify_raw(self, message: WsMessage, coalesce_key: Optional[Hashable] = None):
+        if coalesce_key is None:
+            coalesce_key = next(self.__message_ids)
+        for subscriber in self.__subscribers:
+            subscriber.push(message, coalesce_key)
+
+    def is_field_requested(self, field: str):
+        return any(
+            subscriber.fields is None or field in subscriber.fields
+            for subscriber in self.__subscribers
+        )
 
     def get_count(self):
-        return len(self.__connections)
+        return len(self.__subscribers)
 
     def close(self):
-        if self.__stopped:
-            return
-        self.__stopped = True
-        self.__event = None
-        if not self.__async_evt.is_set():
-            self.__async_evt.set()
+        for subscriber in self.__subscribers:
+            subscriber.stop()
 
 
 class WsPubSubService(ContextManager):
-    def __init__(self):
+    def __init__(self, max_queue_size: int = ws_max_queue_size):
         self.__topics: Dict[str, WsPubSub] = {}
+        self.__max_queue_size = max_queue_size
+
+    async def subscribe(
+        self,
+        topic: str,
+        websocket: WebSocket,
+        fields: Optional[FrozenSet[str]] = None,
+        min_interval: float = 0.0,
+    ):
+        """
+        Serves socket until it is disconnected. `fields` limits delivered event
+        fields, `min_interval` limits rate of messages in seconds.
+        """
 
-    async def subscribe(self, topic: str, websocket: WebSocket):
         def unsubscribe():
             if topic in self.__topics:
                 logger.info(f"All clients unsubscribed from {topic}")
-                self.__topics[topic].close()
                 del self.__topics[topic]
+                ws_publish_seconds.remove(topic=topic)
 
+        # topic is registered only for accepted socket, failed handshake would
+        # leave it without subscribers
+        await websocket.accept()
         if topic not in self.__topics:
-            self.__topics[topic] = WsPubSub(unsubscribe)
+            self.__topics[topic] = WsPubSub(unsubscribe, self.__max_queue_size)
 
         logger.info(
             f"Subscribed to {topic}. Total {self.__topics[topic].get_count()} clients"
         )
 
-        await self.__topics[topic].connect(websocket)
+        await self.__topics[topic].connect(websocket, fields, min_interval)
 
-    def publish(self, topic: str, event: BaseModel):
+    def publish(
+        self, topic: str, event: BaseModel, coalesce_key: Optional[Hashable] = None
+    ):
+        """
+        Pending event with the same `coalesce_key` is replaced by new one,
+        for slow subscribers only latest of such events is delivered
+        """
         if topic not in self.__topics:
             return
 
-        self.__topics[topic].notify(event)
+        with ws_publish_seconds.labels(topic).time():
+            self.__topics[topic].notify(event, coalesce_key)
+
+    def publish_raw(
+        self, topic: str, message: WsMessage, coalesce_key: Optional[Hashable] = None
+    ):
+        """
+        Publishes already encoded message, e.g. binary frame
+        """
+        if topic not in self.__topics:
+            return
+
+        with ws_publish_seconds.labels(topic).time():
+            self.__topics[topic].notify_raw(message, coalesce_key)
+
+    def has_subscribers(self, topic: str):
+        return topic in self.__topics and self.__topics[topic].get_count() > 0
+
+    def is_field_requested(self, topic: str, field: str):
+        """
+        Whether any subscriber of topic receives event field
+        """
+        return topic in self.__topics and self.__topics[topic].is_field_requested(field)
 
     def __exit__(self, exc_type, exc_value, traceback):
         logger.info("WsPubSubService: exiting")
@@ -0,0 +1,287 @@
+"""
+Parameter sweeps: batch of worlds of one plugin, one world per config, each run
+headless to `max_steps` with bounded concurrency. With plugin worker processes
+configured, worlds of batch are spread over them. Progress is tracked in memory
+of API process, finished worlds are summarized by describe_state of their last
+step.
+"""
+
+import asyncio
+from dataclasses import dataclass
+from enum import StrEnum
+import itertools
+import logging
+import os
+import time
+from typing import Any, ContextManager, Dict, List, Optional
+
+from .. import database, dto
+from .world_head import get_world_head
+from .world_service import WorldService, create_world
+
+logger = logging.getLogger(__name__)
+
+BATCH_RUN_SERVICE_NAME = "batch_run_service"
+
+batch_run_concurrency = int(
+    os.environ.get("BATCH_RUN_CONCURRENCY", str(os.cpu_count() or 4))
+)
+# finished batches kept for progress queries
+MAX_FINISHED_BATCH_RUNS = 100
+# seconds stopped batches are given to persist last steps of their worlds
+SHUTDOWN_TIMEOUT = 5.0
+
+
+class BatchRunStatus(StrEnum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+@dataclass
+class BatchRunItem:
+    config: str
+    world_id: Optional[int] = None
+    status: BatchRunStatus = BatchRunStatus.PENDING
+    describe: Optional[Dict[str, str]] = None
+    error: Optional[str] = None
+
+
+class BatchRun:
+    def __init__(
+        self, id: int, request: dto.BatchRunCreateDto, world_service: WorldService
+    ) -> None:
+        self.id = id
+        self.request = request
+        self.items = [BatchRunItem(config=config) for config in request.configs]
+        self.status = BatchRunStatus.PENDING
+        self.__world_service = world_service
+        self.__cancelled = False
+        self.__started_at: Optional[float] = None
+        self.__finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    async def run(self):
+        self.status = BatchRunStatus.RUNNING
+        self.__started_at = time.perf_counter()
+        semaphore = asyncio.Semaphore(
+            max(self.request.concurrency or batch_run_concurrency, 1)
+        )
+        try:
+            await asyncio.gather(
+                *(
+                    self.__run_item(index, item, semaphore)
+                    for index, item in enumerate(self.items)
+                )
+            )
+        finally:
+            self.__finished_at = time.perf_counter()
+            if self.__cancelled:
+                self.status = BatchRunStatus.CANCELLED
+                # items interrupted by task cancellation
+                for item in self.items:
+                    if item.status in (BatchRunStatus.PENDING, BatchRunStatus.RUNNING):
+                        item.status = BatchRunStatus.CANCELLED
+            elif any(item.status == BatchRunStatus.FAILED for item in self.items):
+                self.status = BatchRunStatus.FAILED
+            else:
+                self.status = BatchRunStatus.DONE
+            logger.info(
+                f"Batch run #{self.id} {self.status} after "
+                f"{self.get_elapsed():.1f}s, {self.get_ticks()} ticks"
+            )
+
+    def cancel(self):
+        """
+        Stops running worlds, pending ones are not started
+        """
+        self.__cancelled = True
+        for item in self.items:
+            if item.status == BatchRunStatus.RUNNING:
+                self.__world_service.world_control_stop(item.world_id)
+
+    def is_finished(self):
+        return self.__finished_at is not None
+
+    def get_elapsed(self):
+        if self.__started_at is None:
+            return 0.0
+        return (self.__finished_at or time.perf_counter()) - self.__started_at
+
+    def get_ticks(self):
+        return sum(
+            self.__world_service.get_run_ticks(item.world_id)
+            for item in self.items
+            if item.world_id is not None
+        )
+
+    def to_dto(self):
+        ticks = self.get_ticks()
+        elapsed = self.get_elapsed()
+        counts = {status: 0 for status in BatchRunStatus}
+        for item in self.items:
+            counts[item.status] += 1
+        return dto.BatchRunDto(
+            id=self.id,
+            title=self.request.title,
+            plugin=self.request.plugin,
+            status=self.status,
+            max_steps=self.request.max_steps,
+            total=len(self.items),
+            pending=counts[BatchRunStatus.PENDING],
+            running=counts[BatchRunStatus.RUNNING],
+            done=counts[BatchRunStatus.DONE],
+            failed=counts[BatchRunStatus.FAILED],
+            cancelled=counts[BatchRunStatus.CANCELLED],
+            ticks=ticks,
+            ticks_per_second=ticks / elapsed if elapsed else None,
+            elapsed_seconds=elapsed,
+            runs=[
+                dto.BatchRunItemDto(
+                    world_id=item.world_id,
+                    config=item.config,
+                    status=item.status,
+                    ticks=(
+                        self.__world_service.get_run_ticks(item.world_id)
+                        if item.world_id is not None
+                        else 0
+                    ),
+                    describe=item.describe,
+                    error=item.error,
+                )
+                for item in self.items
+            ],
+            metrics=aggregate_describe_metrics(
+                [item.describe for item in self.items if item.describe]
+            ),
+        )
+
+    async def __run_item(
+        self, index: int, item: BatchRunItem, semaphore: asyncio.Semaphore
+    ):
+        async with semaphore:
+            if self.__cancelled:
+                item.status = BatchRunStatus.CANCELLED
+                return
+            try:
+                async with database.SessionLocal() as db:
+                    world = await create_world(
+                        db,
+                        dto.WorldCreateDto(
+                            title=f"{self.request.title} #{index + 1}",
+                            plugin=self.request.plugin,
+                            config=item.config,
+                        ),
+                    )
+                item.world_id = world.id
+                # cancelled while world was being created
+                if self.__cancelled:
+                    item.status = BatchRunStatus.CANCELLED
+                    return
+                item.status = BatchRunStatus.RUNNING
+                await self.__world_service.world_control_start(
+                    world.id,
+                    on_step_change=lambda event: None,
+                    max_steps=self.request.max_steps,
+                    headless=True,
+                    persist_every=self.request.persist_every,
+                )
+                async with database.SessionLocal() as db:
+                    head = await get_world_head(db, world.id)
+                    if head and head.last_step_id is not None:
+                        item.describe = await self.__world_service.describe_step_state(
+                            db, head.last_step_id
+                        )
+                item.status = (
+                    BatchRunStatus.CANCELLED
+                    if self.__cancelled
+                    else BatchRunStatus.DONE
+                )
+            except Exception as e:
+                logger.exception(f"Batch run #{self.id} failed on config {item.config}")
+                item.status = BatchRunStatus.FAILED
+                item.error = repr(e)
+
+
+def aggregate_describe_metrics(describes: List[Dict[str, str]]):
+    """
+    Min, max and mean of numeric describe_state values, by name
+    """
+    values: Dict[str, List[float]] = {}
+    for describe in describes:
+        for name, value in describe.items():
+            try:
+                values.setdefault(name, []).append(float(value))
+            except ValueError:
+                ...
+    return [
+        dto.BatchRunMetricDto(
+            name=name,
+            count=len(numbers),
+            min=min(numbers),
+            max=max(numbers),
+            mean=sum(numbers) / len(numbers),
+        )
+        for name, numbers in values.items()
+        if numbers
+    ]
+
+
+class BatchRunService(ContextManager):
+    def __init__(self, world_service: WorldService) -> None:
+        self.__world_service = world_service
+        self.__batch_runs: Dict[int, BatchRun] = {}
+        self.__ids = itertools.count(1)
+
+    def create(self, request: dto.BatchRunCreateDto):
+        """
+        Starts batch in background, its progress is read by `get`
+        """
+        self.__forget_finished()
+        batch_run = BatchRun(next(self.__ids), request, self.__world_service)
+        self.__batch_runs[batch_run.id] = batch_run
+        batch_run.task = asyncio.create_task(batch_run.run())
+        return batch_run
+
+    def get(self, batch_run_id: int):
+        ret = self.__batch_runs.get(batch_run_id)
+        if not ret:
+            raise RuntimeError(f"Batch run #{batch_run_id} not found")
+        return ret
+
+    def get_all(self):
+        return list(self.__batch_runs.values())
+
+    def __forget_finished(self):
+        finished = [id for id, run in self.__batch_runs.items() if run.is_finished()]
+        for id in finished[: max(len(finished) - MAX_FINISHED_BATCH_RUNS + 1, 0)]:
+            del self.__batch_runs[id]
+
+    async def close(self):
+        """
+        Stops batches and waits for their tasks, must be done while worlds can
+        still be persisted
+        """
+        tasks = []
+        for batch_run in self.__batch_runs.values():
+            batch_run.cancel()
+            if batch_run.task and not batch_run.task.done():
+                tasks.append(batch_run.task)
+        if not tasks:
+            return
+        _, pending = await asyncio.wait(tasks, timeout=SHUTDOWN_TIMEOUT)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        logger.info("BatchRunService: exiting")
+        for batch_run in self.__batch_runs.values():
+            batch_run.cancel()
+
+
+# Dependency
+def get_batch_run_service(state: Any) -> BatchRunService:
+    return getattr(state, BATCH_RUN_SERVICE_NAME)
@@ -0,0 +1,158 @@
+"""
+Lockstep protocol of bots driving a world over websocket. After each tick the
+world sends every connected bot its new state and waits for their decisions up
+to a deadline, then the next tick is stepped with whatever arrived:
+
+    world -> bot: {"type": "tick", "tick": 12, "deadlineMs": 50.0, "state": {...}}
+    bot -> world: {"tick": 12, "actions": [{"name": "TURN_LEFT"}]}
+
+Replies to earlier ticks are answered with error and ignored.
+"""
+
+import asyncio
+import logging
+import os
+from typing import List, Optional, Set
+
+from fastapi import WebSocket, WebSocketDisconnect
+from pydantic import BaseModel, ValidationError
+
+from .world_core import BotDecision, WorldAction
+
+logger = logging.getLogger(__name__)
+
+bot_decision_deadline_ms = float(os.environ.get("BOT_DECISION_DEADLINE_MS", "100"))
+
+
+class BotReply(BaseModel):
+    tick: int
+    actions: List[WorldAction] = []
+
+
+class BotConnection:
+    def __init__(self, name: str, websocket: WebSocket, action_names: Set[str]):
+        self.name = name
+        self.websocket = websocket
+        self.__action_names = action_names
+        self.__awaited_tick: Optional[int] = None
+        self.__decision: Optional[asyncio.Future[List[WorldAction]]] = None
+        self.__sending = False
+        # bot which stopped reading is disconnected, it gets no more ticks
+        self.__closing = False
+        self.__close_task: Optional[asyncio.Task] = None
+
+    async def decide(self, tick: int, message: str, deadline: float) -> BotDecision:
+        """
+        Sends tick message and waits for reply until `deadline` of loop clock
+        """
+        loop = asyncio.get_running_loop()
+        started_at = loop.time()
+        self.__awaited_tick = tick
+        self.__decision = loop.create_future()
+        actions: Optional[List[WorldAction]] = None
+        try:
+            if not self.__closing:
+                # send is bounded too, it blocks once bot stops reading
+                actions = await asyncio.wait_for(
+                    self.__send_and_wait(message, self.__decision),
+                    max(deadline - loop.time(), 0),
+                )
+        except (asyncio.TimeoutError, WebSocketDisconnect, RuntimeError):
+            # late, disconnected or closed bot misses the tick
+            if self.__sending:
+                # interrupted message leaves the stream unusable
+                logger.warning(f"Bot {self.name} doesn't read ticks, disconnecting")
+                self.__sending = False
+                self.__closing = True
+                self.__close_task = asyncio.create_task(self.__close())
+        finally:
+            self.__awaited_tick = None
+            self.__decision = None
+        return BotDecision(
+            bot=self.name,
+            tick=tick,
+            actions=actions,
+            latency=loop.time() - started_at,
+        )
+
+    async def __send_and_wait(
+        self, message: str, decision: asyncio.Future[List[WorldAction]]
+    ):
+        # stays set if send is interrupted
+        self.__sending = True
+        await self.websocket.send_text(message)
+        self.__sending = False
+        return await decision
+
+    async def __close(self):
+        try:
+            await self.websocket.close()
+        except Exception:
+            ...
+
+    async def run(self):
+        """
+        Reads replies until bot disconnects
+        """
+        try:
+            while True:
+                message = await self.websocket.receive_text()
+                try:
+                    reply = BotReply.model_validate_json(message)
+                except ValidationError as e:
+                    await self.__send_error(
+                        f"Invalid reply: {e.errors(include_url=False)}"
+                    )
+                    continue
+                unknown = [
+                    action.name
+                    for action in reply.actions
+                    if action.name not in self.__action_names
+                ]
+                if unknown:
+                    await self.__send_error(f"Unknown actions {unknown}")
+                    continue
+                if reply.tick != self.__awaited_tick or not self.__decision:
+                    await self.__send_error(f"Tick {reply.tick} is not awaited")
+                    continue
+                if not self.__decision.done():
+                    self.__decision.set_result(reply.actions)
+        except WebSocketDisconnect:
+            ...
+
+    async def __send_error(self, message: str):
+        await self.websocket.send_json(dict(type="error", message=message))
+
+
+class BotLobby:
+    """
+    Bots connected to single world
+    """
+
+    def __init__(self) -> None:
+        self.__bots: Set[BotConnection] = set()
+        self.__tick = 0
+
+    def add(self, bot: BotConnection):
+        self.__bots.add(bot)
+
+    def remove(self, bot: BotConnection):
+        self.__bots.discard(bot)
+
+    def is_empty(self):
+        return not self.__bots
+
+    async def decide(self, state_json: str, deadline_ms: float) -> List[BotDecision]:
+        """
+        Decisions of all connected bots on given state, late ones have no actions
+        """
+        self.__tick += 1
+        # state is JSON already, it is embedded as is
+        message = (
+            f'{{"type": "tick", "tick": {self.__tick}, '
+            f'"deadlineMs": {deadline_ms}, "state": {state_json}}}'
+        )
+        deadline = asyncio.get_running_loop().time() + deadline_ms / 1000
+        return await asyncio.gather(
+            *(bot.decide(self.__tick, message, deadline) for bot in list(self.__bots))
+        )
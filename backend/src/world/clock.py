@@ -0,0 +1,39 @@
+from abc import abstractmethod
+import asyncio
+import time
+
+
+class WorldClock:
+    @abstractmethod
+    def time(self) -> float:
+        """
+        Current world time in seconds
+        """
+
+    @abstractmethod
+    async def sleep(self, seconds: float): ...
+
+
+class RealClock(WorldClock):
+    def time(self) -> float:
+        return time.monotonic()
+
+    async def sleep(self, seconds: float):
+        await asyncio.sleep(seconds)
+
+
+class VirtualClock(WorldClock):
+    """
+    Clock for headless runs: sleeping advances world time instantly
+    """
+
+    def __init__(self, start: float = 0.0) -> None:
+        self.__now = start
+
+    def time(self) -> float:
+        return self.__now
+
+    async def sleep(self, seconds: float):
+        self.__now += max(seconds, 0.0)
+        # still let other tasks run, e.g. stop requests and step writer
+        await asyncio.sleep(0)
@@ -0,0 +1,86 @@
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass
+import logging
+import os
+from typing import Awaitable, Callable, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+frame_cache_max_bytes = int(os.environ.get("FRAME_CACHE_MAX_BYTES", str(64 << 20)))
+
+
+@dataclass
+class FrameCacheStats:
+    hits: int = 0
+    misses: int = 0
+    # requests which joined render already in progress
+    collapsed: int = 0
+    evictions: int = 0
+
+
+class FrameCache:
+    """
+    LRU of encoded frames limited by total size in bytes.
+    Concurrent requests for the same missing frame share a single render.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.__max_bytes = max_bytes
+        self.__size_bytes = 0
+        self.__frames: OrderedDict[Hashable, bytes] = OrderedDict()
+        self.__rendering: Dict[Hashable, asyncio.Task[bytes]] = {}
+        self.stats = FrameCacheStats()
+
+    @property
+    def size_bytes(self):
+        return self.__size_bytes
+
+    @property
+    def max_bytes(self):
+        return self.__max_bytes
+
+    def __len__(self):
+        return len(self.__frames)
+
+    async def get_or_render(
+        self, key: Hashable, render: Callable[[], Awaitable[bytes]]
+    ) -> bytes:
+        frame = self.__frames.get(key)
+        if frame is not None:
+            self.stats.hits += 1
+            self.__frames.move_to_end(key)
+            return frame
+
+        task = self.__rendering.get(key)
+        if task:
+            self.stats.collapsed += 1
+        else:
+            self.stats.misses += 1
+            task = asyncio.create_task(self.__render(key, render))
+            self.__rendering[key] = task
+            task.add_done_callback(lambda task: self.__on_rendered(key, task))
+        # render must survive cancellation of request which started it
+        return await asyncio.shield(task)
+
+    async def __render(self, key: Hashable, render: Callable[[], Awaitable[bytes]]):
+        frame = await render()
+        self.__put(key, frame)
+        return frame
+
+    def __on_rendered(self, key: Hashable, task: asyncio.Task[bytes]):
+        if self.__rendering.get(key) is task:
+            del self.__rendering[key]
+        # all requests awaiting render may be gone already
+        if not task.cancelled() and task.exception():
+            logger.debug(f"Render of frame {key} failed: {task.exception()!r}")
+
+    def __put(self, key: Hashable, frame: bytes):
+        if len(frame) > self.__max_bytes:
+            return
+        self.__frames[key] = frame
+        self.__size_bytes += len(frame)
+        while self.__size_bytes > self.__max_bytes:
+            _, evicted = self.__frames.popitem(last=False)
+            self.__size_bytes -= len(evicted)
+            self.stats.evictions += 1
@@ -0,0 +1,351 @@
+"""
+NDJSON export and import of world history. First line describes world, then
+each stage is described by a line before its first step:
+
+    {"type": "world", "id": 1, "title": "...", "plugin": "...", "config": null, ...}
+    {"type": "stage", "id": 3, "title": "...", "code": "..."}
+    {"type": "step", "id": 10, "stageId": 3, "state": {...}, "actions": [...], ...}
+
+States are exported in full as JSON, whether stored as keyframes and deltas, or
+in binary.
+"""
+
+from enum import StrEnum
+import json
+import logging
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import zlib
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+import zstandard as zstd
+
+from ..plugins import get_plugin_class
+from ..utils.json_delta import apply_delta
+from .. import database, models
+from .step_codec import PayloadEncoder, decode_payload, load_payload_encoder
+from .step_history import get_keyframe_doc
+from .step_partitions import create_step_partition
+from .world_head import refresh_world_head
+from .world_lineage import get_world_lineage, lineage_steps_filter
+from .world_core import AbstractPlugin
+from .world_service import get_world
+
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_CHUNK_SIZE = 64 << 10
+IMPORT_BATCH_SIZE = 5000
+
+STEP_COLUMNS = ["stage_id", "world_id", "state", "actions", "logs", "interactions"]
+
+
+class HistoryCompression(StrEnum):
+    GZIP = "gzip"
+    ZSTD = "zstd"
+
+
+HISTORY_MEDIA_TYPES = {
+    None: "application/x-ndjson",
+    HistoryCompression.GZIP: "application/gzip",
+    HistoryCompression.ZSTD: "application/zstd",
+}
+
+HISTORY_FILE_EXTENSIONS = {
+    None: "ndjson",
+    HistoryCompression.GZIP: "ndjson.gz",
+    HistoryCompression.ZSTD: "ndjson.zst",
+}
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+async def export_world_history(
+    world_id: int,
+    from_step_id: Optional[int] = None,
+    to_step_id: Optional[int] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Yields NDJSON chunks. Steps are read by server-side cursor, so memory use
+    doesn't depend on history size.
+    """
+    # streaming cursor occupies its connection, lookups need another one
+    async with database.SessionLocal() as db, database.SessionLocal() as lookup_db:
+        world = await get_world(db, world_id)
+        chunk: List[str] = [
+            json.dumps(
+                dict(
+                    type="world",
+                    id=world.id,
+                    title=world.title,
+                    plugin=world.plugin,
+                    config=world.config,
+                    keyframeInterval=world.keyframe_interval,
+                    stateCodec=world.state_codec,
+                )
+            )
+        ]
+        chunk_size = 0
+
+        stmt = (
+            select(
+                models.Step.id,
+                models.Step.world_id,
+                models.Step.stage_id,
+                models.Step.state,
+                models.Step.packed_state,
+                models.Step.base_step_id,
+                models.Step.actions,
+                models.Step.logs,
+                models.Step.interactions,
+                models.Stage.title,
+                models.Stage.code,
+            )
+            .join(models.Stage)
+            # forked world exports inherited steps too
+            .where(lineage_steps_filter(await get_world_lineage(db, world_id)))
+            .order_by(models.Step.id)
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        if from_step_id is not None:
+            stmt = stmt.where(models.Step.id >= from_step_id)
+        if to_step_id is not None:
+            stmt = stmt.where(models.Step.id <= to_step_id)
+
+        last_stage_id: Optional[int] = None
+        # deltas mostly refer to the latest keyframe, it is parsed on first use
+        keyframe: Tuple[Optional[int], Optional[str]] = (None, None)
+        keyframe_doc = None
+        # binary states are converted to JSON by plugin which packed them
+        plugin: Optional[AbstractPlugin] = None
+        async for row in await db.stream(stmt):
+            if row.stage_id != last_stage_id:
+                last_stage_id = row.stage_id
+                chunk.append(
+                    json.dumps(
+                        dict(
+                            type="stage",
+                            id=row.stage_id,
+                            title=row.title,
+                            code=row.code,
+                        )
+                    )
+                )
+            state = row.state
+            if row.packed_state is not None:
+                if plugin is None:
+                    plugin = get_plugin_class(world.plugin)()
+                state = plugin.serialize_state(plugin.unpack_state(row.packed_state))
+            elif row.base_step_id is None:
+                keyframe, keyframe_doc = (row.id, row.state), None
+            else:
+                if row.base_step_id == keyframe[0]:
+                    if keyframe_doc is None:
+                        keyframe_doc = json.loads(keyframe[1])
+                    base = keyframe_doc
+                else:
+                    base = await get_keyframe_doc(
+                        lookup_db, row.base_step_id, row.world_id
+                    )
+                state = json.dumps(
+                    apply_delta(base, json.loads(row.state)), separators=(",", ":")
+                )
+            # stored values are JSON already, they are embedded as is
+            line = (
+                f'{{"type": "step", "id": {row.id}, "stageId": {row.stage_id}, '
+                f'"state": {state}, "actions": {row.actions}, '
+                f'"logs": {await decode_payload(lookup_db, row.logs)}, '
+                f'"interactions": {await decode_payload(lookup_db, row.interactions)}}}'
+            )
+            chunk.append(line)
+            chunk_size += len(line)
+            if chunk_size >= EXPORT_CHUNK_SIZE:
+                yield ("\n".join(chunk) + "\n").encode()
+                chunk, chunk_size = [], 0
+        if chunk:
+            yield ("\n".join(chunk) + "\n").encode()
+        if plugin:
+            plugin.release()
+
+
+async def compress_stream(
+    chunks: AsyncIterator[bytes], compression: Optional[HistoryCompression]
+) -> AsyncIterator[bytes]:
+    if compression is None:
+        async for chunk in chunks:
+            yield chunk
+        return
+    if compression == HistoryCompression.GZIP:
+        compressor = zlib.compressobj(level=6, wbits=31)
+    else:
+        compressor = zstd.ZstdCompressor(level=3).compressobj()
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Splits stream into lines, gzip or zstd compressed stream is detected by magic
+    """
+    decompressor = None
+    tail = b""
+    async for chunk in chunks:
+        if not chunk:
+            continue
+        if decompressor is None:
+            if chunk.startswith(GZIP_MAGIC):
+                decompressor = zlib.decompressobj(wbits=31)
+            elif chunk.startswith(ZSTD_MAGIC):
+                decompressor = zstd.ZstdDecompressor().decompressobj()
+            else:
+                decompressor = False
+        if decompressor:
+            chunk = decompressor.decompress(chunk)
+        lines = (tail + chunk).split(b"\n")
+        tail = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield line
+    if tail.strip():
+        yield tail
+
+
+class HistoryImporter:
+    """
+    Appends stages and steps from NDJSON export to a world.
+    Steps are loaded with COPY on PostgreSQL, states are stored in full.
+    """
+
+    def __init__(self, db: AsyncSession, world: models.World) -> None:
+        self.__db = db
+        self.__world = world
+        self.__payload_encoder: Optional[PayloadEncoder] = None
+        # exported stage id to imported one
+        self.__stage_ids: Dict[int, int] = {}
+        self.__rows: List[tuple] = []
+        self.steps = 0
+
+    async def import_lines(self, lines: AsyncIterator[bytes]):
+        self.__payload_encoder = await load_payload_encoder(
+            self.__db, self.__world.plugin
+        )
+        async for line in lines:
+            record = json.loads(line)
+            if record["type"] == "stage":
+                await self.__add_stage(record)
+            elif record["type"] == "step":
+                self.__add_step(record)
+                if len(self.__rows) >= IMPORT_BATCH_SIZE:
+                    await self.__flush()
+        await self.__flush()
+        await self.__update_stage_summaries()
+        await refresh_world_head(self.__db, self.__world.id)
+
+    async def __add_stage(self, record: dict):
+        if record["id"] in self.__stage_ids:
+            return
+        res = await self.__db.execute(
+            insert(models.Stage).returning(models.Stage.id),
+            dict(world_id=self.__world.id, title=record["title"], code=record["code"]),
+        )
+        self.__stage_ids[record["id"]] = res.scalar_one()
+
+    def __add_step(self, record: dict):
+        stage_id = self.__stage_ids.get(record["stageId"])
+        if stage_id is None:
+            raise RuntimeError(f"Step #{record['id']} precedes its stage")
+        self.__rows.append(
+            (
+                stage_id,
+                self.__world.id,
+                json.dumps(record["state"], separators=(",", ":")),
+                json.dumps(record["actions"]),
+                self.__payload_encoder.encode(json.dumps(record["logs"])),
+                self.__payload_encoder.encode(json.dumps(record["interactions"])),
+            )
+        )
+
+    async def __flush(self):
+        if not self.__rows:
+            return
+        rows, self.__rows = self.__rows, []
+        conn = await self.__db.connection()
+        if conn.dialect.name == "postgresql":
+            raw_conn = await conn.get_raw_connection()
+            await raw_conn.driver_connection.copy_records_to_table(
+                models.Step.__tablename__, records=rows, columns=STEP_COLUMNS
+            )
+        else:
+            await self.__db.execute(
+                insert(models.Step), [dict(zip(STEP_COLUMNS, row)) for row in rows]
+            )
+        self.steps += len(rows)
+
+    async def __update_stage_summaries(self):
+        if not self.__stage_ids:
+            return
+        stmt = (
+            select(
+                models.Step.stage_id,
+                func.min(models.Step.id),
+                func.max(models.Step.id),
+                func.count(),
+            )
+            .where(models.Step.stage_id.in_(self.__stage_ids.values()))
+            .group_by(models.Step.stage_id)
+        )
+        for stage_id, first_step_id, last_step_id, step_count in (
+            await self.__db.execute(stmt)
+        ).tuples():
+            await self.__db.execute(
+                update(models.Stage)
+                .where(models.Stage.id == stage_id)
+                .values(
+                    first_step_id=first_step_id,
+                    last_step_id=last_step_id,
+                    step_count=step_count,
+                )
+            )
+
+
+async def import_world_history(
+    db: AsyncSession, lines: AsyncIterator[bytes], world_id: Optional[int] = None
+) -> Tuple[models.World, int]:
+    """
+    Restores history into existing world, or clones it into new world created
+    from exported one. Returns world and number of imported steps.
+    """
+    try:
+        header = json.loads(await anext(lines))
+    except (StopAsyncIteration, ValueError):
+        # empty upload or garbage instead of header
+        header = None
+    if not isinstance(header, dict) or header.get("type") != "world":
+        raise RuntimeError("History must start with world line")
+    if world_id is not None:
+        world = await get_world(db, world_id)
+        if world.plugin != header["plugin"]:
+            raise RuntimeError(
+                f"World #{world_id} runs {world.plugin}, history is of {header['plugin']}"
+            )
+    else:
+        world = models.World(
+            title=header["title"],
+            plugin=header["plugin"],
+            config=header["config"],
+            keyframe_interval=header.get("keyframeInterval"),
+            state_codec=header.get("stateCodec"),
+        )
+        db.add(world)
+        await db.flush()
+        await create_step_partition(db, world.id)
+
+    importer = HistoryImporter(db, world)
+    await importer.import_lines(lines)
+    await db.commit()
+    logger.info(f"Imported {importer.steps} steps into world #{world.id}")
+    return world, importer.steps
@@ -0,0 +1,575 @@
+from abc import abstractmethod
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, fields
+import itertools
+import logging
+import multiprocessing
+import os
+import time
+import traceback
+from multiprocessing.connection import Connection
+from multiprocessing.reduction import ForkingPickler
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Set
+
+from ..plugins import get_plugin_class
+from ..utils.images import ImageFormat
+from .clock import RealClock, VirtualClock
+from .plugin_log import LogLevel, plugin_log_level
+from .state_codec import StateCodec, StateDump, decode_state, encode_state
+from .world_core import (
+    AbstractPlugin,
+    AddedActions,
+    BotDecision,
+    PluginSnapshot,
+    TickResult,
+    WorldAction,
+)
+
+logger = logging.getLogger(__name__)
+
+world_workers = int(os.environ.get("WORLD_WORKERS", "0"))
+# plugins of worlds which are not running, per process
+plugin_max_idle = int(os.environ.get("PLUGIN_MAX_IDLE", "32"))
+plugin_idle_ttl = float(os.environ.get("PLUGIN_IDLE_TTL", "300"))
+plugin_max_snapshots = int(os.environ.get("PLUGIN_MAX_SNAPSHOTS", "1024"))
+
+# idle plugins are checked for TTL at most that often, in seconds
+EVICTION_SWEEP_INTERVAL = 1.0
+
+
+async def _start(
+    plugin: AbstractPlugin,
+    state_dump: Optional[StateDump],
+    stage_code: Optional[str],
+    stage_title: Optional[str],
+    headless: bool,
+    config: Optional[str] = None,
+    log_level: LogLevel = plugin_log_level,
+):
+    plugin.config = config
+    plugin.logger.set_level(log_level)
+    if state_dump is not None:
+        plugin.load(
+            state=decode_state(plugin, state_dump),
+            stage_code=stage_code,
+            stage_title=stage_title,
+        )
+    # headless world runs as fast as possible, plugin sleeps are virtual
+    plugin.clock = VirtualClock(plugin.time()) if headless else RealClock()
+
+
+async def _do_tick(
+    plugin: AbstractPlugin,
+    frame_formats: Sequence[ImageFormat],
+    state_codec: Optional[StateCodec],
+    state_json: bool = False,
+):
+    timings = {}
+    started_at = time.perf_counter()
+    tick_result = await plugin.do_tick()
+    phase_started_at = time.perf_counter()
+    timings["plugin_step"] = phase_started_at - started_at
+    if state_codec:
+        # encoded next to the plugin, in worker process if there is one
+        tick_result.state_dump = encode_state(plugin, tick_result.state, state_codec)
+        now = time.perf_counter()
+        timings["encode"], phase_started_at = now - phase_started_at, now
+    if state_json:
+        tick_result.state_json = (
+            tick_result.state_dump
+            if state_codec == StateCodec.JSON
+            else plugin.serialize_state(tick_result.state)
+        )
+    if frame_formats:
+        # rendered next to the plugin, state is not serialized for that
+        for image_format in frame_formats:
+            tick_result.frames[image_format] = plugin.render_state_as(
+                tick_result.state, image_format
+            )
+        timings["render"] = time.perf_counter() - phase_started_at
+    tick_result.timings = timings
+    return tick_result
+
+
+async def _add_actions(
+    plugin: AbstractPlugin, actions: List[WorldAction], submitted_at: float
+):
+    return plugin.add_actions(actions, submitted_at)
+
+
+async def _add_bot_decisions(plugin: AbstractPlugin, decisions: List[BotDecision]):
+    plugin.add_bot_decisions(decisions)
+
+
+async def _render_state(
+    plugin: AbstractPlugin, state_dump: StateDump, image_format: ImageFormat
+):
+    return plugin.render_state_as(decode_state(plugin, state_dump), image_format)
+
+
+async def _describe_state(plugin: AbstractPlugin, state_dump: StateDump):
+    return plugin.describe_state(decode_state(plugin, state_dump))
+
+
+async def _serialize_state(plugin: AbstractPlugin, state_dump: StateDump):
+    return plugin.serialize_state(decode_state(plugin, state_dump))
+
+
+PLUGIN_COMMANDS: Dict[str, Callable[..., Awaitable[Any]]] = {
+    "start": _start,
+    "do_tick": _do_tick,
+    "add_actions": _add_actions,
+    "add_bot_decisions": _add_bot_decisions,
+    "render_state": _render_state,
+    "describe_state": _describe_state,
+    "serialize_state": _serialize_state,
+}
+
+
+@dataclass
+class PluginStats:
+    resident: int = 0
+    running: int = 0
+    snapshots: int = 0
+    snapshot_bytes: int = 0
+    evictions: int = 0
+    restores: int = 0
+    # resident memory of processes hosting plugins
+    memory_bytes: int = 0
+
+    def __add__(self, other: "PluginStats"):
+        return PluginStats(
+            **{
+                f.name: getattr(self, f.name) + getattr(other, f.name)
+                for f in fields(self)
+            }
+        )
+
+
+def _get_memory_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return 0
+
+
+class PluginSlots:
+    """
+    Plugin instances of worlds living in current process. Plugins of worlds
+    which are not running are evicted, when least recently used or idle for too
+    long. Their loadable data is kept as snapshot and restored on next use.
+    """
+
+    def __init__(
+        self,
+        max_idle: int = plugin_max_idle,
+        idle_ttl: float = plugin_idle_ttl,
+        max_snapshots: int = plugin_max_snapshots,
+    ) -> None:
+        self.__max_idle = max_idle
+        self.__idle_ttl = idle_ttl
+        self.__max_snapshots = max_snapshots
+        # ordered by last use
+        self.__pluguns: OrderedDict[int, AbstractPlugin] = OrderedDict()
+        self.__last_used: Dict[int, float] = {}
+        # running worlds are never evicted
+        self.__running: Set[int] = set()
+        self.__snapshots: OrderedDict[int, PluginSnapshot] = OrderedDict()
+        self.__next_sweep_at = 0.0
+        self.__evictions = 0
+        self.__restores = 0
+
+    def has(self, world_id: int):
+        return world_id in self.__pluguns or world_id in self.__snapshots
+
+    def get(self, world_id: int, plugin: str) -> AbstractPlugin:
+        ret = self.__pluguns.get(world_id)
+        if ret is None:
+            ret = get_plugin_class(plugin)()
+            snapshot = self.__snapshots.pop(world_id, None)
+            if snapshot:
+                ret.restore(snapshot)
+                self.__restores += 1
+            self.__pluguns[world_id] = ret
+        self.__pluguns.move_to_end(world_id)
+        self.__last_used[world_id] = time.monotonic()
+        return ret
+
+    async def execute(
+        self, world_id: Optional[int], plugin: Optional[str], command: str, args: tuple
+    ):
+        if command == "stats":
+            return self.get_stats()
+        if command == "stop":
+            self.__running.discard(world_id)
+            # eviction walks plugins in order of use, it must match timestamps
+            if world_id in self.__pluguns:
+                self.__pluguns.move_to_end(world_id)
+                self.__last_used[world_id] = time.monotonic()
+            return
+        if command == "start":
+            self.__running.add(world_id)
+        try:
+            return await PLUGIN_COMMANDS[command](self.get(world_id, plugin), *args)
+        finally:
+            self.__evict_if_needed()
+
+    def evict_idle(self, now: Optional[float] = None):
+        """
+        Evicts least recently used plugins over the limit and expired ones
+        """
+        now = time.monotonic() if now is None else now
+        idle = [
+            world_id for world_id in self.__pluguns if world_id not in self.__running
+        ]
+        excess = len(idle) - self.__max_idle
+        for world_id in idle:
+            if excess <= 0 and now - self.__last_used[world_id] < self.__idle_ttl:
+                break
+            self.__evict(world_id)
+            excess -= 1
+
+    def get_stats(self):
+        return PluginStats(
+            resident=len(self.__pluguns),
+            running=len(self.__running),
+            snapshots=len(self.__snapshots),
+            snapshot_bytes=sum(
+                len(snapshot.state_dump or "") for snapshot in self.__snapshots.values()
+            ),
+            evictions=self.__evictions,
+            restores=self.__restores,
+            memory_bytes=_get_memory_bytes(),
+        )
+
+    def __evict_if_needed(self):
+        now = time.monotonic()
+        over_limit = len(self.__pluguns) - len(self.__running) > self.__max_idle
+        if over_limit or now >= self.__next_sweep_at:
+            self.__next_sweep_at = now + EVICTION_SWEEP_INTERVAL
+            self.evict_idle(now)
+
+    def __evict(self, world_id: int):
+        plugin = self.__pluguns.pop(world_id)
+        del self.__last_used[world_id]
+        snapshot = plugin.snapshot()
+        if snapshot:
+            self.__snapshots[world_id] = snapshot
+            while len(self.__snapshots) > self.__max_snapshots:
+                self.__snapshots.popitem(last=False)
+        plugin.release()
+        self.__evictions += 1
+        logger.debug(f"Evicted idle plugin of world #{world_id}")
+
+
+class PluginHost:
+    """
+    Executes plugin code of worlds, either in-process or in worker processes.
+    Plugins are created lazily on first command for a world.
+    """
+
+    async def start(
+        self,
+        world_id: int,
+        plugin: str,
+        state_dump: Optional[StateDump],
+        stage_code: Optional[str],
+        stage_title: Optional[str],
+        headless: bool,
+        config: Optional[str] = None,
+        log_level: LogLevel = plugin_log_level,
+    ):
+        await self._call(
+            world_id,
+            plugin,
+            "start",
+            state_dump,
+            stage_code,
+            stage_title,
+            headless,
+            config,
+            log_level,
+        )
+
+    async def stop(self, world_id: int):
+        """
+        Makes plugin of world evictable again
+        """
+        await self._call(world_id, None, "stop")
+
+    async def do_tick(
+        self,
+        world_id: int,
+        plugin: str,
+        frame_formats: Sequence[ImageFormat] = (),
+        state_codec: Optional[StateCodec] = None,
+        state_json: bool = False,
+    ) -> TickResult:
+        """
+        State of result is encoded by `state_codec`, if it is set, and
+        serialized to JSON if `state_json` is set
+        """
+        return await self._call(
+            world_id, plugin, "do_tick", frame_formats, state_codec, state_json
+        )
+
+    async def add_actions(
+        self,
+        world_id: int,
+        plugin: str,
+        actions: List[WorldAction],
+        submitted_at: float,
+    ) -> AddedActions:
+        """
+        Batch of actions is delivered by single call, see AbstractPlugin.add_actions
+        """
+        return await self._call(world_id, plugin, "add_actions", actions, submitted_at)
+
+    async def add_bot_decisions(
+        self, world_id: int, plugin: str, decisions: List[BotDecision]
+    ):
+        await self._call(world_id, plugin, "add_bot_decisions", decisions)
+
+    async def render_state(
+        self,
+        world_id: int,
+        plugin: str,
+        state_dump: StateDump,
+        image_format: ImageFormat,
+    ) -> bytes:
+        return await self._call(
+            world_id, plugin, "render_state", state_dump, image_format
+        )
+
+    async def describe_state(
+        self, world_id: int, plugin: str, state_dump: StateDump
+    ) -> Dict[str, str]:
+        return await self._call(world_id, plugin, "describe_state", state_dump)
+
+    async def serialize_state(
+        self, world_id: int, plugin: str, state_dump: StateDump
+    ) -> str:
+        """
+        JSON of state, whichever codec it is encoded with
+        """
+        return await self._call(world_id, plugin, "serialize_state", state_dump)
+
+    @abstractmethod
+    def is_loaded(self, world_id: int) -> bool: ...
+
+    @abstractmethod
+    async def get_stats(self) -> PluginStats: ...
+
+    @abstractmethod
+    async def _call(
+        self, world_id: int, plugin: Optional[str], command: str, *args
+    ) -> Any: ...
+
+    def close(self): ...
+
+
+class LocalPluginHost(PluginHost):
+    def __init__(self) -> None:
+        self.__slots = PluginSlots()
+
+    def is_loaded(self, world_id: int):
+        return self.__slots.has(world_id)
+
+    async def get_stats(self):
+        return self.__slots.get_stats()
+
+    async def _call(self, world_id: int, plugin: Optional[str], command: str, *args):
+        return await self.__slots.execute(world_id, plugin, command, args)
+
+
+def _worker_main(conn: Connection):
+    asyncio.run(_worker_loop(conn))
+
+
+async def _worker_loop(conn: Connection):
+    slots = PluginSlots()
+    loop = asyncio.get_running_loop()
+    stopped = loop.create_future()
+    tasks: Set[asyncio.Task] = set()
+    # blocking send would stall the loop while parent is busy sending to us
+    sender = ThreadPoolExecutor(max_workers=1, thread_name_prefix="plugin-reply")
+
+    async def handle(
+        request_id: int,
+        world_id: Optional[int],
+        plugin: Optional[str],
+        command: str,
+        args,
+    ):
+        try:
+            reply = (
+                request_id,
+                True,
+                await slots.execute(world_id, plugin, command, args),
+            )
+        except Exception as e:
+            # plugin exceptions are not necessarily picklable
+            reply = (request_id, False, f"{e!r}\n{traceback.format_exc()}")
+        try:
+            data = ForkingPickler.dumps(reply)
+        except Exception as e:
+            # e.g. result is not picklable, caller must still get an answer
+            data = ForkingPickler.dumps(
+                (
+                    request_id,
+                    False,
+                    f"Failed to send reply of {command}: {e!r}\n"
+                    f"{traceback.format_exc()}",
+                )
+            )
+        await loop.run_in_executor(sender, conn.send_bytes, data)
+
+    def on_readable():
+        try:
+            while conn.poll():
+                message = conn.recv()
+                if message is None:
+                    break
+                task = loop.create_task(handle(*message))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            else:
+                return
+        except EOFError:
+            ...
+        loop.remove_reader(conn.fileno())
+        if not stopped.done():
+            stopped.set_result(None)
+
+    # commands of different worlds run concurrently, same as on main event loop
+    loop.add_reader(conn.fileno(), on_readable)
+    await stopped
+    sender.shutdown(wait=False, cancel_futures=True)
+
+
+class PluginWorker:
+    def __init__(self, ctx: Any, index: int) -> None:
+        self.__conn, child_conn = ctx.Pipe()
+        self.__process = ctx.Process(
+            target=_worker_main,
+            args=(child_conn,),
+            name=f"plugin-worker-{index}",
+            daemon=True,
+        )
+        self.__process.start()
+        child_conn.close()
+        self.__request_ids = itertools.count(1)
+        self.__pending: Dict[int, asyncio.Future] = {}
+        self.__loop: Optional[asyncio.AbstractEventLoop] = None
+        # requests are written from thread in order, full pipe doesn't block loop
+        self.__sender = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=f"plugin-worker-{index}-send"
+        )
+
+    async def call(
+        self,
+        world_id: Optional[int],
+        plugin: Optional[str],
+        command: str,
+        args: tuple,
+    ):
+        loop = asyncio.get_running_loop()
+        if self.__loop is None:
+            self.__loop = loop
+            loop.add_reader(self.__conn.fileno(), self.__on_readable)
+        if not self.__process.is_alive():
+            raise RuntimeError(f"Plugin worker {self.__process.name} is not running")
+
+        request_id = next(self.__request_ids)
+        future = loop.create_future()
+        self.__pending[request_id] = future
+        try:
+            data = ForkingPickler.dumps((request_id, world_id, plugin, command, args))
+            await loop.run_in_executor(self.__sender, self.__conn.send_bytes, data)
+        except BaseException:
+            self.__pending.pop(request_id, None)
+            raise
+        return await future
+
+    def __on_readable(self):
+        try:
+            while self.__conn.poll():
+                request_id, ok, result = self.__conn.recv()
+                future = self.__pending.pop(request_id, None)
+                if not future or future.done():
+                    continue
+                if ok:
+                    future.set_result(result)
+                else:
+                    future.set_exception(RuntimeError(result))
+        except EOFError:
+            logger.error(f"Plugin worker {self.__process.name} died")
+            self.__detach()
+            for future in self.__pending.values():
+                if not future.done():
+                    future.set_exception(RuntimeError("Plugin worker died"))
+            self.__pending.clear()
+
+    def __detach(self):
+        if self.__loop:
+            self.__loop.remove_reader(self.__conn.fileno())
+            self.__loop = None
+
+    def close(self):
+        self.__detach()
+        self.__sender.shutdown(wait=False, cancel_futures=True)
+        try:
+            self.__conn.send(None)
+        except Exception:
+            ...
+        self.__process.join(timeout=5)
+        if self.__process.is_alive():
+            self.__process.terminate()
+        self.__conn.close()
+
+
+class ProcessPluginHost(PluginHost):
+    """
+    Worlds are sharded over worker processes by world id, so CPU-heavy plugins
+    don't block main event loop and each other
+    """
+
+    def __init__(self, workers: int) -> None:
+        # fork is unsafe with running event loop and open DB connections
+        ctx = multiprocessing.get_context("spawn")
+        self.__workers: List[PluginWorker] = [
+            PluginWorker(ctx, index) for index in range(workers)
+        ]
+        self.__loaded: Set[int] = set()
+        logger.info(f"Started {workers} plugin workers")
+
+    def is_loaded(self, world_id: int):
+        return world_id in self.__loaded
+
+    async def get_stats(self):
+        stats = await asyncio.gather(
+            *(worker.call(None, None, "stats", ()) for worker in self.__workers)
+        )
+        return sum(stats, PluginStats())
+
+    async def _call(self, world_id: int, plugin: Optional[str], command: str, *args):
+        worker = self.__workers[world_id % len(self.__workers)]
+        self.__loaded.add(world_id)
+        ret = await worker.call(world_id, plugin, command, args)
+        if command == "stop":
+            # worker may evict plugin of stopped world any time
+            self.__loaded.discard(world_id)
+        return ret
+
+    def close(self):
+        for worker in self.__workers:
+            worker.close()
+
+
+def create_plugin_host() -> PluginHost:
+    if world_workers > 0:
+        return ProcessPluginHost(world_workers)
+    return LocalPluginHost()
@@ -0,0 +1,136 @@
+"""
+Log of plugin, collected per tick and stored with its step. Unlike stdlib
+logging, entry below level of world costs a comparison, message is formatted
+only for entries which are kept, %-style like in logging, and nothing is
+registered globally per plugin instance.
+"""
+
+from collections import deque
+from enum import StrEnum
+import os
+from typing import Any, Deque, Dict, List, Tuple
+
+
+class LogLevel(StrEnum):
+    DEBUG = "DEBUG"
+    INFO = "INFO"
+    WARNING = "WARNING"
+    ERROR = "ERROR"
+    CRITICAL = "CRITICAL"
+
+
+LOG_LEVEL_VALUES: Dict[LogLevel, int] = {
+    LogLevel.DEBUG: 10,
+    LogLevel.INFO: 20,
+    LogLevel.WARNING: 30,
+    LogLevel.ERROR: 40,
+    LogLevel.CRITICAL: 50,
+}
+_LOG_LEVEL_NAMES = {value: level for level, value in LOG_LEVEL_VALUES.items()}
+# entries of these levels and above are never sampled out
+_SAMPLED_BELOW = LOG_LEVEL_VALUES[LogLevel.WARNING]
+
+# level of worlds without own one
+plugin_log_level = LogLevel(os.environ.get("PLUGIN_LOG_LEVEL", LogLevel.INFO))
+
+
+class PluginLog:
+    """
+    Ring buffer of entries of current tick. Above `max_entries` the oldest
+    entries are overwritten and counted. With `sample_every` N > 1 only every
+    N-th entry below WARNING is kept.
+    """
+
+    def __init__(
+        self,
+        level: LogLevel = plugin_log_level,
+        max_entries: int = 100,
+        sample_every: int = 1,
+    ) -> None:
+        self.__entries: Deque[Tuple[int, str, Tuple[Any, ...]]] = deque(
+            maxlen=max_entries
+        )
+        self.sample_every = sample_every
+        self.__sample_count = 0
+        self.__overflow = 0
+        # entries overwritten since plugin creation
+        self.overflow_total = 0
+        self.set_level(level)
+
+    def set_level(self, level: LogLevel):
+        self.level = level
+        self.__min_value = LOG_LEVEL_VALUES[level]
+
+    def is_enabled_for(self, level: LogLevel):
+        """
+        Guard of arguments which are expensive to compute
+        """
+        return LOG_LEVEL_VALUES[level] >= self.__min_value
+
+    def debug(self, message: str, *args: Any):
+        if self.__min_value <= 10:
+            self.__add(10, message, args)
+
+    def info(self, message: str, *args: Any):
+        if self.__min_value <= 20:
+            self.__add(20, message, args)
+
+    def warning(self, message: str, *args: Any):
+        if self.__min_value <= 30:
+            self.__add(30, message, args)
+
+    def error(self, message: str, *args: Any):
+        if self.__min_value <= 40:
+            self.__add(40, message, args)
+
+    def critical(self, message: str, *args: Any):
+        if self.__min_value <= 50:
+            self.__add(50, message, args)
+
+    def log(self, level: LogLevel, message: str, *args: Any):
+        value = LOG_LEVEL_VALUES[level]
+        if value >= self.__min_value:
+            self.__add(value, message, args)
+
+    def take(self) -> List[Tuple[str, str]]:
+        """
+        Formatted entries of tick as level and message, clears buffer
+        """
+        ret = [
+            (_LOG_LEVEL_NAMES[value], _format(message, args))
+            for value, message, args in self.__entries
+        ]
+        if self.__overflow:
+            ret.insert(
+                0,
+                (
+                    LogLevel.WARNING,
+                    f"{self.__overflow} earlier log entries of tick overwritten",
+                ),
+            )
+        self.clear()
+        return ret
+
+    def clear(self):
+        self.__entries.clear()
+        self.__overflow = 0
+
+    def __add(self, value: int, message: str, args: Tuple[Any, ...]):
+        if self.sample_every > 1 and value < _SAMPLED_BELOW:
+            self.__sample_count += 1
+            if self.__sample_count % self.sample_every:
+                return
+        if len(self.__entries) == self.__entries.maxlen:
+            self.__overflow += 1
+            self.overflow_total += 1
+        self.__entries.append((value, message, args))
+
+
+def _format(message: str, args: Tuple[Any, ...]):
+    if not args:
+        return message
+    try:
+        return message % args
+    except (TypeError, ValueError) as e:
+        # broken log call shouldn't break the tick
+        return f"{message} {args!r} ({e})"
@@ -0,0 +1,37 @@
+from enum import StrEnum
+from typing import Optional
+
+from .. import models
+from .world_core import AbstractPlugin
+
+
+class StateCodec(StrEnum):
+    JSON = "json"
+    # binary, see AbstractPlugin.pack_state
+    MSGPACK = "msgpack"
+
+
+# dump is text for JSON codec and bytes for binary one
+type StateDump = str | bytes
+
+
+def get_world_state_codec(world: models.World) -> Optional[StateCodec]:
+    """
+    Codec of full states stored for world. Keyframes and deltas are always JSON,
+    so states of such worlds are encoded by step writer instead.
+    """
+    if world.keyframe_interval:
+        return None
+    return StateCodec(world.state_codec or StateCodec.JSON)
+
+
+def encode_state(plugin: AbstractPlugin, state, codec: Optional[StateCodec]):
+    if codec == StateCodec.MSGPACK:
+        return plugin.pack_state(state)
+    return plugin.serialize_state(state)
+
+
+def decode_state(plugin: AbstractPlugin, state_dump: StateDump):
+    if isinstance(state_dump, bytes):
+        return plugin.unpack_state(state_dump)
+    return plugin.parse_state(state_dump)
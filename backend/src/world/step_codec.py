@@ -0,0 +1,99 @@
+from enum import StrEnum
+import os
+import struct
+from typing import Dict, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+import zstandard as zstd
+
+from .. import models
+
+
+class PayloadCodec(StrEnum):
+    PLAIN = "plain"
+    ZSTD = "zstd"
+    # zstd with dictionary trained per plugin, plain zstd until one is trained
+    ZSTD_DICT = "zstd-dict"
+
+
+step_payload_codec = PayloadCodec(os.environ.get("STEP_PAYLOAD_CODEC", "zstd"))
+
+# compression only adds overhead for short payloads, e.g. empty lists
+MIN_COMPRESS_SIZE = 64
+ZSTD_LEVEL = 3
+
+# first byte of encoded payload, plain JSON payloads start with "[" or "{"
+ZSTD_HEADER = b"\x01"
+ZSTD_DICT_HEADER = b"\x02"
+DICT_ID_FORMAT = struct.Struct(">I")
+
+_decompressor = zstd.ZstdDecompressor()
+_dict_decompressors: Dict[int, zstd.ZstdDecompressor] = {}
+
+
+class PayloadEncoder:
+    """
+    Encodes JSON payloads of step (logs, interactions) for storage
+    """
+
+    def __init__(
+        self,
+        codec: PayloadCodec,
+        dict_id: Optional[int] = None,
+        dictionary: Optional[zstd.ZstdCompressionDict] = None,
+    ) -> None:
+        self.__codec = codec
+        self.__dict_id = dict_id
+        self.__compressor = zstd.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dictionary)
+
+    def encode(self, payload: str) -> bytes:
+        data = payload.encode()
+        if self.__codec == PayloadCodec.PLAIN or len(data) < MIN_COMPRESS_SIZE:
+            return data
+        if self.__dict_id is not None:
+            return (
+                ZSTD_DICT_HEADER
+                + DICT_ID_FORMAT.pack(self.__dict_id)
+                + self.__compressor.compress(data)
+            )
+        return ZSTD_HEADER + self.__compressor.compress(data)
+
+
+async def load_payload_encoder(db: AsyncSession, plugin: str) -> PayloadEncoder:
+    if step_payload_codec != PayloadCodec.ZSTD_DICT:
+        return PayloadEncoder(step_payload_codec)
+    stmt = (
+        select(models.CodecDictionary)
+        .where(models.CodecDictionary.plugin == plugin)
+        .order_by(models.CodecDictionary.id.desc())
+        .limit(1)
+    )
+    entity = (await db.scalars(stmt)).first()
+    if not entity:
+        return PayloadEncoder(PayloadCodec.ZSTD)
+    return PayloadEncoder(
+        step_payload_codec, entity.id, zstd.ZstdCompressionDict(entity.data)
+    )
+
+
+async def decode_payload(db: AsyncSession, data: bytes) -> str:
+    header = data[:1]
+    if header == ZSTD_HEADER:
+        return _decompressor.decompress(data[1:]).decode()
+    if header == ZSTD_DICT_HEADER:
+        (dict_id,) = DICT_ID_FORMAT.unpack_from(data, 1)
+        decompressor = await get_dict_decompressor(db, dict_id)
+        return decompressor.decompress(data[1 + DICT_ID_FORMAT.size :]).decode()
+    return data.decode()
+
+
+async def get_dict_decompressor(db: AsyncSession, dict_id: int):
+    if dict_id not in _dict_decompressors:
+        entity = await db.get(models.CodecDictionary, dict_id)
+        if not entity:
+            raise RuntimeError(f"Codec dictionary #{dict_id} not found")
+        _dict_decompressors[dict_id] = zstd.ZstdDecompressor(
+            dict_data=zstd.ZstdCompressionDict(entity.data)
+        )
+    return _dict_decompressors[dict_id]
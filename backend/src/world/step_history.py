@@ -0,0 +1,99 @@
+from collections import OrderedDict
+import json
+import os
+from typing import Any, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..utils.json_delta import apply_delta, make_delta
+from .. import models
+from .state_codec import StateDump
+
+keyframe_cache_size = int(os.environ.get("KEYFRAME_CACHE_SIZE", "256"))
+
+
+class KeyframeCache:
+    """
+    LRU of parsed keyframe states, shared by all deltas based on them.
+    Cached documents must be treated as immutable.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self.__max_entries = max_entries
+        self.__docs: OrderedDict[int, Any] = OrderedDict()
+
+    def get(self, step_id: int) -> Optional[Any]:
+        doc = self.__docs.get(step_id)
+        if doc is not None:
+            self.__docs.move_to_end(step_id)
+        return doc
+
+    def put(self, step_id: int, doc: Any):
+        self.__docs[step_id] = doc
+        self.__docs.move_to_end(step_id)
+        while len(self.__docs) > self.__max_entries:
+            self.__docs.popitem(last=False)
+
+
+keyframes = KeyframeCache(keyframe_cache_size)
+
+
+class KeyframeEncoder:
+    """
+    Encodes consecutive states of world as full keyframe every N steps
+    and deltas to last keyframe in between
+    """
+
+    def __init__(self, keyframe_interval: int) -> None:
+        self.__keyframe_interval = keyframe_interval
+        # last written keyframe: step id, state document and dump size
+        self.__keyframe: Optional[Tuple[int, Any, int]] = None
+        self.__steps_since_keyframe = 0
+
+    def encode(self, doc: Any) -> Tuple[str, Optional[int]]:
+        """
+        Returns state dump and id of keyframe it is based on.
+        Caller must report written keyframes via `on_keyframe_written`.
+        """
+        if self.__keyframe and self.__steps_since_keyframe < self.__keyframe_interval:
+            keyframe_id, keyframe_doc, keyframe_size = self.__keyframe
+            delta = json.dumps(make_delta(keyframe_doc, doc), separators=(",", ":"))
+            # state drifted too far from keyframe, start new one
+            if len(delta) < keyframe_size:
+                self.__steps_since_keyframe += 1
+                return delta, keyframe_id
+        return json.dumps(doc, separators=(",", ":")), None
+
+    def on_keyframe_written(self, step_id: int, doc: Any, dump: str):
+        self.__keyframe = (step_id, doc, len(dump))
+        self.__steps_since_keyframe = 1
+        keyframes.put(step_id, doc)
+
+
+async def get_keyframe_doc(
+    db: AsyncSession, step_id: int, world_id: Optional[int] = None
+) -> Any:
+    """
+    World of step, if known, limits lookup to its step partition
+    """
+    doc = keyframes.get(step_id)
+    if doc is None:
+        stmt = select(models.Step.state).where(models.Step.id == step_id)
+        if world_id is not None:
+            stmt = stmt.where(models.Step.world_id == world_id)
+        doc = json.loads((await db.execute(stmt)).scalar_one())
+        keyframes.put(step_id, doc)
+    return doc
+
+
+async def get_step_state(db: AsyncSession, step: models.Step) -> StateDump:
+    """
+    Full state dump of step, reconstructed from keyframe if step holds delta
+    """
+    if step.packed_state is not None:
+        return step.packed_state
+    if step.base_step_id is None:
+        return step.state
+    base = await get_keyframe_doc(db, step.base_step_id, step.world_id)
+    return json.dumps(apply_delta(base, json.loads(step.state)), separators=(",", ":"))
@@ -0,0 +1,44 @@
+"""
+On PostgreSQL step table is list partitioned by world, each world has its own
+partition. History of world is cleared by truncating its partition and deleted
+by dropping it, instead of deleting rows one by one.
+"""
+
+from sqlalchemy import delete, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import models
+
+
+def get_step_partition_name(world_id: int):
+    return f"{models.Step.__tablename__}_w{int(world_id)}"
+
+
+async def is_step_partitioned(db: AsyncSession):
+    conn = await db.connection()
+    return conn.dialect.name == "postgresql"
+
+
+async def create_step_partition(db: AsyncSession, world_id: int):
+    if not await is_step_partitioned(db):
+        return
+    await db.execute(
+        text(
+            f"CREATE TABLE IF NOT EXISTS {get_step_partition_name(world_id)} "
+            f"PARTITION OF {models.Step.__tablename__} FOR VALUES IN ({int(world_id)})"
+        )
+    )
+
+
+async def truncate_step_partition(db: AsyncSession, world_id: int):
+    if not await is_step_partitioned(db):
+        await db.execute(delete(models.Step).where(models.Step.world_id == world_id))
+        return
+    await db.execute(text(f"TRUNCATE {get_step_partition_name(world_id)}"))
+
+
+async def drop_step_partition(db: AsyncSession, world_id: int):
+    if not await is_step_partitioned(db):
+        await db.execute(delete(models.Step).where(models.Step.world_id == world_id))
+        return
+    await db.execute(text(f"DROP TABLE IF EXISTS {get_step_partition_name(world_id)}"))
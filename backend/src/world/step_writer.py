@@ -0,0 +1,267 @@
+import asyncio
+from collections import Counter
+import json
+import logging
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import func, insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..utils.serde import json_pydantic_dump
+from .. import database, models
+from .state_codec import StateDump
+from .world_core import TickResult
+from .step_codec import PayloadEncoder, step_payload_codec
+from .step_history import KeyframeEncoder
+from .world_head import advance_world_head
+from .world_metrics import WorldMetrics
+
+logger = logging.getLogger(__name__)
+
+type StepsFlushedHandler = Callable[[List["FlushedStep"]], None]
+
+
+@dataclass
+class StepWriterConfig:
+    # flush as soon as this many steps are pending, 1 means flush on every tick
+    max_batch_size: int = 50
+    # flush pending steps at most this long after the first of them was queued
+    max_delay_ms: float = 250.0
+    # steps allowed to wait for persistence before the simulation is throttled
+    max_queue_size: int = 1000
+
+
+@dataclass
+class PendingStep:
+    stage_code: str
+    stage_title: str
+    # either serialized state, or state document when keyframes are used
+    state: Optional[StateDump]
+    state_doc: Any
+    actions: str
+    logs: str
+    interactions: str
+    # number of log entries by level and last message, for live notifications
+    log_counts: Dict[str, int]
+    last_log: Optional[str]
+
+
+@dataclass
+class FlushedStep:
+    id: int
+    stage_id: int
+    pending: PendingStep
+
+    def get_state_dump(self) -> StateDump:
+        if self.pending.state is not None:
+            return self.pending.state
+        return json.dumps(self.pending.state_doc, separators=(",", ":"))
+
+
+class StepWriter:
+    """
+    Persists tick results of a single world in batches on a background task,
+    so the simulation keeps ticking while the previous batch is being written.
+    """
+
+    def __init__(
+        self,
+        world_id: int,
+        config: StepWriterConfig,
+        on_flushed: StepsFlushedHandler,
+        stage_id: Optional[int] = None,
+        stage_code: Optional[str] = None,
+        keyframe_interval: Optional[int] = None,
+        payload_encoder: Optional[PayloadEncoder] = None,
+        metrics: Optional[WorldMetrics] = None,
+    ) -> None:
+        self.__world_id = world_id
+        self.__config = config
+        self.__on_flushed = on_flushed
+        self.__stage_id = stage_id
+        self.__stage_code = stage_code
+        self.__keyframe_encoder = (
+            KeyframeEncoder(keyframe_interval) if keyframe_interval else None
+        )
+        self.__payload_encoder = payload_encoder or PayloadEncoder(step_payload_codec)
+        self.__metrics = metrics
+        self.__queue: asyncio.Queue[Optional[PendingStep]] = asyncio.Queue(
+            maxsize=max(config.max_queue_size, 1)
+        )
+        self.__task: Optional[asyncio.Task] = None
+        self.__error: Optional[BaseException] = None
+        self.last_step_id: Optional[int] = None
+
+    def start(self):
+        self.__task = asyncio.create_task(self.__run())
+
+    async def put(self, tick_result: TickResult):
+        self.__raise_if_failed()
+        # serialize immediately, plugins are free to mutate their state on next tick
+        use_keyframes = self.__keyframe_encoder is not None
+        await self.__queue.put(
+            PendingStep(
+                stage_code=tick_result.stage.code,
+                stage_title=tick_result.stage.title,
+                state=None if use_keyframes else self.__get_state_dump(tick_result),
+                state_doc=(
+                    tick_result.state.model_dump(mode="json") if use_keyframes else None
+                ),
+                actions=json_pydantic_dump(tick_result.actions),
+                logs=json_pydantic_dump(tick_result.logs),
+                interactions=json_pydantic_dump(tick_result.interations),
+                log_counts=Counter(entry.level for entry in tick_result.logs),
+                last_log=tick_result.logs[-1].message if tick_result.logs else None,
+            )
+        )
+
+    def __get_state_dump(self, tick_result: TickResult) -> StateDump:
+        if tick_result.state_dump is not None:
+            return tick_result.state_dump
+        return tick_result.state.model_dump_json()
+
+    async def close(self):
+        """
+        Flushes all pending steps and stops the writer
+        """
+        if not self.__task:
+            return
+        if not self.__task.done():
+            await self.__queue.put(None)
+        await self.__task
+        self.__raise_if_failed()
+
+    def __raise_if_failed(self):
+        if self.__error:
+            raise RuntimeError(
+                f"Step writer of world #{self.__world_id} failed"
+            ) from self.__error
+
+    async def __run(self):
+        loop = asyncio.get_running_loop()
+        closing = False
+        try:
+            while not closing:
+                pending = await self.__queue.get()
+                if pending is None:
+                    break
+                batch = [pending]
+                deadline = loop.time() + self.__config.max_delay_ms / 1000
+                while len(batch) < self.__config.max_batch_size:
+                    try:
+                        pending = self.__queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        timeout = deadline - loop.time()
+                        if timeout <= 0:
+                            break
+                        try:
+                            pending = await asyncio.wait_for(
+                                self.__queue.get(), timeout
+                            )
+                        except asyncio.TimeoutError:
+                            break
+                    if pending is None:
+                        closing = True
+                        break
+                    batch.append(pending)
+
+                started_at = loop.time()
+                flushed = await self.__write_batch(batch)
+                if self.__metrics:
+                    self.__metrics.step_flush.observe(loop.time() - started_at)
+                self.last_step_id = flushed[-1].id
+                self.__on_flushed(flushed)
+        except BaseException as e:
+            logger.exception(f"Failed to persist steps of world #{self.__world_id}")
+            self.__error = e
+            # unblock producer waiting for free queue slot
+            while not self.__queue.empty():
+                self.__queue.get_nowait()
+
+    async def __write_batch(self, batch: List[PendingStep]) -> List[FlushedStep]:
+        step_ids: List[int] = []
+        stage_ids: List[int] = []
+        # stage id to ids of steps inserted into it
+        stage_steps: Dict[int, List[int]] = {}
+        async with database.SessionLocal() as db:
+            rows: List[dict] = []
+            for pending in batch:
+                if self.__stage_id is None or self.__stage_code != pending.stage_code:
+                    step_ids += await self.__insert_steps(db, rows, stage_steps)
+                    rows = []
+                    res = await db.execute(
+                        insert(models.Stage).returning(models.Stage.id),
+                        dict(
+                            world_id=self.__world_id,
+                            title=pending.stage_title,
+                            code=pending.stage_code,
+                        ),
+                    )
+                    self.__stage_id = res.scalar_one()
+                    self.__stage_code = pending.stage_code
+                stage_ids.append(self.__stage_id)
+                state, base_step_id = pending.state, None
+                if self.__keyframe_encoder:
+                    state, base_step_id = self.__keyframe_encoder.encode(
+                        pending.state_doc
+                    )
+                packed_state = None
+                if isinstance(state, bytes):
+                    state, packed_state = None, state
+                row = dict(
+                    stage_id=self.__stage_id,
+                    world_id=self.__world_id,
+                    state=state,
+                    packed_state=packed_state,
+                    actions=pending.actions,
+                    logs=self.__payload_encoder.encode(pending.logs),
+                    interactions=self.__payload_encoder.encode(pending.interactions),
+                    base_step_id=base_step_id,
+                )
+                if self.__keyframe_encoder and base_step_id is None:
+                    # following deltas need id of new keyframe
+                    step_ids += await self.__insert_steps(db, rows, stage_steps)
+                    rows = []
+                    keyframe_id = (await self.__insert_steps(db, [row], stage_steps))[0]
+                    step_ids.append(keyframe_id)
+                    self.__keyframe_encoder.on_keyframe_written(
+                        keyframe_id, pending.state_doc, state
+                    )
+                else:
+                    rows.append(row)
+            step_ids += await self.__insert_steps(db, rows, stage_steps)
+            for stage_id, ids in stage_steps.items():
+                await db.execute(
+                    update(models.Stage)
+                    .where(models.Stage.id == stage_id)
+                    .values(
+                        first_step_id=func.coalesce(models.Stage.first_step_id, ids[0]),
+                        last_step_id=ids[-1],
+                        step_count=models.Stage.step_count + len(ids),
+                    )
+                )
+            await advance_world_head(
+                db, self.__world_id, step_ids[-1], stage_ids[-1], len(step_ids)
+            )
+            await db.commit()
+        # ids are in the same order as steps of batch
+        return [
+            FlushedStep(id=step_id, stage_id=stage_id, pending=pending)
+            for step_id, stage_id, pending in zip(step_ids, stage_ids, batch)
+        ]
+
+    async def __insert_steps(
+        self, db: AsyncSession, rows: List[dict], stage_steps: Dict[int, List[int]]
+    ) -> List[int]:
+        if not rows:
+            return []
+        # multi-row INSERT, ids are returned in the same order as rows
+        res = await db.execute(
+            insert(models.Step).returning(models.Step.id, sort_by_parameter_order=True),
+            rows,
+        )
+        ids = list(res.scalars())
+        # rows are flushed on stage change, so all of them belong to one stage
+        stage_steps.setdefault(rows[0]["stage_id"], []).extend(ids)
+        return ids
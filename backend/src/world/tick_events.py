@@ -0,0 +1,91 @@
+import asyncio
+from collections import Counter
+import logging
+from typing import Callable, List, Optional
+
+from .. import dto
+from .plugin_host import PluginHost
+from .step_writer import FlushedStep
+
+logger = logging.getLogger(__name__)
+
+type TickEventHandler = Callable[[dto.WorldTickEventDto], None]
+
+
+class TickEventNotifier:
+    """
+    Turns persisted steps of a running world into tick events.
+    Events are built one at a time, steps flushed meanwhile are merged into next one.
+    """
+
+    def __init__(
+        self,
+        world_id: int,
+        plugin: str,
+        plugin_host: PluginHost,
+        on_tick: TickEventHandler,
+        describe_requested: Callable[[], bool],
+    ) -> None:
+        self.__world_id = world_id
+        self.__plugin = plugin
+        self.__plugin_host = plugin_host
+        self.__on_tick = on_tick
+        self.__describe_requested = describe_requested
+        self.__last_step: Optional[FlushedStep] = None
+        self.__new_steps = 0
+        self.__log_counts: Counter[str] = Counter()
+        self.__last_log: Optional[str] = None
+        self.__is_running = True
+        self.__dirty = False
+        self.__task: Optional[asyncio.Task] = None
+
+    def on_flushed(self, steps: List[FlushedStep]):
+        for step in steps:
+            self.__log_counts.update(step.pending.log_counts)
+            if step.pending.last_log is not None:
+                self.__last_log = step.pending.last_log
+        self.__new_steps += len(steps)
+        self.__last_step = steps[-1]
+        self.__schedule()
+
+    async def close(self):
+        """
+        Notifies that world stopped and waits for pending event
+        """
+        self.__is_running = False
+        self.__schedule()
+        if self.__task:
+            await self.__task
+
+    def __schedule(self):
+        if self.__last_step is None:
+            return
+        self.__dirty = True
+        if not self.__task or self.__task.done():
+            self.__task = asyncio.create_task(self.__run())
+
+    async def __run(self):
+        while self.__dirty:
+            self.__dirty = False
+            step = self.__last_step
+            event = dto.WorldTickEventDto(
+                world_id=self.__world_id,
+                step_id=step.id,
+                stage_id=step.stage_id,
+                stage_code=step.pending.stage_code,
+                new_steps=self.__new_steps,
+                is_running=self.__is_running,
+                log_counts=dict(self.__log_counts),
+                last_log=self.__last_log,
+            )
+            self.__new_steps = 0
+            self.__log_counts.clear()
+            self.__last_log = None
+            try:
+                if self.__describe_requested():
+                    event.describe = await self.__plugin_host.describe_state(
+                        self.__world_id, self.__plugin, step.get_state_dump()
+                    )
+                self.__on_tick(event)
+            except Exception:
+                logger.exception(f"Failed to notify tick of world #{self.__world_id}")
@@ -0,0 +1,90 @@
+"""
+Paces running worlds at their tick rates. Deadlines of all worlds are kept in
+one heap served by a single event loop timer, instead of a timer per world
+per tick.
+"""
+
+import asyncio
+import heapq
+import itertools
+from typing import List, Optional, Tuple
+
+# deadlines this close to timer firing time are due, loop timers fire early
+# by up to clock resolution
+DEADLINE_TOLERANCE = 0.0005
+
+
+class TickScheduler:
+    def __init__(self) -> None:
+        self.__deadlines: List[Tuple[float, int, asyncio.Future]] = []
+        # tie breaker of equal deadlines, futures aren't comparable
+        self.__seq = itertools.count()
+        self.__timer: Optional[asyncio.TimerHandle] = None
+
+    def create_pacer(self, tick_rate: float):
+        return TickPacer(self, tick_rate)
+
+    async def wait_until(self, deadline: float):
+        """
+        Sleeps until `deadline` of event loop clock
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        heapq.heappush(self.__deadlines, (deadline, next(self.__seq), future))
+        self.__arm(loop)
+        await future
+
+    def get_pending(self):
+        return len(self.__deadlines)
+
+    def __arm(self, loop: asyncio.AbstractEventLoop):
+        if not self.__deadlines:
+            return
+        earliest = self.__deadlines[0][0]
+        if self.__timer:
+            if self.__timer.when() <= earliest:
+                return
+            self.__timer.cancel()
+        self.__timer = loop.call_at(earliest, self.__fire, loop)
+
+    def __fire(self, loop: asyncio.AbstractEventLoop):
+        self.__timer = None
+        now = loop.time() + DEADLINE_TOLERANCE
+        while self.__deadlines and self.__deadlines[0][0] <= now:
+            _, _, future = heapq.heappop(self.__deadlines)
+            # waiter may have been cancelled, e.g. on shutdown
+            if not future.done():
+                future.set_result(None)
+        self.__arm(loop)
+
+
+class TickPacer:
+    """
+    Fixed-rate schedule of single world run. Deadlines are not shifted by time
+    spent in ticks, so that time is compensated. Ticks which would start late
+    by whole periods are skipped instead of run in a burst.
+    """
+
+    def __init__(self, scheduler: TickScheduler, tick_rate: float) -> None:
+        self.__scheduler = scheduler
+        self.tick_rate = tick_rate
+        self.__period = 1 / tick_rate
+        self.__next_at: Optional[float] = None
+        self.missed_deadlines = 0
+
+    async def wait(self):
+        """
+        Waits for deadline of next tick, the first one starts immediately
+        """
+        now = asyncio.get_running_loop().time()
+        if self.__next_at is None:
+            self.__next_at = now + self.__period
+            return
+        if now + DEADLINE_TOLERANCE < self.__next_at:
+            await self.__scheduler.wait_until(self.__next_at)
+        elif now > self.__next_at + DEADLINE_TOLERANCE:
+            # late tick starts at once, deadlines it overran are skipped
+            skipped = int((now - self.__next_at) // self.__period)
+            self.missed_deadlines += skipped + 1
+            self.__next_at += skipped * self.__period
+        self.__next_at += self.__period
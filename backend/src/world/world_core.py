@@ -1,12 +1,16 @@
 from abc import abstractmethod
-from dataclasses import dataclass
-from typing import Any, Callable, Dict, List, Optional
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Type
 
 import logging
+import time
 
+import msgpack
 from pydantic import BaseModel
 
-from ..utils.log import recreate_callback_logger
+from ..utils.images import ImageFormat, convert_image
+from .clock import RealClock, WorldClock
+from .plugin_log import PluginLog
 
 logger = logging.getLogger(__name__)
 
@@ -50,9 +54,69 @@ class TickResult[S: BaseModel]:
     interations: List[ClientInteration]
     logs: List[WorldLogEntry]
     actions: List[WorldAction]
+    # encoded frames of new state, rendered on request for live watchers
+    frames: Dict[ImageFormat, bytes] = field(default_factory=dict)
+    # state encoded by plugin, if world stores full states
+    state_dump: Optional[str | bytes] = None
+    # JSON of state, if lockstep bots are waiting for it
+    state_json: Optional[str] = None
+    # seconds spent in phases of tick next to the plugin, see world_metrics
+    timings: Dict[str, float] = field(default_factory=dict)
+    # seconds from submission of each applied action to the end of tick
+    action_latencies: List[float] = field(default_factory=list)
+
+
+@dataclass
+class BotDecision:
+    """
+    Reply of lockstep bot to state of tick, see bot_lockstep
+    """
+
+    bot: str
+    tick: int
+    # None if bot missed the deadline
+    actions: Optional[List[WorldAction]]
+    # seconds from sending state to the reply or deadline
+    latency: float
+
+
+@dataclass
+class AddedActions:
+    accepted: int = 0
+    # same as the last pending action, merged into it
+    coalesced: int = 0
+    # oldest pending actions, dropped when queue was full
+    dropped: int = 0
+
+
+@dataclass
+class PluginSnapshot:
+    """
+    Loadable data of plugin, enough to recreate evicted instance
+    """
+
+    state_dump: Optional[str]
+    stage: WorldStage
+    actions: List[WorldAction]
+    config: Optional[str] = None
 
 
 class AbstractPlugin[S: BaseModel]:
+    # model of state, used by default state serialization
+    state_type: Type[S]
+    # actions waiting for next tick, oldest are dropped above the limit
+    max_pending_actions: int = 256
+    # action repeating the last pending one is redundant, e.g. repeated turn
+    coalesce_actions: bool = False
+    # ticks per second of worlds without own tick rate, free-running if not set
+    default_tick_rate: Optional[float] = None
+    # actions of lockstep bot which missed decision deadline
+    default_bot_actions: List[WorldAction] = []
+    # log entries kept per tick, the oldest ones are overwritten above it
+    log_max_entries: int = 100
+    # every N-th log entry below WARNING is kept
+    log_sample_every: int = 1
+
     def __init__(self) -> None:
         global plugin_instance_id
         plugin_instance_id += 1
@@ -61,21 +125,25 @@ class AbstractPlugin[S: BaseModel]:
         self.__state: Optional[S] = None
         self.__stage: WorldStage = WorldStage(code="initial", title="Initial")
         self.__interations: List[ClientInteration] = []
-        self.__logs: List[WorldLogEntry] = []
         # end: loadable data
         self.actions: List[WorldAction] = []
-        self.logger = recreate_callback_logger(
-            f"{__name__}.plugin[{self.__id}]",
-            lambda level, message: self.__logs.append(
-                WorldLogEntry(level=level, message=message)
-            ),
+        # wall time of submission of each pending action
+        self.__actions_submitted_at: List[float] = []
+        # config of world, as is, set before world is started
+        self.config: Optional[str] = None
+        self.clock: WorldClock = RealClock()
+        # level is set by world on start
+        self.logger = PluginLog(
+            max_entries=self.log_max_entries, sample_every=self.log_sample_every
         )
         logger.info(f"Plugin Created")
 
     async def do_tick(self) -> TickResult:
         # take actions before step
         external_input = ExternalInput(actions=self.actions)
+        submitted_at = self.__actions_submitted_at
         self.actions = []
+        self.__actions_submitted_at = []
         if self.__state == None:
             self.__state = await self.initialize()
 
@@ -84,39 +152,136 @@ class AbstractPlugin[S: BaseModel]:
         )
         # take interactions and logs after step
         interations = self.__interations
-        logs = self.__logs
         self.__interations = []
-        self.__logs = []
+        now = time.time()
         return TickResult(
             state=self.__state,
             stage=self.__stage,
             actions=external_input.actions,
             interations=interations,
-            logs=logs,
+            logs=[
+                WorldLogEntry(level=level, message=message)
+                for level, message in self.logger.take()
+            ],
+            action_latencies=[now - at for at in submitted_at],
         )
 
     def load(self, state: S, stage_code: str, stage_title: str):
         self.__state = state
         self.__stage: WorldStage = WorldStage(code=stage_code, title=stage_title)
         self.__interations = []
-        self.__logs = []
+        self.logger.clear()
+
+    def snapshot(self) -> Optional[PluginSnapshot]:
+        """
+        None, if plugin holds nothing to restore, e.g. it only rendered states
+        """
+        if self.__state is None and not self.actions and self.config is None:
+            return None
+        return PluginSnapshot(
+            state_dump=(
+                self.serialize_state(self.__state) if self.__state is not None else None
+            ),
+            stage=self.__stage,
+            actions=list(self.actions),
+            config=self.config,
+        )
+
+    def restore(self, snapshot: PluginSnapshot):
+        if snapshot.state_dump is not None:
+            self.__state = self.parse_state(snapshot.state_dump)
+        self.__stage = snapshot.stage
+        self.actions = list(snapshot.actions)
+        self.__actions_submitted_at = [time.time()] * len(self.actions)
+        self.config = snapshot.config
+
+    def release(self):
+        """
+        Frees resources of plugin which is not going to be used anymore
+        """
+        self.logger.clear()
 
     def add_interation(self, request: Any, response: Any):
         self.__interations.append(ClientInteration(request=request, response=response))
 
-    def add_action(self, action: WorldAction):
-        logger.info(f"Added action: {action}")
-        self.actions.append(action)
+    def add_bot_decisions(self, decisions: List[BotDecision]):
+        """
+        Queues actions of bots for next tick, each decision is recorded as
+        interaction of the step it is applied in
+        """
+        for decision in decisions:
+            timed_out = decision.actions is None
+            actions = (
+                self.default_bot_actions
+                if decision.actions is None
+                else decision.actions
+            )
+            self.add_actions(actions)
+            self.add_interation(
+                request=dict(bot=decision.bot, tick=decision.tick),
+                response=dict(
+                    actions=[action.name for action in actions],
+                    latencyMs=decision.latency * 1000,
+                    timedOut=timed_out,
+                ),
+            )
+
+    def add_action(self, action: WorldAction, submitted_at: Optional[float] = None):
+        self.add_actions([action], submitted_at)
+
+    def add_actions(
+        self, actions: List[WorldAction], submitted_at: Optional[float] = None
+    ) -> AddedActions:
+        """
+        Queues actions for next tick, `submitted_at` is wall time they were
+        received at, for latency measurement
+        """
+        ret = AddedActions()
+        submitted_at = time.time() if submitted_at is None else submitted_at
+        for action in actions:
+            if self.coalesce_actions and self.actions and self.actions[-1] == action:
+                ret.coalesced += 1
+                continue
+            if len(self.actions) >= self.max_pending_actions:
+                del self.actions[0], self.__actions_submitted_at[0]
+                ret.dropped += 1
+            self.actions.append(action)
+            self.__actions_submitted_at.append(submitted_at)
+            ret.accepted += 1
+        if ret.dropped:
+            logger.warning(f"Dropped {ret.dropped} actions, queue is full")
+        return ret
 
     def set_stage(self, code: str, title: str):
         self.__stage = WorldStage(code=code, title=title)
 
+    def time(self) -> float:
+        return self.clock.time()
+
+    async def sleep(self, seconds: float):
+        """
+        Plugins must sleep through world clock, so world may run in fast-forward
+        """
+        await self.clock.sleep(seconds)
+
     @classmethod
     def define_actions(cls) -> List[WorldActionDef]:
         return []
 
-    @abstractmethod
-    def parse_state(self, state_dump: str) -> S: ...
+    def serialize_state(self, state: S) -> str:
+        return state.model_dump_json()
+
+    def parse_state(self, state_dump: str) -> S:
+        return self.state_type.model_validate_json(state_dump)
+
+    def pack_state(self, state: S) -> bytes:
+        """
+        Binary counterpart of `serialize_state`
+        """
+        return msgpack.packb(state.model_dump(mode="json"))
+
+    def unpack_state(self, data: bytes) -> S:
+        return self.state_type.model_validate(msgpack.unpackb(data))
 
     @abstractmethod
     def describe_state(self, state: S) -> Dict[str, str]: ...
@@ -124,6 +289,15 @@ class AbstractPlugin[S: BaseModel]:
     @abstractmethod
     def render_state(self, state: S) -> bytes: ...
 
+    def render_state_as(self, state: S, image_format: ImageFormat) -> bytes:
+        """
+        Image of state in given format, plugins rendering it directly override
+        this, others are rendered by `render_state` and converted
+        """
+        if image_format == ImageFormat.PNG:
+            return self.render_state(state)
+        return convert_image(self.render_state(state), image_format)
+
     @abstractmethod
     async def initialize(self) -> S:
         """
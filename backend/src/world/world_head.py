@@ -0,0 +1,76 @@
+from typing import Optional
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import models
+from .world_lineage import get_world_lineage, lineage_steps_filter
+
+
+async def get_world_head(db: AsyncSession, world_id: int):
+    stmt = select(models.WorldHead).where(models.WorldHead.world_id == world_id)
+    return (await db.scalars(stmt)).first()
+
+
+async def advance_world_head(
+    db: AsyncSession,
+    world_id: int,
+    last_step_id: int,
+    last_stage_id: int,
+    new_steps: int,
+):
+    """
+    Moves head to newly persisted steps, in transaction which persisted them
+    """
+    res = await db.execute(
+        update(models.WorldHead)
+        .where(models.WorldHead.world_id == world_id)
+        .values(
+            last_step_id=last_step_id,
+            last_stage_id=last_stage_id,
+            step_count=models.WorldHead.step_count + new_steps,
+        )
+    )
+    # head of world without history yet
+    if res.rowcount == 0:
+        await db.execute(
+            insert(models.WorldHead).values(
+                world_id=world_id,
+                last_step_id=last_step_id,
+                last_stage_id=last_stage_id,
+                step_count=new_steps,
+            )
+        )
+
+
+async def refresh_world_head(db: AsyncSession, world_id: int):
+    """
+    Recomputes head from stored steps, after history was rewritten in bulk.
+    Steps inherited by forked world are counted too.
+    """
+    # head is kept, its generation tells clients that steps they hold are gone
+    await db.execute(
+        update(models.WorldHead)
+        .where(models.WorldHead.world_id == world_id)
+        .values(
+            last_step_id=None,
+            last_stage_id=None,
+            step_count=0,
+            history_generation=models.WorldHead.history_generation + 1,
+        )
+    )
+    steps_filter = lineage_steps_filter(await get_world_lineage(db, world_id))
+    last = (
+        await db.execute(
+            select(models.Step.id, models.Step.stage_id)
+            .where(steps_filter)
+            .order_by(models.Step.id.desc())
+            .limit(1)
+        )
+    ).first()
+    if not last:
+        return
+    step_count: Optional[int] = await db.scalar(
+        select(func.count()).select_from(models.Step).where(steps_filter)
+    )
+    await advance_world_head(db, world_id, last.id, last.stage_id, step_count or 0)
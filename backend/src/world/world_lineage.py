@@ -0,0 +1,91 @@
+"""
+Forked world shares history of its parent up to the step it was forked from,
+nothing is copied. History of world is described by its lineage: step
+partitions of the world and its ancestors, each limited by the last step
+inherited from it. Step ids grow across all worlds, so own steps of world
+always follow inherited ones.
+"""
+
+from dataclasses import dataclass
+from typing import List, Optional
+
+from sqlalchemy import ColumnElement, and_, exists, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import models
+
+
+@dataclass
+class LineageSegment:
+    world_id: int
+    # last inherited step of world, not limited for world itself
+    last_step_id: Optional[int] = None
+
+
+async def get_world_lineage(db: AsyncSession, world_id: int) -> List[LineageSegment]:
+    """
+    Segments of world history, from root ancestor to world itself
+    """
+    ret = [LineageSegment(world_id)]
+    world = await db.get(models.World, world_id)
+    while world and world.parent_world_id is not None:
+        # ancestor steps after fork of its own descendant are not inherited
+        last_step_id = world.fork_step_id
+        if ret[-1].last_step_id is not None:
+            last_step_id = min(last_step_id, ret[-1].last_step_id)
+        ret.append(LineageSegment(world.parent_world_id, last_step_id))
+        world = await db.get(models.World, world.parent_world_id)
+    ret.reverse()
+    return ret
+
+
+def trim_lineage(lineage: List[LineageSegment], since_step_id: int):
+    """
+    Segments with steps after `since_step_id`, others needn't be queried
+    """
+    return [
+        segment
+        for segment in lineage
+        if segment.last_step_id is None or segment.last_step_id > since_step_id
+    ]
+
+
+def lineage_steps_filter(lineage: List[LineageSegment]) -> ColumnElement[bool]:
+    # each arm names its world, so only partitions of lineage are scanned
+    return or_(
+        *(
+            (
+                models.Step.world_id == segment.world_id
+                if segment.last_step_id is None
+                else and_(
+                    models.Step.world_id == segment.world_id,
+                    models.Step.id <= segment.last_step_id,
+                )
+            )
+            for segment in lineage
+        )
+    )
+
+
+def lineage_stages_filter(lineage: List[LineageSegment]) -> ColumnElement[bool]:
+    return or_(
+        *(
+            (
+                models.Stage.world_id == segment.world_id
+                if segment.last_step_id is None
+                else and_(
+                    models.Stage.world_id == segment.world_id,
+                    models.Stage.first_step_id <= segment.last_step_id,
+                )
+            )
+            for segment in lineage
+        )
+    )
+
+
+async def has_forks(db: AsyncSession, world_id: int) -> bool:
+    return bool(
+        await db.scalar(
+            select(exists().where(models.World.parent_world_id == world_id))
+        )
+    )
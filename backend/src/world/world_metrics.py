@@ -0,0 +1,75 @@
+from typing import Dict, List
+
+from ..utils.metrics import Histogram, HistogramChild
+
+TICK_PHASES = (
+    # plugin code computing new state
+    "plugin_step",
+    # encoding of state and rendering of live frames, next to the plugin
+    "encode",
+    "render",
+    # whole plugin host call, includes worker IPC if there are workers
+    "host",
+    # serialization of step and waiting for free slot in writer queue
+    "persist",
+    # fan-out of live frames to websocket subscribers
+    "frames",
+    # waiting for deadline of tick, paced worlds only
+    "wait",
+    # waiting for decisions of lockstep bots, see bot_lockstep
+    "bots",
+)
+
+tick_phase_seconds = Histogram(
+    "world_tick_phase_seconds",
+    "Time spent in phase of world tick",
+    ["world", "plugin", "phase"],
+)
+step_flush_seconds = Histogram(
+    "world_step_flush_seconds",
+    "Time to write and commit batch of steps",
+    ["world", "plugin"],
+)
+plugin_call_seconds = Histogram(
+    "world_plugin_call_seconds",
+    "Time of render and describe calls to plugin host",
+    ["world", "plugin", "call"],
+)
+
+action_latency_seconds = Histogram(
+    "world_action_latency_seconds",
+    "Time from submission of action to the end of tick which applied it",
+    ["world", "plugin"],
+)
+
+
+class WorldMetrics:
+    """
+    Histograms of single world, bound to its labels once per run
+    """
+
+    def __init__(self, world_id: int, plugin: str) -> None:
+        self.phases: Dict[str, HistogramChild] = {
+            phase: tick_phase_seconds.labels(world_id, plugin, phase)
+            for phase in TICK_PHASES
+        }
+        self.step_flush = step_flush_seconds.labels(world_id, plugin)
+        self.action_latency = action_latency_seconds.labels(world_id, plugin)
+
+    def observe_timings(self, timings: Dict[str, float]):
+        for phase, seconds in timings.items():
+            self.phases[phase].observe(seconds)
+
+    def observe_action_latencies(self, latencies: List[float]):
+        for seconds in latencies:
+            self.action_latency.observe(seconds)
+
+
+def remove_world_metrics(world_id: int):
+    for histogram in (
+        tick_phase_seconds,
+        step_flush_seconds,
+        plugin_call_seconds,
+        action_latency_seconds,
+    ):
+        histogram.remove(world=world_id)
@@ -1,181 +1,520 @@
+import asyncio
+from dataclasses import asdict, dataclass, field
 import logging
-from typing import Any, Callable, Dict, List, Optional, Set
+import time
+from typing import (
+    Any,
+    Callable,
+    ContextManager,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Set,
+)
 from sqlalchemy import func, select, delete
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 
-from ..utils.serde import json_pydantic_dump
-
-from ..plugins import PLUGINS
+from ..plugins import get_plugin_class
 
 from ..utils.collections import set_attrs_from_dict
-from .. import models, dto
-from .world_core import AbstractPlugin, WorldAction
+from ..utils.images import ImageFormat
+from .. import database, models, dto
+from .world_core import AddedActions, TickResult, WorldAction
+from .bot_lockstep import BotConnection, BotLobby, bot_decision_deadline_ms
+from .plugin_host import PluginHost, create_plugin_host
+from .plugin_log import LogLevel, plugin_log_level
+from .frame_cache import FrameCache, frame_cache_max_bytes
+from .step_history import get_step_state
+from .step_codec import decode_payload, load_payload_encoder
+from .state_codec import StateCodec, get_world_state_codec
+from .step_writer import StepWriter, StepWriterConfig
+from .tick_events import TickEventHandler, TickEventNotifier
+from .tick_scheduler import TickScheduler
+from .step_partitions import (
+    create_step_partition,
+    drop_step_partition,
+    truncate_step_partition,
+)
+from .world_head import advance_world_head, get_world_head, refresh_world_head
+from .world_lineage import (
+    LineageSegment,
+    get_world_lineage,
+    has_forks,
+    lineage_stages_filter,
+    lineage_steps_filter,
+    trim_lineage,
+)
+from .world_metrics import WorldMetrics, plugin_call_seconds, remove_world_metrics
 
 logger = logging.getLogger(__name__)
 
 WORLD_SERIVCE_NAME = "world_service"
 
-type StepChangedHandler = Callable[[], None]
-
-
-class WorldService:
-    def __init__(self) -> None:
-        self.__pluguns: Dict[int, AbstractPlugin] = {}
+type FrameHandler = Callable[[ImageFormat, bytes], None]
+
+# steps returned by single status request
+MAX_STATUS_STEPS = 10000
+
+
+@dataclass
+class WorldRunStats:
+    window_started_at: float
+    ticks: int = 0
+    window_ticks: int = 0
+    ticks_per_second: Optional[float] = None
+    # pacing of world, free-running if not set
+    target_ticks_per_second: Optional[float] = None
+    missed_deadlines: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+
+    def add_tick(self):
+        self.ticks += 1
+        self.window_ticks += 1
+        now = time.perf_counter()
+        elapsed = now - self.window_started_at
+        if elapsed >= 1.0:
+            self.ticks_per_second = self.window_ticks / elapsed
+            self.window_started_at = now
+            self.window_ticks = 0
+
+    def finish(self):
+        """
+        Rate of whole run, so that runs shorter than a window report it too
+        """
+        elapsed = time.perf_counter() - self.started_at
+        if elapsed > 0:
+            self.ticks_per_second = self.ticks / elapsed
+
+
+class WorldService(ContextManager):
+    def __init__(self, plugin_host: Optional[PluginHost] = None) -> None:
+        self.__plugin_host = plugin_host or create_plugin_host()
         self.__running_worlds: Set[int] = set()
+        self.__run_stats: Dict[int, WorldRunStats] = {}
+        self.__tick_scheduler = TickScheduler()
+        self.__frame_cache = FrameCache(frame_cache_max_bytes)
+        self.__bot_lobbies: Dict[int, BotLobby] = {}
 
-    def get_world_plugin(self, world: models.World) -> AbstractPlugin:
-        world_id = world.id
-        if world_id not in self.__pluguns:
-            plugin = str(world.plugin)
-            if not plugin in PLUGINS:
-                raise RuntimeError(f"Plugin {plugin} not defined")
-            clazz = PLUGINS[plugin]()
-            self.__pluguns[world_id] = clazz()
-
-        return self.__pluguns[world_id]
+    def __exit__(self, exc_type, exc_value, traceback):
+        logger.info("WorldService: exiting")
+        self.__running_worlds.clear()
+        self.__plugin_host.close()
 
     def is_world_initialized(self, entity_id: int):
-        return entity_id in self.__pluguns
+        return self.__plugin_host.is_loaded(entity_id)
 
     def is_world_running(self, entity_id: int):
         return entity_id in self.__running_worlds
 
-    def render_step_state(self, db: Session, entity_id: int):
-        step = get_step(db, entity_id)
+    def get_ticks_per_second(self, entity_id: int) -> Optional[float]:
+        stats = self.__run_stats.get(entity_id)
+        return stats.ticks_per_second if stats else None
+
+    def get_run_stats(self, entity_id: int) -> Optional[WorldRunStats]:
+        return self.__run_stats.get(entity_id)
+
+    def get_run_ticks(self, entity_id: int) -> int:
+        """
+        Ticks of world since it was started last time
+        """
+        stats = self.__run_stats.get(entity_id)
+        return stats.ticks if stats else 0
+
+    async def render_step_state(
+        self, entity_id: int, image_format: ImageFormat = ImageFormat.PNG
+    ) -> bytes:
+        # steps are immutable, so rendered frame never goes stale
+        return await self.__frame_cache.get_or_render(
+            (entity_id, image_format),
+            lambda: self.__render_step_state(entity_id, image_format),
+        )
+
+    async def __render_step_state(self, entity_id: int, image_format: ImageFormat):
+        # own session, shared render may outlive request which started it
+        async with database.SessionLocal() as db:
+            step = await get_step(db, entity_id)
+            state_dump = await get_step_state(db, step)
         world = step.stage.world
-        plugin = self.get_world_plugin(world)
-        state = plugin.parse_state(step.state)
-        return plugin.render_state(state)
+        with plugin_call_seconds.labels(world.id, world.plugin, "render").time():
+            return await self.__plugin_host.render_state(
+                world.id, world.plugin, state_dump, image_format
+            )
+
+    def get_frame_cache_stats(self):
+        cache = self.__frame_cache
+        return dto.FrameCacheStatsDto(
+            hits=cache.stats.hits,
+            misses=cache.stats.misses,
+            collapsed=cache.stats.collapsed,
+            evictions=cache.stats.evictions,
+            entries=len(cache),
+            size_bytes=cache.size_bytes,
+            max_bytes=cache.max_bytes,
+        )
 
-    def describe_step_state(self, db: Session, entity_id: int):
-        step = get_step(db, entity_id)
+    async def get_plugin_stats(self):
+        stats = await self.__plugin_host.get_stats()
+        return dto.PluginStatsDto(**asdict(stats))
+
+    async def describe_step_state(self, db: AsyncSession, entity_id: int):
+        step = await get_step(db, entity_id)
         world = step.stage.world
-        plugin = self.get_world_plugin(world)
-        state = plugin.parse_state(step.state)
-        return plugin.describe_state(state)
-
-    def get_world_actions(self, db: Session, world_id: int):
-        world = get_world(db, world_id)
-        plugin = self.get_world_plugin(world)
-        return plugin.define_actions()
-
-    def add_world_action(self, db: Session, world_id: int, action: WorldAction):
-        world = get_world(db, world_id)
-        plugin = self.get_world_plugin(world)
-        plugin.add_action(action)
-
-    def get_world_status(self, db: Session, world_id: int):
-        stmt = (
-            select(models.Step.id, models.Step.stage_id)
-            .select_from(models.Step)
-            .join(models.Stage)
-            .where(models.Stage.world_id == world_id)
-            .order_by(models.Step.id)
+        state_dump = await get_step_state(db, step)
+        with plugin_call_seconds.labels(world.id, world.plugin, "describe").time():
+            return await self.__plugin_host.describe_state(
+                world.id, world.plugin, state_dump
+            )
+
+    async def get_step_dto(self, db: AsyncSession, entity_id: int):
+        step = await get_step(db, entity_id)
+        state = await get_step_state(db, step)
+        if isinstance(state, bytes):
+            # binary state is converted to JSON by plugin which packed it
+            world = step.stage.world
+            state = await self.__plugin_host.serialize_state(
+                world.id, world.plugin, state
+            )
+        return dto.StepDto(
+            stage_id=step.stage_id,
+            state=state,
+            actions=step.actions,
+            logs=await decode_payload(db, step.logs),
+            interactions=await decode_payload(db, step.interactions),
+        )
+
+    async def get_world_actions(self, db: AsyncSession, world_id: int):
+        world = await get_world(db, world_id)
+        return get_plugin_class(world.plugin).define_actions()
+
+    async def add_world_action(
+        self, db: AsyncSession, world_id: int, action: WorldAction
+    ):
+        world = await get_world(db, world_id)
+        await self.submit_world_actions(world.id, world.plugin, [action])
+
+    async def submit_world_actions(
+        self,
+        world_id: int,
+        plugin: str,
+        actions: List[WorldAction],
+        submitted_at: Optional[float] = None,
+    ) -> AddedActions:
+        """
+        Queues actions for next tick of world, nothing is read from database.
+        `submitted_at` is wall time actions were received at.
+        """
+        return await self.__plugin_host.add_actions(
+            world_id,
+            plugin,
+            actions,
+            time.time() if submitted_at is None else submitted_at,
         )
-        res = db.execute(stmt).all()
+
+    async def get_world_status(
+        self,
+        db: AsyncSession,
+        world_id: int,
+        since_step_id: Optional[int] = None,
+        limit: int = MAX_STATUS_STEPS,
+    ):
+        """
+        Steps after `since_step_id` cursor and summaries of stages they belong to,
+        inherited ones included for forked world.
+        Nothing but world head is read, if there are no new steps.
+        """
+        since_step_id = since_step_id or 0
+        head = await get_world_head(db, world_id)
+        stats = self.__run_stats.get(world_id)
+        stages: List[dto.WorldStatusStageDto] = []
         steps: List[dto.WorldStatusStepDto] = []
-        for row in res:
-            step_id, stage_id = row.tuple()
-            steps.append(dto.WorldStatusStepDto(id=step_id, stage_id=stage_id))
+        if head and head.last_step_id is not None and head.last_step_id > since_step_id:
+            lineage = trim_lineage(await get_world_lineage(db, world_id), since_step_id)
+            stages = await self.__get_status_stages(db, lineage, since_step_id)
+            stmt = (
+                select(models.Step.id, models.Step.stage_id)
+                .where(lineage_steps_filter(lineage), models.Step.id > since_step_id)
+                .order_by(models.Step.id)
+                .limit(limit + 1)
+            )
+            for step_id, stage_id in (await db.execute(stmt)).tuples():
+                steps.append(dto.WorldStatusStepDto(id=step_id, stage_id=stage_id))
 
         return dto.WorldStatusDto(
-            steps=steps,
+            steps=steps[:limit],
+            has_more=len(steps) > limit,
+            stages=stages,
+            last_step_id=head.last_step_id if head else None,
+            step_count=head.step_count if head else 0,
+            history_generation=head.history_generation if head else 0,
             is_running=self.is_world_running(world_id),
+            ticks_per_second=self.get_ticks_per_second(world_id),
+            target_ticks_per_second=stats.target_ticks_per_second if stats else None,
+            missed_deadlines=stats.missed_deadlines if stats else 0,
         )
 
+    async def __get_status_stages(
+        self, db: AsyncSession, lineage: List[LineageSegment], since_step_id: int
+    ):
+        last_step_ids = {segment.world_id: segment.last_step_id for segment in lineage}
+        stages = (
+            await db.scalars(
+                select(models.Stage)
+                .where(
+                    lineage_stages_filter(lineage),
+                    models.Stage.last_step_id > since_step_id,
+                )
+                .order_by(models.Stage.id)
+            )
+        ).all()
+        ret: List[dto.WorldStatusStageDto] = []
+        for stage in stages:
+            last_step_id, step_count = stage.last_step_id, stage.step_count
+            inherited_step_id = last_step_ids[stage.world_id]
+            # stage of fork step continued in parent after fork
+            if inherited_step_id is not None and last_step_id > inherited_step_id:
+                last_step_id = inherited_step_id
+                step_count = await db.scalar(
+                    select(func.count())
+                    .select_from(models.Step)
+                    .where(
+                        models.Step.world_id == stage.world_id,
+                        models.Step.stage_id == stage.id,
+                        models.Step.id <= inherited_step_id,
+                    )
+                )
+                if last_step_id <= since_step_id:
+                    continue
+            ret.append(
+                dto.WorldStatusStageDto(
+                    id=stage.id,
+                    first_step_id=stage.first_step_id,
+                    last_step_id=last_step_id,
+                    step_count=step_count,
+                )
+            )
+        return ret
+
     async def world_control_start(
         self,
-        db: Session,
         world_id: int,
-        on_step_change: StepChangedHandler,
+        on_step_change: TickEventHandler,
         from_step_id: Optional[int] = None,
         max_steps: Optional[int] = None,
+        writer_config: Optional[StepWriterConfig] = None,
+        headless: bool = False,
+        persist_every: int = 1,
+        describe_requested: Callable[[], bool] = lambda: False,
+        frame_formats: Callable[[], Sequence[ImageFormat]] = lambda: (),
+        on_frame: Optional[FrameHandler] = None,
+        tick_rate: Optional[float] = None,
+        bot_deadline_ms: Optional[float] = None,
     ):
+        """
+        Runs world at `tick_rate`, world or plugin default one if not set.
+        Headless world runs as fast as possible. While lockstep bots are
+        connected, each tick waits for their decisions up to `bot_deadline_ms`.
+        """
         if self.is_world_running(world_id):
             logger.warning("World already running")
             return
 
-        world = get_world(db, world_id)
-        plugin = self.get_world_plugin(world)
-
-        # if step not specified, find last step
-        stage: Optional[models.Stage] = None
-        if not from_step_id:
-            from_step_id = self.__get_last_step_id(db=db, world_id=world_id)
-        if from_step_id:
-            step = get_step(db, from_step_id)
-            stage = step.stage
-            plugin.load(
-                state=plugin.parse_state(step.state),
-                stage_code=stage.code,
-                stage_title=stage.title,
+        # mark as running before first await, so concurrent starts are rejected
+        self.__set_running(world_id, True)
+        try:
+            # dedicated session, request-scoped one is closed before world stops
+            async with database.SessionLocal() as db:
+                world = await get_world(db, world_id)
+
+                # if step not specified, find last step
+                stage: Optional[models.Stage] = None
+                step: Optional[models.Step] = None
+                state_dump: Optional[str] = None
+                if not from_step_id:
+                    from_step_id = await self.__get_last_step_id(
+                        db=db, world_id=world_id
+                    )
+                if from_step_id:
+                    step = await get_step(db, from_step_id)
+                    stage = step.stage
+                    state_dump = await get_step_state(db, step)
+                payload_encoder = await load_payload_encoder(db, world.plugin)
+
+            await self.__plugin_host.start(
+                world.id,
+                world.plugin,
+                state_dump=state_dump,
+                stage_code=stage.code if stage else None,
+                stage_title=stage.title if stage else None,
+                headless=headless,
+                config=world.config,
+                log_level=get_world_log_level(world),
             )
-            logger.info("Plugin loaded from history")
-        else:
-            logger.info("Plugin started from scratch")
+            if step:
+                logger.info("Plugin loaded from history")
+            else:
+                logger.info("Plugin started from scratch")
 
-        n = 0
-        logger.info(f"World started {max_steps = }")
-        try:
-            self.__set_running(world_id, True)
-            while self.is_world_running(world_id) and (
-                max_steps == None or n < max_steps
-            ):
-                n += 1
-                stage = await self.do_tick(
-                    db=db, world=world, plugin=plugin, stage=stage
+            metrics = WorldMetrics(world.id, world.plugin)
+            notifier = TickEventNotifier(
+                world_id=world.id,
+                plugin=world.plugin,
+                plugin_host=self.__plugin_host,
+                on_tick=on_step_change,
+                describe_requested=describe_requested,
+            )
+            writer = StepWriter(
+                world_id=world_id,
+                config=writer_config or StepWriterConfig(),
+                on_flushed=notifier.on_flushed,
+                # stage inherited from parent world is continued by a new one
+                stage_id=stage.id if stage and stage.world_id == world_id else None,
+                stage_code=stage.code if stage else None,
+                keyframe_interval=world.keyframe_interval,
+                payload_encoder=payload_encoder,
+                metrics=metrics,
+            )
+            writer.start()
+
+            tick_rate = tick_rate or get_world_tick_rate(world)
+            pacer = (
+                self.__tick_scheduler.create_pacer(tick_rate)
+                if tick_rate and not headless
+                else None
+            )
+            stats = WorldRunStats(
+                window_started_at=time.perf_counter(),
+                target_ticks_per_second=pacer.tick_rate if pacer else None,
+            )
+            self.__run_stats[world_id] = stats
+            wait_seconds = metrics.phases["wait"]
+            state_codec = get_world_state_codec(world)
+            # last tick is always persisted, so world can be resumed from it
+            unpersisted: Optional[TickResult] = None
+            n = 0
+            logger.info(
+                f"World started {max_steps = } {headless = } {persist_every = } "
+                f"{tick_rate = }"
+            )
+            try:
+                while self.is_world_running(world_id) and (
+                    max_steps == None or n < max_steps
+                ):
+                    if pacer:
+                        wait_started_at = time.perf_counter()
+                        await pacer.wait()
+                        wait_seconds.observe(time.perf_counter() - wait_started_at)
+                        stats.missed_deadlines = pacer.missed_deadlines
+                        # stopped while waiting for deadline
+                        if not self.is_world_running(world_id):
+                            break
+                    n += 1
+                    unpersisted = await self.do_tick(
+                        world=world,
+                        writer=writer,
+                        persist=n % persist_every == 0,
+                        frame_formats=frame_formats(),
+                        on_frame=on_frame,
+                        state_codec=state_codec,
+                        metrics=metrics,
+                        bot_deadline_ms=bot_deadline_ms or bot_decision_deadline_ms,
+                    )
+                    stats.add_tick()
+                    # fast plugins may never yield, keep API and writer responsive
+                    await asyncio.sleep(0)
+                    # logger.info(f"World tick {n}")
+                if unpersisted:
+                    await writer.put(unpersisted)
+            finally:
+                try:
+                    await writer.close()
+                finally:
+                    await notifier.close()
+                stats.finish()
+                logger.info(
+                    f"World stopped after {n} ticks, {stats.ticks_per_second = }"
                 )
-                on_step_change()
-                # logger.info(f"World tick {n}")
         finally:
             self.__set_running(world_id, False)
+            try:
+                await self.__plugin_host.stop(world_id)
+            except Exception:
+                logger.exception(f"Failed to release plugin of world #{world_id}")
 
     async def do_tick(
         self,
-        db: Session,
         world: models.World,
-        stage: Optional[models.Stage],
-        plugin: AbstractPlugin,
-    ) -> models.Stage:
-        tick_result = await plugin.do_tick()
-
-        if not stage or stage.code != tick_result.stage.code:
-            stage = models.Stage(
-                world_id=world.id,
-                title=tick_result.stage.title,
-                code=tick_result.stage.code,
-            )
-            db.add(stage)
-            db.commit()
-            db.refresh(stage)
-
-        step = models.Step(
-            stage_id=stage.id,
-            state=json_pydantic_dump(tick_result.state),
-            actions=json_pydantic_dump(tick_result.actions),
-            logs=json_pydantic_dump(tick_result.logs),
-            interactions=json_pydantic_dump(tick_result.interations),
+        writer: StepWriter,
+        persist: bool = True,
+        frame_formats: Sequence[ImageFormat] = (),
+        on_frame: Optional[FrameHandler] = None,
+        state_codec: Optional[StateCodec] = None,
+        metrics: Optional[WorldMetrics] = None,
+        bot_deadline_ms: float = bot_decision_deadline_ms,
+    ) -> Optional[TickResult]:
+        """
+        Returns tick result, if it was not persisted.
+        New state is rendered once in each of `frame_formats` for `on_frame`.
+        Decisions of lockstep bots on new state are queued for the next tick.
+        """
+        started_at = time.perf_counter()
+        bot_lobby = self.__bot_lobbies.get(world.id)
+        tick_result = await self.__plugin_host.do_tick(
+            world.id,
+            world.plugin,
+            frame_formats,
+            state_codec,
+            state_json=bot_lobby is not None,
         )
-        db.add(step)
-        db.commit()
-
-        return stage
+        timings = tick_result.timings
+        host_done_at = time.perf_counter()
+        timings["host"] = host_done_at - started_at
+        if on_frame and tick_result.frames:
+            for image_format, frame in tick_result.frames.items():
+                on_frame(image_format, frame)
+            timings["frames"] = time.perf_counter() - host_done_at
+        if persist:
+            persist_started_at = time.perf_counter()
+            # persistence happens in background, blocks only when writer falls behind
+            await writer.put(tick_result)
+            timings["persist"] = time.perf_counter() - persist_started_at
+        if bot_lobby and tick_result.state_json is not None:
+            bots_started_at = time.perf_counter()
+            decisions = await bot_lobby.decide(tick_result.state_json, bot_deadline_ms)
+            await self.__plugin_host.add_bot_decisions(
+                world.id, world.plugin, decisions
+            )
+            timings["bots"] = time.perf_counter() - bots_started_at
+        if metrics:
+            metrics.observe_timings(timings)
+            if tick_result.action_latencies:
+                metrics.observe_action_latencies(tick_result.action_latencies)
+        return None if persist else tick_result
+
+    async def connect_bot(self, world_id: int, bot: BotConnection):
+        """
+        Keeps bot in lockstep with world until it disconnects
+        """
+        bot_lobby = self.__bot_lobbies.setdefault(world_id, BotLobby())
+        bot_lobby.add(bot)
+        logger.info(f"Bot {bot.name} joined world #{world_id}")
+        try:
+            await bot.run()
+        finally:
+            bot_lobby.remove(bot)
+            if bot_lobby.is_empty() and self.__bot_lobbies.get(world_id) is bot_lobby:
+                del self.__bot_lobbies[world_id]
+            logger.info(f"Bot {bot.name} left world #{world_id}")
 
-    def world_control_stop(self, db: Session, world_id: int):
+    def world_control_stop(self, world_id: int):
         self.__set_running(world_id, False)
 
-    def __get_last_step_id(self, db: Session, world_id: int) -> Optional[int]:
-        # looking for step with highest id
-        stmt = (
-            select(func.max(models.Step.id))
-            .select_from(models.Step)
-            .join(models.Stage)
-            .where(models.Stage.world_id == world_id)
-        )
-        res = db.execute(stmt).first()
-        if res and res[0]:
-            return res[0]
-        return None
+    async def __get_last_step_id(
+        self, db: AsyncSession, world_id: int
+    ) -> Optional[int]:
+        head = await get_world_head(db, world_id)
+        return head.last_step_id if head else None
 
     def __set_running(self, world_id: int, running: bool):
         if running:
@@ -184,68 +523,171 @@ class WorldService:
             self.__running_worlds.remove(world_id)
 
 
-def get_world(db: Session, entity_id: int):
-    ret = db.query(models.World).filter(models.World.id == entity_id).first()
+async def get_world(db: AsyncSession, entity_id: int):
+    ret = await db.get(models.World, entity_id)
     if not ret:
         raise RuntimeError(f"World #{entity_id} not found")
     return ret
 
 
-def get_worlds(db: Session, offset: int = 0, limit: int = 100):
-    return db.query(models.World).offset(offset).limit(limit).all()
+async def get_worlds(db: AsyncSession, offset: int = 0, limit: int = 100):
+    stmt = select(models.World).offset(offset).limit(limit)
+    return (await db.scalars(stmt)).all()
+
+
+async def get_worlds_with_heads(db: AsyncSession, offset: int = 0, limit: int = 100):
+    """
+    Worlds with their heads, head is None for worlds without history
+    """
+    stmt = (
+        select(models.World, models.WorldHead)
+        .outerjoin(models.WorldHead, models.WorldHead.world_id == models.World.id)
+        .order_by(models.World.id)
+        .offset(offset)
+        .limit(limit)
+    )
+    return (await db.execute(stmt)).tuples().all()
 
 
-def get_world_stages(db: Session, entity_id: int):
-    # world = get_world(db, entity_id)
-    # return get_world(db, entity_id).stages
-    return (
-        db.query(models.Stage)
-        .where(models.Stage.world_id == entity_id)
+async def get_world_stages(db: AsyncSession, entity_id: int):
+    lineage = await get_world_lineage(db, entity_id)
+    stmt = (
+        select(models.Stage)
+        .where(lineage_stages_filter(lineage))
         .order_by(models.Stage.id.desc())
-        .all()
     )
+    return (await db.scalars(stmt)).all()
 
 
-def create_world(db: Session, world: dto.WorldCreateDto):
+async def create_world(db: AsyncSession, world: dto.WorldCreateDto):
     entity = models.World(**world.model_dump(by_alias=False))
     db.add(entity)
-    db.commit()
-    db.refresh(entity)
+    await db.flush()
+    await create_step_partition(db, entity.id)
+    await db.commit()
+    await db.refresh(entity)
     return entity
 
 
-def update_world(db: Session, entity_id: int, world: dto.WorldUpdateDto):
-    entity = get_world(db, entity_id)
-    set_attrs_from_dict(world.model_dump(by_alias=False), entity)
-    db.commit()
-    db.refresh(entity)
+async def fork_world(
+    db: AsyncSession, entity_id: int, from_step_id: Optional[int] = None
+):
+    """
+    Creates world sharing history of given one up to `from_step_id`, its latest
+    step by default. No steps are copied.
+    """
+    parent = await get_world(db, entity_id)
+    head = await get_world_head(db, entity_id)
+    if from_step_id is None:
+        from_step_id = head.last_step_id if head else None
+        if from_step_id is None:
+            raise RuntimeError(f"World #{entity_id} has no history to fork")
+    lineage = await get_world_lineage(db, entity_id)
+    fork_step = (
+        await db.execute(
+            select(models.Step.id, models.Step.stage_id).where(
+                lineage_steps_filter(lineage), models.Step.id == from_step_id
+            )
+        )
+    ).first()
+    if not fork_step:
+        raise RuntimeError(
+            f"Step #{from_step_id} is not in history of world #{entity_id}"
+        )
+
+    if head and head.last_step_id == from_step_id:
+        step_count = head.step_count
+    else:
+        # index-only count of inherited steps, rows are not touched
+        step_count = await db.scalar(
+            select(func.count())
+            .select_from(models.Step)
+            .where(lineage_steps_filter(lineage), models.Step.id <= from_step_id)
+        )
+    entity = models.World(
+        title=f"{parent.title} (fork of #{from_step_id})",
+        plugin=parent.plugin,
+        config=parent.config,
+        keyframe_interval=parent.keyframe_interval,
+        state_codec=parent.state_codec,
+        parent_world_id=parent.id,
+        fork_step_id=from_step_id,
+    )
+    db.add(entity)
+    await db.flush()
+    await create_step_partition(db, entity.id)
+    await advance_world_head(
+        db, entity.id, fork_step.id, fork_step.stage_id, step_count or 0
+    )
+    await db.commit()
+    await db.refresh(entity)
     return entity
 
 
-def delete_world(db: Session, entity_id: int):
-    entity = get_world(db, entity_id)
-    db.delete(entity)
-    db.commit()
+async def update_world(db: AsyncSession, entity_id: int, world: dto.WorldUpdateDto):
+    entity = await get_world(db, entity_id)
+    set_attrs_from_dict(world.model_dump(by_alias=False, exclude_unset=True), entity)
+    await db.commit()
+    await db.refresh(entity)
     return entity
 
 
-def clear_world(db: Session, entity_id: int):
-    entity = get_world(db, entity_id)
+async def delete_world(db: AsyncSession, entity_id: int):
+    entity = await get_world(db, entity_id)
+    if await has_forks(db, entity_id):
+        raise RuntimeError(f"World #{entity_id} has forks, delete them first")
+    await drop_step_partition(db, entity_id)
+    await db.execute(delete(models.Stage).where(models.Stage.world_id == entity_id))
+    await db.execute(
+        delete(models.WorldHead).where(models.WorldHead.world_id == entity_id)
+    )
+    # bulk statement, ORM delete would lazy-load stages collection
+    await db.execute(delete(models.World).where(models.World.id == entity_id))
+    await db.commit()
+    remove_world_metrics(entity_id)
+    return entity
+
 
-    stages = db.query(models.Stage).where(models.Stage.world_id == entity_id).all()
-    for stage in stages:
-        db.execute(delete(models.Step).where(models.Step.stage_id == stage.id))
-        db.delete(stage)
-    db.commit()
+async def clear_world(db: AsyncSession, entity_id: int):
+    entity = await get_world(db, entity_id)
+    if await has_forks(db, entity_id):
+        raise RuntimeError(f"World #{entity_id} has forks sharing its history")
+
+    await truncate_step_partition(db, entity_id)
+    await db.execute(delete(models.Stage).where(models.Stage.world_id == entity_id))
+    await refresh_world_head(db, entity_id)
+    await db.commit()
     return entity
 
 
-def get_step(db: Session, entity_id: int):
-    ret = db.query(models.Step).filter(models.Step.id == entity_id).first()
+async def get_step(db: AsyncSession, entity_id: int):
+    # stage and world are needed by callers, relationships can't be lazy-loaded
+    stmt = (
+        select(models.Step)
+        .options(joinedload(models.Step.stage).joinedload(models.Stage.world))
+        .where(models.Step.id == entity_id)
+    )
+    ret = (await db.scalars(stmt)).first()
     if not ret:
         raise RuntimeError(f"Step #{entity_id} not found")
     return ret
 
 
+def get_world_log_level(world: models.World) -> LogLevel:
+    """
+    Minimum level of plugin logs stored for world, default one if not set
+    """
+    return LogLevel(world.log_level) if world.log_level else plugin_log_level
+
+
+def get_world_tick_rate(world: models.World) -> Optional[float]:
+    """
+    Ticks per second of world, default one of its plugin if not set
+    """
+    if world.tick_rate:
+        return world.tick_rate
+    return get_plugin_class(world.plugin).default_tick_rate
+
+
 def get_world_service(state: Any) -> WorldService:
     return getattr(state, WORLD_SERIVCE_NAME)
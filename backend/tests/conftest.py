@@ -0,0 +1,27 @@
+"""
+Routes are tested against SQLite stand-in of database, created per session
+"""
+
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+os.environ.setdefault(
+    "DATABASE_URL",
+    f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}",
+)
+os.environ.setdefault("API_BASE_URI", "")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from benchmarks.engine_bench import prepare_database  # noqa: E402
+from src.main import app  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    asyncio.run(prepare_database())
+    with TestClient(app) as ret:
+        yield ret
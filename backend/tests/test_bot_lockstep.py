@@ -0,0 +1,40 @@
+import asyncio
+
+from src.world.bot_lockstep import BotConnection
+
+
+class StalledWebSocket:
+    """
+    Socket of bot which stopped reading, its send buffer is full
+    """
+
+    def __init__(self) -> None:
+        self.sent = 0
+        self.closed = False
+
+    async def send_text(self, message: str):
+        self.sent += 1
+        await asyncio.Event().wait()
+
+    async def close(self):
+        self.closed = True
+
+
+def test_stalled_bot_misses_tick_within_deadline():
+    websocket = StalledWebSocket()
+    bot = BotConnection("slow", websocket, set())
+
+    async def decide_twice():
+        loop = asyncio.get_running_loop()
+        started_at = loop.time()
+        first = await bot.decide(1, "{}", loop.time() + 0.05)
+        second = await bot.decide(2, "{}", loop.time() + 0.05)
+        await asyncio.sleep(0)
+        return first, second, loop.time() - started_at
+
+    first, second, elapsed = asyncio.run(decide_twice())
+
+    assert first.actions is None and second.actions is None
+    assert elapsed < 0.5
+    # disconnected bot isn't sent further ticks
+    assert websocket.sent == 1 and websocket.closed
@@ -0,0 +1,34 @@
+from src.tools.compact_history import compact_world_history
+
+
+def read_states(client, world_id: int):
+    steps = client.get(f"/worlds/{world_id}/status", params={"limit": 100}).json()[
+        "steps"
+    ]
+    return {
+        step["id"]: client.get(f"/steps/{step['id']}").json()["state"] for step in steps
+    }
+
+
+def test_compaction_keeps_states(client):
+    world = client.post("/worlds", json={"title": "a", "plugin": "DEMO_GAME"}).json()
+    client.patch(
+        f"/worlds/{world['id']}",
+        json={"title": "a", "config": "", "keyframeInterval": 10},
+    )
+    client.post(
+        f"/worlds/{world['id']}/start", params={"maxSteps": 60, "headless": True}
+    )
+    states = read_states(client, world["id"])
+    assert len(states) == 60
+
+    for keyframe_interval in (7, 0, 25):
+        rewritten, total = client.portal.call(
+            compact_world_history, world["id"], keyframe_interval
+        )
+        assert rewritten > 0 and total == 60
+        assert read_states(client, world["id"]) == states
+
+    # same layout again leaves all rows as they are
+    rewritten, total = client.portal.call(compact_world_history, world["id"], 25)
+    assert rewritten == 0 and total == 60
@@ -0,0 +1,31 @@
+import asyncio
+import gc
+
+from src.world.frame_cache import FrameCache
+
+
+def test_failed_render_of_cancelled_request():
+    cache = FrameCache(1 << 20)
+    unretrieved = []
+
+    async def render():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("Render failed")
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        loop.set_exception_handler(lambda loop, context: unretrieved.append(context))
+        request = asyncio.create_task(cache.get_or_render("a", render))
+        await asyncio.sleep(0)
+        request.cancel()
+        await asyncio.sleep(0.05)
+        gc.collect()
+
+        async def ok():
+            return b"frame"
+
+        # failed render doesn't stay in flight
+        assert await cache.get_or_render("a", ok) == b"frame"
+
+    asyncio.run(run())
+    assert not unretrieved
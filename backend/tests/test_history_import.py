@@ -0,0 +1,9 @@
+import pytest
+
+
+@pytest.mark.parametrize("body", [b"", b"not json\n", b"[1]\n", b'{"type": "step"}\n'])
+def test_import_rejects_missing_world_line(client, body):
+    response = client.post("/worlds/import", content=body)
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "History must start with world line"
@@ -0,0 +1,43 @@
+import asyncio
+
+from src.world.plugin_host import PluginSlots, ProcessPluginHost
+
+
+def test_process_host_large_requests_and_stop():
+    host = ProcessPluginHost(1)
+
+    async def run():
+        # requests larger than pipe buffer, sent concurrently
+        payload = "x" * (1 << 20)
+        stats = await asyncio.wait_for(
+            asyncio.gather(*(host._call(1, None, "stats", payload) for _ in range(8))),
+            10,
+        )
+        assert len(stats) == 8
+
+        await host.start(1, "DEMO_GAME", None, None, None, True)
+        assert host.is_loaded(1)
+        await host.stop(1)
+        assert not host.is_loaded(1)
+
+    try:
+        asyncio.run(run())
+    finally:
+        host.close()
+
+
+def test_stopped_plugin_is_evicted_last():
+    slots = PluginSlots(max_idle=1, idle_ttl=60)
+
+    async def run():
+        await slots.execute(1, "DEMO_GAME", "start", (None,) * 4)
+        plugin = slots.get(1, "DEMO_GAME")
+        await slots.execute(2, "DEMO_GAME", "start", (None,) * 4)
+        await slots.execute(2, None, "stop", ())
+        await slots.execute(1, None, "stop", ())
+        slots.evict_idle()
+        # world 2 is least recently used, world 1 keeps its plugin
+        assert slots.get_stats().resident == 1
+        assert slots.get(1, "DEMO_GAME") is plugin
+
+    asyncio.run(run())
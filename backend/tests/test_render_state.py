@@ -0,0 +1,29 @@
+import asyncio
+import io
+
+from PIL import Image
+
+from src.plugins.demo_game.demo_game import DemoGamePlugin
+from src.utils.images import ImageFormat
+
+
+class OneArgumentRenderPlugin(DemoGamePlugin):
+    """
+    Plugin implementing only PNG rendering of base class
+    """
+
+    def render_state(self, state):
+        return DemoGamePlugin.render_state_as(self, state, ImageFormat.PNG)
+
+    def render_state_as(self, state, image_format):
+        return super(DemoGamePlugin, self).render_state_as(state, image_format)
+
+
+def test_render_state_as_converts_png_of_plugin():
+    plugin = OneArgumentRenderPlugin()
+    state = asyncio.run(plugin.initialize())
+
+    for image_format in ImageFormat:
+        frame = plugin.render_state_as(state, image_format)
+        with Image.open(io.BytesIO(frame)) as im:
+            assert im.format.lower() == image_format
@@ -0,0 +1,56 @@
+def test_update_state_codec(client):
+    world = client.post("/worlds", json={"title": "a", "plugin": "DEMO_GAME"}).json()
+
+    response = client.patch(
+        f"/worlds/{world['id']}",
+        json={"title": "a", "config": "", "stateCodec": "msgpack"},
+    )
+
+    assert response.status_code == 200
+    assert response.json()["stateCodec"] == "msgpack"
+    assert client.get(f"/worlds/{world['id']}").json()["stateCodec"] == "msgpack"
+
+
+def test_update_rejects_unknown_state_codec(client):
+    world = client.post("/worlds", json={"title": "a", "plugin": "DEMO_GAME"}).json()
+
+    response = client.patch(
+        f"/worlds/{world['id']}",
+        json={"title": "a", "config": "", "stateCodec": "xml"},
+    )
+
+    assert response.status_code == 422
+
+
+def test_short_run_reports_ticks_per_second(client):
+    world = client.post("/worlds", json={"title": "a", "plugin": "DEMO_GAME"}).json()
+
+    # background task of start completes before response is returned
+    client.post(
+        f"/worlds/{world['id']}/start", params={"maxSteps": 5, "headless": True}
+    )
+
+    status = client.get(f"/worlds/{world['id']}/status").json()
+    assert status["ticksPerSecond"] > 0
+
+
+def test_clear_changes_history_generation(client):
+    world = client.post("/worlds", json={"title": "a", "plugin": "DEMO_GAME"}).json()
+    client.post(
+        f"/worlds/{world['id']}/start", params={"maxSteps": 3, "headless": True}
+    )
+    before = client.get(f"/worlds/{world['id']}/status").json()
+
+    client.post(f"/worlds/{world['id']}/clear")
+    client.post(
+        f"/worlds/{world['id']}/start", params={"maxSteps": 5, "headless": True}
+    )
+    # client polling from its last step gets only new steps after restart
+    after = client.get(
+        f"/worlds/{world['id']}/status",
+        params={"sinceStepId": before["lastStepId"]},
+    ).json()
+
+    assert after["historyGeneration"] != before["historyGeneration"]
+    assert after["stepCount"] == 5
+
@@ -0,0 +1,19 @@
+import asyncio
+
+import pytest
+
+from src.utils.ws import WsPubSubService
+
+
+class FailingHandshakeWebSocket:
+    async def accept(self):
+        raise RuntimeError("Client went away")
+
+
+def test_failed_handshake_leaves_no_topic():
+    ws_ps = WsPubSubService()
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(ws_ps.subscribe("frames", FailingHandshakeWebSocket()))
+
+    assert not ws_ps.has_subscribers("frames")
@@ -0,0 +1,18 @@
+import threading
+
+
+def test_frames_are_streamed_to_viewer(client):
+    world = client.post("/worlds", json={"title": "a", "plugin": "DEMO_GAME"}).json()
+    with client.websocket_connect(
+        f"/worlds/ws/{world['id']}/frames", params={"format": "png"}
+    ) as ws:
+        run = threading.Thread(
+            target=client.post,
+            args=(f"/worlds/{world['id']}/start",),
+            kwargs=dict(params={"maxSteps": 3, "tickRate": 20}),
+        )
+        run.start()
+        frame = ws.receive_bytes()
+        run.join()
+
+    assert frame[:4] == b"\x89PNG"
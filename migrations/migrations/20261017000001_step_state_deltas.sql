@@ -0,0 +1,10 @@
+-- migrate:up
+
+-- tables may not exist yet, they are created by backend on first start
+ALTER TABLE IF EXISTS public.world ADD COLUMN IF NOT EXISTS keyframe_interval integer;
+ALTER TABLE IF EXISTS public.step ADD COLUMN IF NOT EXISTS base_step_id integer;
+
+-- migrate:down
+
+ALTER TABLE IF EXISTS public.step DROP COLUMN IF EXISTS base_step_id;
+ALTER TABLE IF EXISTS public.world DROP COLUMN IF EXISTS keyframe_interval;
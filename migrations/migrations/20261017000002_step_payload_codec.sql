@@ -0,0 +1,29 @@
+-- migrate:up
+
+-- existing text payloads stay valid, plain JSON is stored as is
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = 'step'
+            AND column_name = 'logs' AND data_type = 'text'
+    ) THEN
+        ALTER TABLE public.step
+            ALTER COLUMN logs TYPE bytea USING convert_to(logs, 'UTF8'),
+            ALTER COLUMN interactions TYPE bytea USING convert_to(interactions, 'UTF8');
+    END IF;
+END $$;
+
+CREATE TABLE IF NOT EXISTS public.codec_dictionary (
+    id serial PRIMARY KEY,
+    plugin character varying,
+    data bytea
+);
+
+-- migrate:down
+
+-- compressed payloads must be rewritten as plain before rollback
+DROP TABLE IF EXISTS public.codec_dictionary;
+ALTER TABLE IF EXISTS public.step
+    ALTER COLUMN logs TYPE text USING convert_from(logs, 'UTF8'),
+    ALTER COLUMN interactions TYPE text USING convert_from(interactions, 'UTF8');
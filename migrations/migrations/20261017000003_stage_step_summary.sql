@@ -0,0 +1,31 @@
+-- migrate:up
+
+ALTER TABLE IF EXISTS public.stage ADD COLUMN IF NOT EXISTS first_step_id integer;
+ALTER TABLE IF EXISTS public.stage ADD COLUMN IF NOT EXISTS last_step_id integer;
+ALTER TABLE IF EXISTS public.stage ADD COLUMN IF NOT EXISTS step_count integer DEFAULT 0 NOT NULL;
+
+DO $$
+BEGIN
+    IF to_regclass('public.step') IS NOT NULL THEN
+        CREATE INDEX IF NOT EXISTS ix_step_stage_id_id ON public.step (stage_id, id);
+        CREATE INDEX IF NOT EXISTS ix_stage_world_id ON public.stage (world_id);
+        UPDATE public.stage SET
+            first_step_id = summary.first_step_id,
+            last_step_id = summary.last_step_id,
+            step_count = summary.step_count
+        FROM (
+            SELECT stage_id, min(id) AS first_step_id, max(id) AS last_step_id, count(*) AS step_count
+            FROM public.step
+            GROUP BY stage_id
+        ) AS summary
+        WHERE stage.id = summary.stage_id;
+    END IF;
+END $$;
+
+-- migrate:down
+
+DROP INDEX IF EXISTS public.ix_stage_world_id;
+DROP INDEX IF EXISTS public.ix_step_stage_id_id;
+ALTER TABLE IF EXISTS public.stage DROP COLUMN IF EXISTS step_count;
+ALTER TABLE IF EXISTS public.stage DROP COLUMN IF EXISTS last_step_id;
+ALTER TABLE IF EXISTS public.stage DROP COLUMN IF EXISTS first_step_id;
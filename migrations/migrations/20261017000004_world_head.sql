@@ -0,0 +1,44 @@
+-- migrate:up
+
+ALTER TABLE IF EXISTS public.step ADD COLUMN IF NOT EXISTS world_id integer;
+
+DO $$
+BEGIN
+    -- on fresh database, table is created by backend along with world one
+    IF to_regclass('public.world') IS NOT NULL THEN
+        CREATE TABLE IF NOT EXISTS public.world_head (
+            world_id integer UNIQUE REFERENCES public.world(id),
+            last_step_id integer,
+            last_stage_id integer,
+            step_count integer DEFAULT 0 NOT NULL,
+            id serial PRIMARY KEY
+        );
+    END IF;
+    IF to_regclass('public.step') IS NOT NULL AND to_regclass('public.world_head') IS NOT NULL THEN
+        UPDATE public.step SET world_id = stage.world_id
+        FROM public.stage
+        WHERE step.stage_id = stage.id AND step.world_id IS NULL;
+        CREATE INDEX IF NOT EXISTS ix_step_world_id_id ON public.step (world_id, id);
+        IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'step_world_id_fkey') THEN
+            ALTER TABLE public.step
+                ADD CONSTRAINT step_world_id_fkey FOREIGN KEY (world_id) REFERENCES public.world(id);
+        END IF;
+        INSERT INTO public.world_head (world_id, last_step_id, last_stage_id, step_count)
+        SELECT summary.world_id, summary.last_step_id, step.stage_id, summary.step_count
+        FROM (
+            SELECT world_id, max(id) AS last_step_id, count(*) AS step_count
+            FROM public.step
+            WHERE world_id IS NOT NULL
+            GROUP BY world_id
+        ) AS summary
+        JOIN public.step ON step.id = summary.last_step_id
+        ON CONFLICT (world_id) DO NOTHING;
+    END IF;
+END $$;
+
+-- migrate:down
+
+DROP TABLE IF EXISTS public.world_head;
+DROP INDEX IF EXISTS public.ix_step_world_id_id;
+ALTER TABLE IF EXISTS public.step DROP CONSTRAINT IF EXISTS step_world_id_fkey;
+ALTER TABLE IF EXISTS public.step DROP COLUMN IF EXISTS world_id;
@@ -0,0 +1,77 @@
+-- migrate:up
+
+DO $$
+DECLARE
+    world_row record;
+BEGIN
+    IF to_regclass('public.step') IS NULL THEN
+        RETURN;
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'public.step'::regclass) THEN
+        -- steps are copied into partitioned table, names of indexes are freed first
+        ALTER TABLE public.step RENAME TO step_unpartitioned;
+        ALTER INDEX IF EXISTS public.step_pkey RENAME TO step_unpartitioned_pkey;
+        DROP INDEX IF EXISTS public.ix_step_stage_id_id;
+        DROP INDEX IF EXISTS public.ix_step_world_id_id;
+        CREATE TABLE public.step (
+            stage_id integer,
+            state text,
+            actions text,
+            logs bytea,
+            interactions bytea,
+            id integer DEFAULT nextval('public.step_id_seq'::regclass) NOT NULL,
+            base_step_id integer,
+            world_id integer NOT NULL,
+            CONSTRAINT step_pkey PRIMARY KEY (id, world_id),
+            CONSTRAINT step_stage_id_fkey FOREIGN KEY (stage_id) REFERENCES public.stage(id),
+            CONSTRAINT step_world_id_fkey FOREIGN KEY (world_id) REFERENCES public.world(id)
+        ) PARTITION BY LIST (world_id);
+        ALTER SEQUENCE public.step_id_seq OWNED BY public.step.id;
+        CREATE INDEX ix_step_stage_id_id ON public.step (stage_id, id);
+    END IF;
+    FOR world_row IN SELECT id FROM public.world LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS public.step_w%s PARTITION OF public.step FOR VALUES IN (%s)',
+            world_row.id, world_row.id
+        );
+    END LOOP;
+    IF to_regclass('public.step_unpartitioned') IS NOT NULL THEN
+        INSERT INTO public.step (stage_id, state, actions, logs, interactions, id, base_step_id, world_id)
+        SELECT old.stage_id, old.state, old.actions, old.logs, old.interactions, old.id, old.base_step_id,
+            stage.world_id
+        FROM public.step_unpartitioned AS old
+        JOIN public.stage ON stage.id = old.stage_id
+        WHERE stage.world_id IS NOT NULL;
+        DROP TABLE public.step_unpartitioned;
+    END IF;
+END $$;
+
+-- migrate:down
+
+DO $$
+BEGIN
+    IF to_regclass('public.step') IS NULL
+        OR NOT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'public.step'::regclass) THEN
+        RETURN;
+    END IF;
+    ALTER TABLE public.step RENAME TO step_partitioned;
+    ALTER INDEX public.step_pkey RENAME TO step_partitioned_pkey;
+    DROP INDEX public.ix_step_stage_id_id;
+    CREATE TABLE public.step (
+        stage_id integer REFERENCES public.stage(id),
+        state text,
+        actions text,
+        logs bytea,
+        interactions bytea,
+        id integer DEFAULT nextval('public.step_id_seq'::regclass) NOT NULL PRIMARY KEY,
+        base_step_id integer,
+        world_id integer REFERENCES public.world(id)
+    );
+    ALTER SEQUENCE public.step_id_seq OWNED BY public.step.id;
+    INSERT INTO public.step SELECT stage_id, state, actions, logs, interactions, id, base_step_id, world_id
+    FROM public.step_partitioned;
+    -- partitions are dropped along with partitioned table
+    DROP TABLE public.step_partitioned;
+    CREATE INDEX ix_step_stage_id_id ON public.step (stage_id, id);
+    CREATE INDEX ix_step_world_id_id ON public.step (world_id, id);
+END $$;
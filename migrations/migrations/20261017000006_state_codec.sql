@@ -0,0 +1,9 @@
+-- migrate:up
+
+ALTER TABLE IF EXISTS public.world ADD COLUMN IF NOT EXISTS state_codec character varying;
+ALTER TABLE IF EXISTS public.step ADD COLUMN IF NOT EXISTS packed_state bytea;
+
+-- migrate:down
+
+ALTER TABLE IF EXISTS public.step DROP COLUMN IF EXISTS packed_state;
+ALTER TABLE IF EXISTS public.world DROP COLUMN IF EXISTS state_codec;
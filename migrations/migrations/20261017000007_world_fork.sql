@@ -0,0 +1,22 @@
+-- migrate:up
+
+ALTER TABLE IF EXISTS public.world ADD COLUMN IF NOT EXISTS parent_world_id integer;
+ALTER TABLE IF EXISTS public.world ADD COLUMN IF NOT EXISTS fork_step_id integer;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'world_parent_world_id_fkey'
+    ) THEN
+        ALTER TABLE public.world
+            ADD CONSTRAINT world_parent_world_id_fkey
+            FOREIGN KEY (parent_world_id) REFERENCES public.world(id);
+    END IF;
+END
+$$;
+
+-- migrate:down
+
+ALTER TABLE IF EXISTS public.world DROP CONSTRAINT IF EXISTS world_parent_world_id_fkey;
+ALTER TABLE IF EXISTS public.world DROP COLUMN IF EXISTS fork_step_id;
+ALTER TABLE IF EXISTS public.world DROP COLUMN IF EXISTS parent_world_id;
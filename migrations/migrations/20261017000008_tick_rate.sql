@@ -0,0 +1,7 @@
+-- migrate:up
+
+ALTER TABLE IF EXISTS public.world ADD COLUMN IF NOT EXISTS tick_rate double precision;
+
+-- migrate:down
+
+ALTER TABLE IF EXISTS public.world DROP COLUMN IF EXISTS tick_rate;
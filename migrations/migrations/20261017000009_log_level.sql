@@ -0,0 +1,7 @@
+-- migrate:up
+
+ALTER TABLE IF EXISTS public.world ADD COLUMN IF NOT EXISTS log_level character varying;
+
+-- migrate:down
+
+ALTER TABLE IF EXISTS public.world DROP COLUMN IF EXISTS log_level;
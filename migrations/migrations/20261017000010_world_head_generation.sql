@@ -0,0 +1,7 @@
+-- migrate:up
+
+ALTER TABLE IF EXISTS public.world_head ADD COLUMN IF NOT EXISTS history_generation integer DEFAULT 0 NOT NULL;
+
+-- migrate:down
+
+ALTER TABLE IF EXISTS public.world_head DROP COLUMN IF EXISTS history_generation;
@@ -22,6 +22,37 @@ CREATE TABLE public.schema_migrations (
 );
 
 
+--
+-- Name: codec_dictionary; Type: TABLE; Schema: public; Owner: -
+--
+
+CREATE TABLE public.codec_dictionary (
+    id integer NOT NULL,
+    plugin character varying,
+    data bytea
+);
+
+
+--
+-- Name: codec_dictionary_id_seq; Type: SEQUENCE; Schema: public; Owner: -
+--
+
+CREATE SEQUENCE public.codec_dictionary_id_seq
+    AS integer
+    START WITH 1
+    INCREMENT BY 1
+    NO MINVALUE
+    NO MAXVALUE
+    CACHE 1;
+
+
+--
+-- Name: codec_dictionary_id_seq; Type: SEQUENCE OWNED BY; Schema: public; Owner: -
+--
+
+ALTER SEQUENCE public.codec_dictionary_id_seq OWNED BY public.codec_dictionary.id;
+
+
 --
 -- Name: stage; Type: TABLE; Schema: public; Owner: -
 --
@@ -30,7 +61,10 @@ CREATE TABLE public.stage (
     title character varying,
     world_id integer,
     id integer NOT NULL,
-    code character varying
+    code character varying,
+    first_step_id integer,
+    last_step_id integer,
+    step_count integer DEFAULT 0 NOT NULL
 );
 
 
@@ -62,10 +96,14 @@ CREATE TABLE public.step (
     stage_id integer,
     state text,
     actions text,
-    logs text,
-    interactions text,
-    id integer NOT NULL
-);
+    logs bytea,
+    interactions bytea,
+    id integer NOT NULL,
+    base_step_id integer,
+    world_id integer NOT NULL,
+    packed_state bytea
+)
+PARTITION BY LIST (world_id);
 
 
 --
@@ -96,7 +134,13 @@ CREATE TABLE public.world (
     title character varying,
     plugin character varying,
     config character varying,
-    id integer NOT NULL
+    id integer NOT NULL,
+    keyframe_interval integer,
+    state_codec character varying,
+    parent_world_id integer,
+    fork_step_id integer,
+    tick_rate double precision,
+    log_level character varying
 );
 
 
@@ -120,6 +164,47 @@ CREATE SEQUENCE public.world_id_seq
 ALTER SEQUENCE public.world_id_seq OWNED BY public.world.id;
 
 
+--
+-- Name: world_head; Type: TABLE; Schema: public; Owner: -
+--
+
+CREATE TABLE public.world_head (
+    world_id integer,
+    last_step_id integer,
+    last_stage_id integer,
+    step_count integer DEFAULT 0 NOT NULL,
+    id integer NOT NULL,
+    history_generation integer DEFAULT 0 NOT NULL
+);
+
+
+--
+-- Name: world_head_id_seq; Type: SEQUENCE; Schema: public; Owner: -
+--
+
+CREATE SEQUENCE public.world_head_id_seq
+    AS integer
+    START WITH 1
+    INCREMENT BY 1
+    NO MINVALUE
+    NO MAXVALUE
+    CACHE 1;
+
+
+--
+-- Name: world_head_id_seq; Type: SEQUENCE OWNED BY; Schema: public; Owner: -
+--
+
+ALTER SEQUENCE public.world_head_id_seq OWNED BY public.world_head.id;
+
+
+--
+-- Name: codec_dictionary id; Type: DEFAULT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.codec_dictionary ALTER COLUMN id SET DEFAULT nextval('public.codec_dictionary_id_seq'::regclass);
+
+
 --
 -- Name: stage id; Type: DEFAULT; Schema: public; Owner: -
 --
@@ -141,6 +226,13 @@ ALTER TABLE ONLY public.step ALTER COLUMN id SET DEFAULT nextval('public.step_id
 ALTER TABLE ONLY public.world ALTER COLUMN id SET DEFAULT nextval('public.world_id_seq'::regclass);
 
 
+--
+-- Name: world_head id; Type: DEFAULT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.world_head ALTER COLUMN id SET DEFAULT nextval('public.world_head_id_seq'::regclass);
+
+
 --
 -- Name: schema_migrations schema_migrations_pkey; Type: CONSTRAINT; Schema: public; Owner: -
 --
@@ -149,6 +241,14 @@ ALTER TABLE ONLY public.schema_migrations
     ADD CONSTRAINT schema_migrations_pkey PRIMARY KEY (version);
 
 
+--
+-- Name: codec_dictionary codec_dictionary_pkey; Type: CONSTRAINT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.codec_dictionary
+    ADD CONSTRAINT codec_dictionary_pkey PRIMARY KEY (id);
+
+
 --
 -- Name: stage stage_pkey; Type: CONSTRAINT; Schema: public; Owner: -
 --
@@ -162,7 +262,7 @@ ALTER TABLE ONLY public.stage
 --
 
 ALTER TABLE ONLY public.step
-    ADD CONSTRAINT step_pkey PRIMARY KEY (id);
+    ADD CONSTRAINT step_pkey PRIMARY KEY (id, world_id);
 
 
 --
@@ -173,6 +273,36 @@ ALTER TABLE ONLY public.world
     ADD CONSTRAINT world_pkey PRIMARY KEY (id);
 
 
+--
+-- Name: world_head world_head_pkey; Type: CONSTRAINT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.world_head
+    ADD CONSTRAINT world_head_pkey PRIMARY KEY (id);
+
+
+--
+-- Name: world_head world_head_world_id_key; Type: CONSTRAINT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.world_head
+    ADD CONSTRAINT world_head_world_id_key UNIQUE (world_id);
+
+
+--
+-- Name: ix_stage_world_id; Type: INDEX; Schema: public; Owner: -
+--
+
+CREATE INDEX ix_stage_world_id ON public.stage USING btree (world_id);
+
+
+--
+-- Name: ix_step_stage_id_id; Type: INDEX; Schema: public; Owner: -
+--
+
+CREATE INDEX ix_step_stage_id_id ON ONLY public.step USING btree (stage_id, id);
+
+
 --
 -- Name: stage stage_world_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: -
 --
@@ -189,6 +319,30 @@ ALTER TABLE ONLY public.step
     ADD CONSTRAINT step_stage_id_fkey FOREIGN KEY (stage_id) REFERENCES public.stage(id);
 
 
+--
+-- Name: step step_world_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.step
+    ADD CONSTRAINT step_world_id_fkey FOREIGN KEY (world_id) REFERENCES public.world(id);
+
+
+--
+-- Name: world world_parent_world_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.world
+    ADD CONSTRAINT world_parent_world_id_fkey FOREIGN KEY (parent_world_id) REFERENCES public.world(id);
+
+
+--
+-- Name: world_head world_head_world_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.world_head
+    ADD CONSTRAINT world_head_world_id_fkey FOREIGN KEY (world_id) REFERENCES public.world(id);
+
+
 --
 -- PostgreSQL database dump complete
 --
@@ -199,4 +353,14 @@ ALTER TABLE ONLY public.step
 --
 
 INSERT INTO public.schema_migrations (version) VALUES
-    ('19990101000000');
+    ('19990101000000'),
+    ('20261017000001'),
+    ('20261017000002'),
+    ('20261017000003'),
+    ('20261017000004'),
+    ('20261017000005'),
+    ('20261017000006'),
+    ('20261017000007'),
+    ('20261017000008'),
+    ('20261017000009'),
+    ('20261017000010');
@@ -9,6 +9,7 @@ import type {
   WorldCreateDto,
   WorldDto,
   WorldStatusDto,
+  WorldTickEventDto,
   WorldUpdateDto,
 } from './world-dto';
 import { ApiDrivenFormService, type ApiDriver } from '@/core/ApiDrivenFormService';
@@ -57,8 +58,9 @@ export class WorldApiService {
     return this.apiService.fetch({ method: 'GET', endpoint: `worlds/${id}/stages` });
   }
 
-  public async getWorldStatus(id: number): Promise<WorldStatusDto> {
-    return this.apiService.fetch({ method: 'GET', endpoint: `worlds/${id}/status` });
+  public async getWorldStatus(id: number, sinceStepId?: number): Promise<WorldStatusDto> {
+    const query = sinceStepId ? `?sinceStepId=${sinceStepId}` : ''
+    return this.apiService.fetch({ method: 'GET', endpoint: `worlds/${id}/status${query}` });
   }
 
   public async getWorldActions(id: number): Promise<WorldActionDefDto[]> {
@@ -89,8 +91,9 @@ export class WorldApiService {
     return this.apiService.fetch({ method: 'GET', endpoint: `steps/${id}/describe` });
   }
 
-  public useWatchStatusWs(id: number) {
-    return useWs(this.apiService.makeUrl(`worlds/ws/${id}/watch-status`));
+  public useWatchStatusWs(id: number, fields?: (keyof WorldTickEventDto)[]) {
+    const query = fields ? `?fields=${fields.join(',')}` : '';
+    return useWs<WorldTickEventDto>(this.apiService.makeUrl(`worlds/ws/${id}/watch-status${query}`));
   }
 
   public createStepPreviewUrl(id: number) {
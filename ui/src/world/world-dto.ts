@@ -4,21 +4,34 @@ export interface WorldBaseDto {
 
 export interface WorldCreateDto extends WorldBaseDto {
   plugin: string;
+  config?: string;
 }
 
 export interface WorldUpdateDto extends WorldBaseDto {
   config: string;
+  keyframeInterval?: number;
+  stateCodec?: 'json' | 'msgpack';
+  tickRate?: number;
+  logLevel?: 'DEBUG' | 'INFO' | 'WARNING' | 'ERROR' | 'CRITICAL';
 }
 
 export interface WorldDto extends WorldBaseDto {
   id: number;
   plugin: string;
   config?: string;
+  keyframeInterval?: number;
+  stateCodec?: string;
+  parentWorldId?: number;
+  forkStepId?: number;
+  tickRate?: number;
+  logLevel?: string;
 }
 
 export interface ExtendedWorldDto extends WorldDto {
   initialized: boolean;
   running: boolean;
+  lastStepId?: number;
+  stepCount: number;
 }
 
 export interface StageDto {
@@ -32,9 +45,36 @@ export interface WorldStatusStepDto {
   stageId: number;
 }
 
+export interface WorldStatusStageDto {
+  id: number;
+  firstStepId: number;
+  lastStepId: number;
+  stepCount: number;
+}
+
 export interface WorldStatusDto {
   isRunning: boolean;
+  ticksPerSecond?: number;
+  targetTicksPerSecond?: number;
+  missedDeadlines: number;
   steps: WorldStatusStepDto[];
+  hasMore: boolean;
+  stages: WorldStatusStageDto[];
+  lastStepId?: number;
+  stepCount: number;
+  historyGeneration: number;
+}
+
+export interface WorldTickEventDto {
+  worldId: number;
+  stepId: number;
+  stageId: number;
+  stageCode: string;
+  newSteps: number;
+  isRunning: boolean;
+  describe?: Record<string, string>;
+  logCounts: Record<string, number>;
+  lastLog?: string;
 }
 
 export interface WorldActionDefDto {